@@ -63,6 +63,9 @@ def main():
     
     if user.can_access_page("Expense Analysis"):
         st.markdown('<div class="summary-card">💳 <b>Expense Analysis</b><br>Track and analyze all business expenses by category and period.<br><a href="/2_%F0%9F%92%B3_Expense_Analysis" target="_self">Go to Expense Analysis &rarr;</a></div>', unsafe_allow_html=True)
+    
+    if user.can_access_page("Customer Profitability"):
+        st.markdown('<div class="summary-card">👥 <b>Customer Profitability</b><br>Revenue, costs, margin and partner shares per customer, with top and bottom performers.<br><a href="/3_%F0%9F%91%A5_Customer_Profitability" target="_self">Go to Customer Profitability &rarr;</a></div>', unsafe_allow_html=True)
 
     st.markdown("---")
     st.info("Select a page from the sidebar to begin your analysis.")
@@ -1,12 +1,9 @@
 """Vendor Rate Analysis - Product-wise Purchase Report."""
 import streamlit as st
-import pandas as pd
-from pathlib import Path
 
 from src.utils.auth import require_password
-from src.services.excel_reader import ExcelReaderService
-from src.services.data_transformer import DataTransformerService
-from src.services.analysis import AnalysisService
+from src.utils.perf import stage
+from src.utils.perf_panel import render_performance_panel
 
 
 # Page configuration
@@ -26,6 +23,22 @@ if not st.session_state.user.can_access_page("Vendor Analysis"):
     st.info("🚧 This page is currently under maintenance and will be available soon.")
     st.stop()
 
+# ========================================
+# DEFERRED IMPORTS - only after authentication,
+# so the login form renders without loading analytics modules
+# ========================================
+with stage("Vendor Analysis: imports"):
+    import pandas as pd
+    import plotly.express as px
+    from pathlib import Path
+    from src.services.excel_reader import ExcelReaderService
+    from src.services.data_transformer import DataTransformerService
+    from src.services.analysis import AnalysisService
+    from src.services.vendor_rates import VendorRateService
+    from src.services.rate_history import RateHistoryIndex
+    from src.config import ANOMALY_RATE_WINDOW, RATE_HISTORY_WINDOW, VENDOR_RATE_WINDOW_DAYS
+    from src.utils.intern import VENDORS
+
 # Custom CSS
 st.markdown("""
 <style>
@@ -79,7 +92,7 @@ def load_data():
 
 @st.cache_data
 def get_vendor_analysis(_purchases, _sales, categories):
-    """Get vendor and product analysis.
+    """Get product analysis.
     
     Args:
         _purchases: List of purchases
@@ -87,9 +100,34 @@ def get_vendor_analysis(_purchases, _sales, categories):
         categories: Categories to analyze
     """
     analyzer = AnalysisService(_purchases, _sales)
-    product_analysis = analyzer.get_product_wise_purchase_analysis(categories)
-    vendor_analysis = analyzer.get_vendor_rate_analysis(categories)
-    return product_analysis, vendor_analysis
+    return analyzer.get_product_wise_purchase_analysis(categories)
+
+
+@st.cache_resource
+def get_vendor_rates(_purchases, categories):
+    """Get vendor rates and the vendor × product matrix.
+    
+    Vendor ranking, vendor filtering and savings are answered from the
+    matrix, built once per category selection.
+    
+    Args:
+        _purchases: List of purchases
+        categories: Categories to analyze
+    """
+    vendor_rates = VendorRateService(_purchases, categories)
+    vendor_rates.matrix()
+    return vendor_rates
+
+
+@st.cache_resource
+def get_rate_history(_purchases, categories):
+    """Get the per (item, vendor) purchase-rate history index.
+    
+    Args:
+        _purchases: List of purchases
+        categories: Categories to analyze
+    """
+    return RateHistoryIndex(_purchases, list(categories))
 
 
 def color_rate(row, min_rate, max_rate):
@@ -136,14 +174,36 @@ def main():
     
     # Detect anomalous rates FIRST (on raw data, before any filters)
     st.header("⚠️ Anomalous Purchase Rates - Data Quality Check")
-    st.markdown("*Purchase records with rates < 50% of median rate for the same product (possible data errors or internal transfers)*")
+    
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        rolling_anomalies = st.toggle(
+            "Compare with rolling median",
+            value=False,
+            help="Compare each purchase with the median of the product's preceding purchases "
+                 "instead of its all-time median, so rate inflation does not skew the check"
+        )
+    with col2:
+        anomaly_window = st.number_input(
+            "Preceding purchases",
+            min_value=1,
+            max_value=100,
+            value=ANOMALY_RATE_WINDOW,
+            disabled=not rolling_anomalies
+        )
+    
+    if rolling_anomalies:
+        st.markdown(f"*Purchase records with rates < 50% of the median rate of the previous {anomaly_window} purchases of the same product (possible data errors or internal transfers)*")
+    else:
+        st.markdown("*Purchase records with rates < 50% of median rate for the same product (possible data errors or internal transfers)*")
     
     with st.spinner("Detecting anomalous rates..."):
         analyzer_raw = AnalysisService(purchases, sales)
         anomalies = analyzer_raw.detect_anomalous_purchase_rates(
             categories=['FG', 'TR'],
             threshold_pct=50.0,
-            iterations=2
+            iterations=2,
+            window=anomaly_window if rolling_anomalies else None
         )
     
     if anomalies:
@@ -225,10 +285,12 @@ def main():
     
     # Get analysis
     with st.spinner("Analyzing vendor rates..."):
-        product_analysis, vendor_analysis = get_vendor_analysis(purchases, sales, categories)
+        product_analysis = get_vendor_analysis(purchases, sales, categories)
+        vendor_rates = get_vendor_rates(purchases, tuple(categories))
+        matrix = vendor_rates.matrix()
+        savings = matrix.savings()
     
     products = product_analysis['products']
-    vendors = vendor_analysis['vendors']
     
     # Summary Section
     st.header("📊 Executive Summary")
@@ -251,12 +313,12 @@ def main():
         )
     
     with col3:
-        total_savings = sum(p['potential_savings'] for p in products)
+        total_savings = savings['potential_savings'].sum()
         st.metric(
             "Potential Savings",
             f"₹{total_savings:,.0f}",
             help="If always bought at lowest rate",
-            delta=f"{sum(p['potential_savings_pct'] for p in products) / len(products):.1f}%" if products else "0%"
+            delta=f"{savings['potential_savings_pct'].mean():.1f}%" if len(savings) else "0%"
         )
     
     with col4:
@@ -273,15 +335,50 @@ def main():
     st.header("🏆 Vendor Performance Analysis")
     st.markdown("*Analysis based on products purchased from multiple vendors*")
     
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        compare_on = st.radio(
+            "Compare vendors on",
+            options=["Simple average (all time)", "Qty-weighted (all time)", "Same period"],
+            horizontal=True,
+            help="Qty-weighted rates are spend / quantity; 'Same period' compares each purchase "
+                 "with other vendors' nearest purchase of the product within the window"
+        )
+    with col2:
+        window_days = st.number_input(
+            "Window (days)",
+            min_value=1,
+            max_value=730,
+            value=VENDOR_RATE_WINDOW_DAYS,
+            disabled=compare_on != "Same period"
+        )
+    
+    # Above/below counts are per product vs the product average, or per matched
+    # purchase vs other vendors' purchases in the same-period comparison
+    count_unit = 'products'
+    baseline = 'product average'
+    diff_column = 'Avg Diff from Product Avg'
+    with stage("Vendor Analysis: vendor ranking"):
+        if compare_on == "Same period":
+            vendors = vendor_rates.period_vendor_scores(window_days).to_dict('records')
+            count_unit = 'comparisons'
+            baseline = 'other vendors in the same period'
+            diff_column = 'Avg Diff from Peers'
+        elif compare_on == "Qty-weighted (all time)":
+            vendors = matrix.rank_vendors('weighted').to_dict('records')
+        else:
+            vendors = matrix.rank_vendors('simple').to_dict('records')
+    
     if vendors:
         # Create vendor comparison table
         vendor_df = pd.DataFrame([{
             'Vendor': v['vendor_name'],
             'Products': v['total_products'],
+            'Comparisons': v['comparisons'],
             'Above Avg Rate': v['above_avg_count'],
             'Below Avg Rate': v['below_avg_count'],
             '% Above Avg': f"{v['above_avg_pct']:.1f}%",
-            'Avg Diff from Product Avg': f"{v['avg_rate_diff_pct']:+.2f}%",
+            diff_column: f"{v['avg_rate_diff_pct']:+.2f}%",
         } for v in vendors[:10]])  # Top 10 vendors
         
         st.dataframe(
@@ -302,8 +399,8 @@ def main():
                 **⚠️ Most Expensive Vendor**
                 
                 **{most_expensive['vendor_name']}**
-                - Charges **{most_expensive['avg_rate_diff_pct']:+.2f}%** vs product average
-                - Above average in **{most_expensive['above_avg_count']}/{most_expensive['total_products']}** products
+                - Charges **{most_expensive['avg_rate_diff_pct']:+.2f}%** vs {baseline}
+                - Higher in **{most_expensive['above_avg_count']}/{most_expensive['comparisons']}** {count_unit}
                 """)
             
             with col2:
@@ -311,8 +408,8 @@ def main():
                 **✅ Most Cost-Effective Vendor**
                 
                 **{most_cheap['vendor_name']}**
-                - Charges **{most_cheap['avg_rate_diff_pct']:+.2f}%** vs product average
-                - Below average in **{most_cheap['below_avg_count']}/{most_cheap['total_products']}** products
+                - Charges **{most_cheap['avg_rate_diff_pct']:+.2f}%** vs {baseline}
+                - Lower in **{most_cheap['below_avg_count']}/{most_cheap['comparisons']}** {count_unit}
                 """)
     else:
         st.info("ℹ️ No multi-vendor products found for comparison")
@@ -325,6 +422,7 @@ def main():
     high_variance = [p for p in products if p['unique_vendors'] > 1][:10]
     
     if high_variance:
+        savings_by_product = savings.set_index('product_id')
         variance_df = pd.DataFrame([{
             'Product': p['item_name'],
             'Vendors': p['unique_vendors'],
@@ -332,6 +430,8 @@ def main():
             'Max Rate': f"₹{p['max_rate']:.2f}",
             'Variance': f"{p['rate_variance_pct']:.1f}%",
             'Potential Savings': f"₹{p['potential_savings']:,.0f}",
+            'Cheapest Vendor': savings_by_product.at[p['product_id'], 'cheapest_vendor'],
+            'Most Expensive Vendor': savings_by_product.at[p['product_id'], 'most_expensive_vendor'],
         } for p in high_variance])
         
         st.dataframe(
@@ -342,6 +442,75 @@ def main():
     
     st.markdown("---")
     
+    # Rate Trends
+    st.header("📈 Rate Trends")
+    st.markdown(f"*Purchase rates over time per vendor, with the rolling median and trend of the last {RATE_HISTORY_WINDOW} purchases*")
+    
+    with stage("Vendor Analysis: rate history"):
+        rate_history = get_rate_history(purchases, tuple(categories))
+    
+    product_labels = {p['item_code']: f"{p['item_name']} ({p['item_code']})" for p in products}
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        trend_item = st.selectbox(
+            "Product",
+            options=sorted(product_labels, key=product_labels.get),
+            format_func=product_labels.get,
+            key="trend_product"
+        )
+    with col2:
+        rate_date = st.date_input("Rate in effect on", value=pd.Timestamp.today().date(), key="trend_rate_date")
+    
+    if trend_item:
+        history = rate_history.series(trend_item)
+        if history.empty:
+            st.info("No dated purchases for this product")
+        else:
+            fig = px.line(
+                history,
+                x='transaction_date',
+                y='in_rate',
+                color='vendor_name',
+                markers=True,
+                labels={'transaction_date': 'Date', 'in_rate': 'Rate (₹)', 'vendor_name': 'Vendor'},
+                title=f"Purchase Rate Trend - {product_labels[trend_item]}",
+            )
+            for vendor, vendor_history in history.groupby('vendor_name', sort=False):
+                if len(vendor_history) > 1:
+                    fig.add_scatter(
+                        x=vendor_history['transaction_date'],
+                        y=vendor_history['rolling_median'],
+                        mode='lines',
+                        line={'dash': 'dot'},
+                        name=f"{vendor} (rolling median)",
+                    )
+            st.plotly_chart(fig, use_container_width=True)
+            
+            trend_df = rate_history.summary(trend_item)
+            trend_df['rate_on_date'] = [rate_history.rate_at(trend_item, v, rate_date) for v in trend_df['vendor_name']]
+            trend_df = trend_df.drop(columns=['item_code']).rename(columns={
+                'vendor_name': 'Vendor',
+                'purchases': 'Purchases',
+                'first_date': 'First Purchase',
+                'last_date': 'Last Purchase',
+                'last_rate': 'Last Rate',
+                'rolling_median': 'Rolling Median',
+                'slope_per_30d': 'Trend (₹ / 30 days)',
+                'rate_on_date': f"Rate on {rate_date}",
+            })
+            st.dataframe(
+                trend_df.style.format({
+                    'Last Rate': '₹{:.2f}',
+                    'Rolling Median': '₹{:.2f}',
+                    'Trend (₹ / 30 days)': '{:+.2f}',
+                    f"Rate on {rate_date}": '₹{:.2f}',
+                }, na_rep='—'),
+                use_container_width=True,
+                hide_index=True,
+            )
+    
+    st.markdown("---")
+    
     # Product-wise Purchase Details
     st.header("📦 Product-wise Purchase Analysis")
     
@@ -359,11 +528,8 @@ def main():
         )
     
     with col2:
-        # Vendor filter
-        all_vendors = set()
-        for p in products:
-            all_vendors.update(p['vendor_avg_rates'].keys())
-        vendor_names = sorted(all_vendors)
+        # Vendor filter (rows of the vendor × product matrix)
+        vendor_names = sorted(matrix.vendor_names)
         
         selected_vendors = st.multiselect(
             "Filter by Vendor",
@@ -390,11 +556,10 @@ def main():
     if selected_products:
         filtered_products = [p for p in filtered_products if p['item_name'] in selected_products]
     
+    selected_vendor_ids = VENDORS.codes(selected_vendors)
     if selected_vendors:
-        filtered_products = [
-            p for p in filtered_products
-            if any(v in p['vendor_avg_rates'] for v in selected_vendors)
-        ]
+        vendor_product_ids = set(matrix.vendor_products(selected_vendors).tolist())
+        filtered_products = [p for p in filtered_products if p['product_id'] in vendor_product_ids]
     
     # Apply sorting
     if sort_option == "Rate Variance (High to Low)":
@@ -426,7 +591,7 @@ def main():
         # Filter purchases by selected vendors
         display_purchases = product['purchases']
         if selected_vendors:
-            display_purchases = [p for p in display_purchases if p.vendor_name in selected_vendors]
+            display_purchases = [p for p in display_purchases if p.vendor_id in selected_vendor_ids]
         
         if not display_purchases:
             st.write("*No purchases match the selected vendors*")
@@ -495,6 +660,7 @@ def main():
             st.markdown(f"**Purchases:** {len(display_purchases)}")
             st.markdown(f"**Total Qty:** {product['total_qty_purchased']:,}")
             st.markdown(f"**Avg Rate:** ₹{product['avg_rate']:.2f}")
+            st.markdown(f"**Weighted Avg Rate:** ₹{product['weighted_avg_rate']:.2f}")
             st.markdown(f"**Savings:** ₹{product['potential_savings']:,.0f}")
             if product['potential_savings_pct'] > 0:
                 st.markdown(f"<span style='color: red;'>**({product['potential_savings_pct']:.1f}% saved)**</span>", unsafe_allow_html=True)
@@ -503,4 +669,6 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    with stage("Vendor Analysis: render page"):
+        main()
+    render_performance_panel()
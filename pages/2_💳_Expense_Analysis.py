@@ -1,14 +1,10 @@
 """Expense Analysis Dashboard."""
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from pathlib import Path
-from datetime import datetime
 
 from src.utils.auth import require_password
-from src.services.expense_reader import ExpenseReaderService
-from src.services.expense_analysis import ExpenseAnalysisService
+from src.utils.perf import stage
+from src.utils.perf_panel import render_performance_panel
+
 
 # Page configuration
 st.set_page_config(
@@ -27,6 +23,22 @@ if not st.session_state.user.can_access_page("Expense Analysis"):
     st.info("🚧 This page is currently under maintenance and will be available soon.")
     st.stop()
 
+# ========================================
+# DEFERRED IMPORTS - only after authentication,
+# so the login form renders without loading analytics modules
+# ========================================
+with stage("Expense Analysis: imports"):
+    import pandas as pd
+    import plotly.express as px
+    import plotly.graph_objects as go
+    from pathlib import Path
+    from datetime import datetime
+    from src.services.expense_reader import ExpenseReaderService
+    from src.services.expense_analysis import ExpenseAnalysisService
+    from src.services.sqlite_store import open_default_store
+    from src.utils.intern import EXPENSE_CATEGORIES, EXPENSE_GROUPS
+    from src.config import STORAGE_BACKEND
+
 # Custom CSS
 st.markdown("""
 <style>
@@ -71,6 +83,14 @@ def load_expense_data():
     return expenses
 
 
+@st.cache_resource
+def get_store():
+    """Open the SQLite store when that storage backend is configured."""
+    if STORAGE_BACKEND != 'sqlite':
+        return None
+    return open_default_store()
+
+
 @st.cache_data
 def get_analysis(_expenses):
     """Get expense analysis (cached)."""
@@ -201,30 +221,44 @@ def main():
         )
     
     # Apply filters
-    filtered_expenses = all_expenses
-    
-    # Date filter
-    if len(date_range) == 2:
-        start_date, end_date = date_range
-        filtered_expenses = [
-            e for e in filtered_expenses
-            if e.date and start_date <= e.date.date() <= end_date
-        ]
-    
-    # Group filter
-    if selected_groups:
-        filtered_expenses = [e for e in filtered_expenses if e.group in selected_groups]
-    
-    # Category filter
-    if selected_categories:
-        filtered_expenses = [e for e in filtered_expenses if e.category in selected_categories]
-    
-    # Search filter
-    if search_term:
-        filtered_expenses = [
-            e for e in filtered_expenses
-            if search_term.lower() in e.particulars.lower()
-        ]
+    store = get_store()
+    with stage("Expense Analysis: filters") as info:
+        if store is not None:
+            # Filters and grouped summaries are evaluated by the store
+            start_date, end_date = date_range if len(date_range) == 2 else (None, None)
+            filtered_analysis = ExpenseAnalysisService.from_store(
+                store, start_date, end_date, selected_groups, selected_categories, search_term
+            )
+            filtered_expenses = filtered_analysis.expenses
+        else:
+            filtered_expenses = all_expenses
+            
+            # Date filter
+            if len(date_range) == 2:
+                start_date, end_date = date_range
+                filtered_expenses = [
+                    e for e in filtered_expenses
+                    if e.date and start_date <= e.date.date() <= end_date
+                ]
+            
+            # Group filter
+            if selected_groups:
+                group_ids = EXPENSE_GROUPS.codes(selected_groups)
+                filtered_expenses = [e for e in filtered_expenses if e.group_id in group_ids]
+            
+            # Category filter
+            if selected_categories:
+                category_ids = EXPENSE_CATEGORIES.codes(selected_categories)
+                filtered_expenses = [e for e in filtered_expenses if e.category_id in category_ids]
+            
+            # Search filter
+            if search_term:
+                filtered_expenses = [
+                    e for e in filtered_expenses
+                    if search_term.lower() in e.particulars.lower()
+                ]
+            
+        info['rows'] = len(filtered_expenses)
     
     st.info(f"📊 Showing **{len(filtered_expenses):,}** of **{len(all_expenses):,}** transactions")
     
@@ -237,7 +271,8 @@ def main():
     
     if filtered_expenses:
         # Create filtered analysis
-        filtered_analysis = ExpenseAnalysisService(filtered_expenses)
+        if store is None:
+            filtered_analysis = ExpenseAnalysisService(filtered_expenses)
         expenses_df = filtered_analysis.create_expense_dataframe()
         
         # Format the dataframe for display
@@ -272,7 +307,8 @@ def main():
     # ============================================
     
     if filtered_expenses:
-        filtered_analysis = ExpenseAnalysisService(filtered_expenses)
+        if store is None:
+            filtered_analysis = ExpenseAnalysisService(filtered_expenses)
         
         # GROUP ANALYSIS
         st.markdown('<div class="section-header">🏢 Expense by Group (Direct vs Indirect)</div>', unsafe_allow_html=True)
@@ -507,4 +543,6 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    with stage("Expense Analysis: render page"):
+        main()
+    render_performance_panel()
@@ -0,0 +1,264 @@
+"""Customer Profitability - Profit attributed to customers."""
+import streamlit as st
+
+from src.utils.auth import require_password
+from src.utils.perf import stage
+from src.utils.perf_panel import render_performance_panel
+
+
+# Page configuration
+st.set_page_config(
+    page_title="Customer Profitability",
+    page_icon="👥",
+    layout="wide",
+)
+
+# ========================================
+# PASSWORD PROTECTION - Must be first!
+# ========================================
+require_password()
+
+# Check permissions
+if not st.session_state.user.can_access_page("Customer Profitability"):
+    st.error("🚫 You do not have permission to access this page.")
+    st.stop()
+
+# ========================================
+# DEFERRED IMPORTS - only after authentication,
+# so the login form renders without loading analytics modules
+# ========================================
+with stage("Customer Profitability: imports"):
+    import pandas as pd
+    import plotly.express as px
+    from pathlib import Path
+    from src.services.excel_reader import ExcelReaderService
+    from src.services.data_transformer import DataTransformerService
+    from src.services.profit_calculator import ProfitCalculatorService
+    from src.services.cost_layers import COSTING_LABELS, COSTING_METHODS
+    from src.services.customer_profitability import CustomerProfitabilityService
+
+# Custom CSS
+st.markdown("""
+<style>
+    .main-header {
+        font-size: 2.5rem;
+        font-weight: bold;
+        color: #1f77b4;
+        margin-bottom: 1rem;
+    }
+</style>
+""", unsafe_allow_html=True)
+
+MEASURE_LABELS = {
+    'profit': 'Profit',
+    'revenue': 'Revenue',
+    'profit_margin': 'Margin %',
+    'discount': 'Discount',
+    'free_cost': 'Free Goods Cost',
+    'sz_profit_share': 'SZ Share',
+    'gz_profit_share': 'GZ Share',
+}
+
+COLUMN_LABELS = {
+    'customer_code': 'Code',
+    'customer_name': 'Customer',
+    'sale_count': 'Sales',
+    'sale_qty': 'Sale Qty',
+    'free_qty': 'Free Qty',
+    'revenue': 'Revenue',
+    'cogs': 'COGS',
+    'free_cost': 'Free Goods Cost',
+    'discount': 'Discount',
+    'profit': 'Profit',
+    'profit_margin': 'Margin %',
+    'sz_profit_share': 'SZ Share',
+    'gz_profit_share': 'GZ Share',
+    'last_sale_date': 'Last Sale',
+}
+
+COLUMN_FORMATS = {
+    'Sales': '{:,}', 'Sale Qty': '{:,}', 'Free Qty': '{:,}',
+    'Revenue': '₹{:,.0f}', 'COGS': '₹{:,.0f}', 'Free Goods Cost': '₹{:,.0f}', 'Discount': '₹{:,.0f}',
+    'Profit': '₹{:,.0f}', 'Margin %': '{:.1f}%', 'SZ Share': '₹{:,.0f}', 'GZ Share': '₹{:,.0f}',
+}
+
+
+@st.cache_data
+def load_data():
+    """Load and transform data from Excel."""
+    excel_file = Path('BayberryStock.xlsx')
+    
+    if not excel_file.exists():
+        st.error(f"❌ Excel file not found: {excel_file}")
+        st.stop()
+    
+    reader = ExcelReaderService(str(excel_file))
+    purchases_df, sales_df = reader.load_data()
+    
+    transformer = DataTransformerService()
+    purchases = transformer.transform_purchases(purchases_df)
+    sales = transformer.transform_sales(sales_df)
+    
+    # Same default range as the Sales Profit page, so totals agree
+    all_dates = [p.purchase_date for p in purchases if p.purchase_date]
+    all_dates += [s.transaction_date for s in sales if s.transaction_date]
+    if all_dates:
+        min_date, max_date = min(all_dates).date(), max(all_dates).date()
+    else:
+        from datetime import datetime
+        min_date, max_date = datetime(2020, 1, 1).date(), datetime.now().date()
+    
+    return purchases, sales, min_date, max_date
+
+
+@st.cache_data(max_entries=8)
+def get_customer_profitability(_purchases, _sales, snapshot, start_date, end_date, categories, costing, segments):
+    """Cost the sales in the date range and total them per customer."""
+    filtered_purchases = [
+        p for p in _purchases
+        if p.purchase_date and start_date <= p.purchase_date.date() <= end_date
+    ]
+    filtered_sales = [
+        s for s in _sales
+        if s.transaction_date and start_date <= s.transaction_date.date() <= end_date
+    ]
+    calculator = ProfitCalculatorService(filtered_purchases, filtered_sales, costing=costing)
+    batch_profits = calculator.calculate_batch_profits(include_categories=list(categories))
+    # Each sale counts under its own segment, not the batch's dominant one
+    return CustomerProfitabilityService(batch_profits, segments=list(segments))
+
+
+def format_customers(df):
+    """Customer rows with display labels and formatting."""
+    return df[list(COLUMN_LABELS)].rename(columns=COLUMN_LABELS).style.format(COLUMN_FORMATS)
+
+
+def main():
+    """Customer profitability page."""
+    st.markdown('<div class="main-header">👥 Customer Profitability</div>', unsafe_allow_html=True)
+    st.markdown("**Profit attributed to customers** • Revenue, costs, discounts and partner shares per customer")
+    st.markdown("---")
+    
+    with st.spinner("Loading data..."):
+        purchases, sales, min_date, max_date = load_data()
+    
+    # Sidebar
+    st.sidebar.title("⚙️ Configuration")
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("Categories to Analyze")
+    include_fg = st.sidebar.checkbox("FG (Finished Goods)", value=True)
+    include_tr = st.sidebar.checkbox("TR (Trading Goods)", value=True)
+    categories = []
+    if include_fg:
+        categories.append('FG')
+    if include_tr:
+        categories.append('TR')
+    if not categories:
+        st.error("⚠️ Please select at least one category to analyze!")
+        return
+    
+    st.sidebar.subheader("Costing Method")
+    costing = st.sidebar.selectbox(
+        "Cost sales at",
+        options=list(COSTING_METHODS),
+        format_func=lambda m: COSTING_LABELS[m],
+        key="customer_costing_method"
+    )
+    
+    # Filters
+    all_segments = st.session_state.user.get_allowed_segments()
+    selected_segments = st.multiselect(
+        "Segments",
+        options=all_segments,
+        default=all_segments,
+        key="customer_segment_filter"
+    )
+    if not selected_segments:
+        st.error("⚠️ Please select at least one segment!")
+        return
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        start_date = st.date_input("Start Date", value=min_date, min_value=min_date, max_value=max_date,
+                                   key="customer_start_date")
+    with col2:
+        end_date = st.date_input("End Date", value=max_date, min_value=min_date, max_value=max_date,
+                                 key="customer_end_date")
+    st.markdown("---")
+    
+    with stage("Customer Profitability: calculate"):
+        service = get_customer_profitability(
+            purchases, sales, (len(purchases), len(sales), min_date, max_date),
+            start_date, end_date, tuple(categories), costing, tuple(selected_segments)
+        )
+    customers = service.customers
+    if customers.empty:
+        st.info("No sales found for the selected filters.")
+        return
+    
+    # Summary
+    totals = service.totals()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Customers", f"{len(service):,}")
+    with col2:
+        st.metric("Revenue", f"₹{totals['revenue']:,.0f}")
+    with col3:
+        margin = totals['profit'] / totals['revenue'] * 100 if totals['revenue'] > 0 else 0
+        st.metric("Profit", f"₹{totals['profit']:,.0f}", f"{margin:.1f}% margin")
+    with col4:
+        st.metric("Loss-making Customers", f"{(customers['profit'] < 0).sum():,}")
+    
+    # Top / bottom customers
+    st.header("🏆 Top and Bottom Customers")
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        rank_by = st.selectbox("Rank by", options=list(MEASURE_LABELS), format_func=MEASURE_LABELS.get,
+                               key="customer_rank_by")
+    with col2:
+        n = st.number_input("Customers", min_value=1, max_value=100, value=10, key="customer_top_n")
+    top = service.top(n, rank_by)
+    bottom = service.bottom(n, rank_by)
+    
+    fig = px.bar(
+        pd.concat([top.assign(group='Top'), bottom.assign(group='Bottom')]).drop_duplicates(['customer_code', 'customer_name']),
+        x=rank_by, y='customer_name', color='group', orientation='h',
+        labels={rank_by: MEASURE_LABELS[rank_by], 'customer_name': 'Customer', 'group': ''},
+        title=f"Top and Bottom {n} Customers by {MEASURE_LABELS[rank_by]}",
+        color_discrete_map={'Top': '#2ca02c', 'Bottom': '#d62728'},
+    )
+    fig.update_layout(yaxis={'categoryorder': 'total ascending'}, height=max(400, 30 * min(2 * n, len(customers))))
+    st.plotly_chart(fig, use_container_width=True)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader(f"Top {n}")
+        st.dataframe(format_customers(top), hide_index=True, use_container_width=True)
+    with col2:
+        st.subheader(f"Bottom {n}")
+        st.dataframe(format_customers(bottom), hide_index=True, use_container_width=True)
+    
+    # All customers
+    st.header("📋 All Customers")
+    search = st.text_input("Search customer", placeholder="Name or code", key="customer_search")
+    view = customers
+    if search:
+        needle = search.strip().lower()
+        view = customers[
+            customers['customer_name'].str.lower().str.contains(needle, regex=False)
+            | customers['customer_code'].str.lower().str.contains(needle, regex=False)
+        ]
+    view = view.sort_values('profit', ascending=False)
+    st.dataframe(format_customers(view), hide_index=True, use_container_width=True)
+    st.download_button(
+        label="Download CSV",
+        data=view.to_csv(index=False).encode('utf-8'),
+        file_name="customer_profitability.csv",
+        mime="text/csv"
+    )
+
+
+if __name__ == "__main__":
+    with stage("Customer Profitability: render page"):
+        main()
+    render_performance_panel()
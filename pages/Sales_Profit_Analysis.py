@@ -1,15 +1,10 @@
 """Sales Profit Analysis - Batch-wise Profit Dashboard."""
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from pathlib import Path
 
-from src.utils.auth import require_password
-from src.services.excel_reader import ExcelReaderService
-from src.services.data_transformer import DataTransformerService
-from src.services.profit_calculator import ProfitCalculatorService
-from src.services.analysis import AnalysisService
+from src.utils.auth import AdminRole, require_password
+from src.utils.perf import stage
+from src.utils.perf_panel import render_performance_panel
+
 
 # Page configuration
 st.set_page_config(
@@ -29,6 +24,32 @@ if not st.session_state.user.can_access_page("Sales Profit Analysis"):
     st.error("🚫 You do not have permission to access this page.")
     st.stop()
 
+# ========================================
+# DEFERRED IMPORTS - only after authentication,
+# so the login form renders without loading analytics modules
+# ========================================
+with stage("Sales Profit: imports"):
+    import pandas as pd
+    import plotly.express as px
+    import plotly.graph_objects as go
+    from datetime import timedelta
+    from pathlib import Path
+    from src.services.excel_reader import ExcelReaderService
+    from src.services.data_transformer import DataTransformerService
+    from src.services.profit_calculator import ProfitCalculatorService
+    from src.services.cost_layers import COSTING_LABELS, COSTING_METHODS
+    from src.services.analysis import AnalysisService
+    from src.services.profit_share_scenarios import ProfitShareScenarioService, ShareScenario
+    from src.services.profit_cube import ProfitCube
+    from src.services.period_comparison import PeriodWindow, month_windows, previous_period, same_period_last_year
+    from src.services.inventory import InventoryService, item_sell_through, month_ends
+    from src.services.expiry_index import ExpiryIndex
+    from src.services.tax_reconciliation import TaxReconciliationService
+    from src.services.below_cost import BelowCostDetector
+    from src.services.charge_allocation import ChargeAllocationService
+    from src.services.sqlite_store import open_default_store
+    from src.config import STORAGE_BACKEND
+
 # Add navigation hint
 st.sidebar.success("👈 Use the sidebar to navigate")
 
@@ -78,14 +99,75 @@ def load_data():
     
     return purchases, sales, reader.get_summary(), min_date, max_date
 
+@st.cache_resource
+def get_store():
+    """Open the SQLite store when that storage backend is configured."""
+    if STORAGE_BACKEND != 'sqlite':
+        return None
+    return open_default_store()
+
 @st.cache_data
 def get_analysis_data(_purchases, _sales):
     """Get additional analysis data with caching."""
-    analyzer = AnalysisService(_purchases, _sales)
+    analyzer = AnalysisService(_purchases, _sales, store=get_store())
     fg_tr_orphans, other_orphans = analyzer.get_orphan_sales()
     charges_report = analyzer.create_charges_report()
     return analyzer, fg_tr_orphans, other_orphans, charges_report
 
+@st.cache_data(max_entries=16)
+def get_profit_cube(_batch_profits, snapshot, start_date, end_date, categories, costing, segments):
+    """Build the profit cube once per data snapshot and filter combination."""
+    return ProfitCube.build(_batch_profits)
+
+@st.cache_data(max_entries=8)
+def get_period_comparison(_purchases, _sales, snapshot, windows, categories, costing, segments):
+    """Cost every sale in the compared windows once and total them per window."""
+    windows = [PeriodWindow(*w) for w in windows]
+    first, last = windows[0].start, windows[-1].end
+    window_sales = [
+        s for s in _sales
+        if s.transaction_date and first <= s.transaction_date.date() <= last
+    ]
+    calculator = ProfitCalculatorService(_purchases, window_sales, costing=costing)
+    batch_profits = [
+        bp for bp in calculator.calculate_batch_profits(include_categories=list(categories))
+        if bp.segment is None or bp.segment in segments or bp.segment == 'Unknown'
+    ]
+    return calculator.compare_periods(windows, batch_profits=batch_profits)
+
+@st.cache_resource(max_entries=4)
+def get_inventory(_purchases, _sales, snapshot, categories):
+    """Receipt/issue event arrays for as-of stock positions (full history)."""
+    return InventoryService(_purchases, _sales, include_categories=list(categories))
+
+@st.cache_resource(max_entries=4)
+def get_below_cost(_purchases, _sales, snapshot, categories, costing):
+    """Loss-making sale lines over the full history."""
+    return BelowCostDetector(_purchases, _sales, include_categories=list(categories), costing=costing)
+
+@st.cache_resource(max_entries=4)
+def get_charge_allocation(_purchases, snapshot, basis, categories):
+    """SV/CO/CG charges spread over the goods lines of each batch (full history)."""
+    return ChargeAllocationService(_purchases, basis=basis, include_categories=list(categories))
+
+@st.cache_data(max_entries=8)
+def get_tax_reconciliation(_purchases, _sales, snapshot, start_date, end_date, segments, include_inputs):
+    """Input/output GST frames and rate checks for the date range and segments.
+    
+    Input tax is company-wide (purchases carry no segment), so it is only
+    included when ``include_inputs`` is set.
+    """
+    segment_sales = [
+        s for s in _sales
+        if s.segment is None or s.segment in segments or s.segment == 'Unknown'
+    ]
+    return TaxReconciliationService(_purchases if include_inputs else None, segment_sales, start_date, end_date)
+
+@st.cache_data(max_entries=4)
+def get_tax_workbook(_reconciliation, snapshot, start_date, end_date, segments, include_inputs):
+    """Filing workbook for the date range (written once, not on every rerun)."""
+    return _reconciliation.to_excel()
+
 def format_batch_profits_dataframe(profits_df):
     """Format batch profits dataframe with proper column order and formatting.
     To change column order, simply rearrange items in the COLUMN_ORDER list.
@@ -199,6 +281,27 @@ def main():
         st.error("⚠️ Please select at least one category to analyze!")
         return
     
+    # Costing method for batches purchased more than once
+    st.sidebar.subheader("Costing Method")
+    costing = st.sidebar.selectbox(
+        "Cost sales at",
+        options=list(COSTING_METHODS),
+        format_func=lambda m: COSTING_LABELS[m],
+        help="How COGS is assigned when a batch has several purchases: the last purchase rate, "
+             "FIFO cost layers, or a running weighted average (both ordered by date)",
+        key="costing_method"
+    )
+    
+    # Basis for spreading SV/CO/CG charges over each batch's goods lines
+    st.sidebar.subheader("Charge Allocation")
+    allocation_basis = st.sidebar.radio(
+        "Allocate charges by",
+        ["Value", "Qty"],
+        horizontal=True,
+        help="Spread each batch's charges over its FG/TR purchase lines by line value or quantity",
+        key="charge_basis"
+    )
+    
     # Segment filter (in main page)
     st.subheader("🎯 Segments to Include")
     all_segments = st.session_state.user.get_allowed_segments()
@@ -242,27 +345,37 @@ def main():
     
     st.markdown("---")
     
-    # Apply date filters to show filtered counts
-    filtered_purchases = [
-        p for p in purchases
-        if p.purchase_date and start_date <= p.purchase_date.date() <= end_date
-    ]
+    store = get_store()
     
-    filtered_sales = [
-        s for s in sales
-        if s.transaction_date and start_date <= s.transaction_date.date() <= end_date
-    ]
+    # Apply date filters to show filtered counts
+    with stage("Sales Profit: date filter") as info:
+        if store is not None:
+            # Date predicates are pushed down to the store's indexes
+            num_purchases, num_sales = store.count_in_range(start_date, end_date)
+        else:
+            filtered_purchases = [
+                p for p in purchases
+                if p.purchase_date and start_date <= p.purchase_date.date() <= end_date
+            ]
+            
+            filtered_sales = [
+                s for s in sales
+                if s.transaction_date and start_date <= s.transaction_date.date() <= end_date
+            ]
+            num_purchases, num_sales = len(filtered_purchases), len(filtered_sales)
+        info['rows'] = num_purchases + num_sales
     
-    st.info(f"📊 Filtered: **{len(filtered_purchases):,}** purchases and **{len(filtered_sales):,}** sales (from {start_date} to {end_date})")
+    st.info(f"📊 Filtered: **{num_purchases:,}** purchases and **{num_sales:,}** sales (from {start_date} to {end_date})")
     
     st.markdown("---")
     
     # Calculate profits with filtered data
     with st.spinner("Calculating profits..."):
-        calculator = ProfitCalculatorService(filtered_purchases, filtered_sales)
+        if store is not None:
+            calculator = ProfitCalculatorService.from_store(store, start_date, end_date, categories, costing=costing)
+        else:
+            calculator = ProfitCalculatorService(filtered_purchases, filtered_sales, costing=costing)
         batch_profits = calculator.calculate_batch_profits(include_categories=categories)
-        summary_by_category = calculator.get_summary_by_category(batch_profits)
-        overall_summary = calculator.get_summary_stats(batch_profits)
     
     # Filter by selected segments
     batch_profits = [
@@ -270,10 +383,28 @@ def main():
         if bp.segment is None or bp.segment in selected_segments or bp.segment == 'Unknown'
     ]
     
-    # Recalculate summary stats after segment filtering
-    calculator = ProfitCalculatorService(filtered_purchases, filtered_sales)
-    overall_summary = calculator.get_summary_stats(batch_profits)
-    summary_by_category = calculator.get_summary_by_category(batch_profits)
+    # Loaded cost: charges booked on each batch (full history), before any table or export is built
+    with stage("Sales Profit: charge allocation"):
+        allocation = get_charge_allocation(purchases, (len(purchases), len(sales), min_date, max_date),
+                                           allocation_basis.lower(), tuple(categories))
+        allocation.apply(batch_profits)
+    
+    # Batch-level summary stats after segment filtering (the store aggregates last-purchase costing);
+    # category performance rolls up from the profit cube below
+    if store is not None and costing == 'last':
+        overall_summary, _ = ProfitCalculatorService.get_summaries_from_store(
+            store, start_date, end_date, categories, selected_segments
+        )
+    else:
+        overall_summary = calculator.get_summary_stats(batch_profits)
+    
+    # Sale-level rollups (partner shares, categories, trends) come from the cube
+    with stage("Sales Profit: profit cube"):
+        profit_cube = get_profit_cube(
+            batch_profits, (len(purchases), len(sales), min_date, max_date),
+            start_date, end_date, tuple(categories), costing, tuple(selected_segments)
+        )
+    cube_totals = profit_cube.totals()
     
     # Get analysis data
     with st.spinner("Preparing additional reports..."):
@@ -281,7 +412,8 @@ def main():
             purchases, sales
         )
     # Convert to DataFrame for display
-    profits_df = pd.DataFrame([bp.to_dict() for bp in batch_profits])
+    with stage("Sales Profit: build table", rows=len(batch_profits)):
+        profits_df = pd.DataFrame([bp.to_dict() for bp in batch_profits])
     # Summary Section
     st.header("📈 Executive Summary")
     col1, col2, col3, col4 = st.columns(4)
@@ -315,8 +447,8 @@ def main():
     
     # Partner Profit Shares
     col1, col2, col3, col4 = st.columns(4)
-    total_sz_share = sum(bp.sz_profit_share for bp in batch_profits)
-    total_gz_share = sum(bp.gz_profit_share for bp in batch_profits)
+    total_sz_share = cube_totals['sz_profit_share']
+    total_gz_share = cube_totals['gz_profit_share']
     
     with col1:
         st.metric(
@@ -331,6 +463,74 @@ def main():
             help="Total profit share for partner GZ"
         )
     
+    # What-if: alternative SZ/GZ splits without recalculating the batches
+    with st.expander("🧪 Profit Share Scenarios"):
+        with stage("Sales Profit: share scenarios") as info:
+            scenario_service = ProfitShareScenarioService(batch_profits)
+            info['rows'] = len(batch_profits)
+        current = ShareScenario.current()
+        segment_labels = [seg if seg else 'Unknown' for seg in scenario_service.segments]
+        
+        num_scenarios = st.number_input("Scenarios", min_value=1, max_value=6, value=2, key="share_scenario_count")
+        editor_df = pd.DataFrame({'Segment': segment_labels})
+        editor_df['Current SZ %'] = [current.share(seg)['SZ'] for seg in scenario_service.segments]
+        for i in range(int(num_scenarios)):
+            editor_df[f"Scenario {i + 1} SZ %"] = editor_df['Current SZ %']
+        edited = st.data_editor(
+            editor_df,
+            disabled=['Segment', 'Current SZ %'],
+            hide_index=True,
+            use_container_width=True,
+            key="share_scenario_editor",
+        )
+        st.caption("GZ gets the remainder (100 - SZ). 'Unknown' uses the default share.")
+        
+        scenarios = [current]
+        for i in range(int(num_scenarios)):
+            column = f"Scenario {i + 1} SZ %"
+            shares = {seg: dict(v) for seg, v in current.shares.items()}
+            default = dict(current.default)
+            for seg, sz in zip(scenario_service.segments, edited[column]):
+                sz = float(min(max(sz, 0), 100))
+                if seg:
+                    shares[seg] = {'SZ': sz, 'GZ': 100 - sz}
+                else:
+                    default = {'SZ': sz, 'GZ': 100 - sz}
+            scenarios.append(ShareScenario(f"Scenario {i + 1}", shares, default))
+        result = scenario_service.evaluate(scenarios)
+        
+        totals_df = result.totals_frame()
+        totals_df['sz_change'] = totals_df['sz_profit_share'] - totals_df['sz_profit_share'].iloc[0]
+        st.dataframe(
+            totals_df.rename(columns={
+                'scenario': 'Scenario',
+                'sz_profit_share': 'SZ Profit Share',
+                'gz_profit_share': 'GZ Profit Share',
+                'sz_change': 'SZ Change vs Current',
+            }).style.format({
+                'SZ Profit Share': '₹{:,.0f}',
+                'GZ Profit Share': '₹{:,.0f}',
+                'SZ Change vs Current': '₹{:+,.0f}',
+            }),
+            hide_index=True,
+            use_container_width=True,
+        )
+        st.markdown("**SZ Profit Share by Segment**")
+        st.dataframe(result.segment_frame('SZ').style.format('₹{:,.0f}'), use_container_width=True)
+        
+        # Sweep one segment's SZ share from 0% to 100%
+        sweep_label = st.selectbox("Sweep SZ share for segment", segment_labels, key="share_sweep_segment")
+        sweep_segment = scenario_service.segments[segment_labels.index(sweep_label)]
+        sweep = scenario_service.sweep(sweep_segment, list(range(0, 101)))
+        sweep_df = pd.DataFrame({
+            'SZ %': list(range(0, 101)),
+            'SZ Profit Share': sweep.total_sz,
+            'GZ Profit Share': sweep.total_gz,
+        })
+        fig_sweep = px.line(sweep_df, x='SZ %', y=['SZ Profit Share', 'GZ Profit Share'],
+                            title=f"Total shares vs {sweep_label} SZ %")
+        st.plotly_chart(fig_sweep, use_container_width=True)
+    
     # Profit Distribution
     col1, col2 = st.columns(2)
     with col1:
@@ -353,16 +553,13 @@ def main():
         st.plotly_chart(fig_dist, use_container_width=True)
     with col2:
         st.subheader("Category-wise Performance")
-        if summary_by_category:
-            cat_data = []
-            for cat, data in summary_by_category.items():
-                cat_data.append({
-                    'Category': cat,
-                    'Profit': data['total_profit'],
-                    'Revenue': data['total_revenue'],
-                    'Margin %': data['avg_profit_margin']
-                })
-            cat_df = pd.DataFrame(cat_data)
+        cat_df = profit_cube.rollup(['category']).rename(columns={
+            'category': 'Category',
+            'profit': 'Profit',
+            'revenue': 'Revenue',
+            'profit_margin': 'Margin %',
+        })
+        if not cat_df.empty:
             fig_cat = go.Figure()
             fig_cat.add_trace(go.Bar(
                 x=cat_df['Category'],
@@ -376,6 +573,160 @@ def main():
                 showlegend=False
             )
             st.plotly_chart(fig_cat, use_container_width=True)
+    
+    # Monthly Trend (by sale month)
+    st.subheader("Monthly Trend")
+    trend_by = st.radio("Split by", ["None", "Segment", "Category", "Manager", "Division"], horizontal=True,
+                        key="trend_split")
+    dims = ['month'] if trend_by == "None" else ['month', trend_by.lower()]
+    trend_df = profit_cube.rollup(dims)
+    if not trend_df.empty:
+        if trend_by == "None":
+            fig_trend = go.Figure()
+            fig_trend.add_trace(go.Bar(x=trend_df['month'], y=trend_df['revenue'], name='Revenue', marker_color='lightblue'))
+            fig_trend.add_trace(go.Scatter(x=trend_df['month'], y=trend_df['profit'], name='Profit',
+                                           mode='lines+markers', marker_color='green'))
+            fig_trend.update_layout(xaxis_title="Month", yaxis_title="Amount (₹)", xaxis_type='category')
+        else:
+            fig_trend = px.bar(trend_df, x='month', y='profit', color=dims[1],
+                               labels={'month': 'Month', 'profit': 'Profit (₹)', dims[1]: trend_by})
+            fig_trend.update_layout(xaxis_type='category')
+        st.plotly_chart(fig_trend, use_container_width=True)
+    
+    # Manager & Division Performance (rolled up from the cached cube, so switching views is cheap)
+    st.subheader("Manager & Division Performance")
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        leader_by = st.radio("Group by", ["Manager", "Division", "Manager × Division"], horizontal=True,
+                             key="leader_group")
+    with col2:
+        leader_monthly = st.checkbox("Slice by month", value=False, key="leader_monthly")
+    leader_dims = {'Manager': ['manager'], 'Division': ['division'],
+                   'Manager × Division': ['manager', 'division']}[leader_by]
+    leader_df = profit_cube.rollup(leader_dims)
+    if leader_df.empty:
+        st.info("No sales in the selected range.")
+    elif leader_monthly:
+        monthly_df = profit_cube.rollup(['month'] + leader_dims)
+        monthly_df['group'] = monthly_df[leader_dims].astype(str).agg(' / '.join, axis=1)
+        fig_leader = px.line(monthly_df, x='month', y='profit_margin', color='group', markers=True,
+                             hover_data={'revenue': ':,.0f', 'profit': ':,.0f'},
+                             labels={'month': 'Month', 'profit_margin': 'Margin (%)', 'group': leader_by})
+        fig_leader.update_layout(xaxis_type='category')
+        st.plotly_chart(fig_leader, use_container_width=True)
+    else:
+        leader_df['group'] = leader_df[leader_dims].astype(str).agg(' / '.join, axis=1)
+        fig_leader = px.bar(leader_df.sort_values('profit', ascending=False), x='group', y='profit',
+                            color='profit_margin', color_continuous_scale='RdYlGn',
+                            hover_data={'revenue': ':,.0f', 'profit_margin': ':.1f'},
+                            labels={'group': leader_by, 'profit': 'Profit (₹)', 'profit_margin': 'Margin (%)'})
+        st.plotly_chart(fig_leader, use_container_width=True)
+    if not leader_df.empty:
+        leader_columns = {
+            'manager': 'Manager', 'division': 'Division', 'sale_count': 'Sales', 'revenue': 'Revenue',
+            'cost_of_sales': 'Cost of Sales', 'discount': 'Discount', 'profit': 'Profit',
+            'profit_margin': 'Margin %', 'sz_profit_share': 'SZ Share', 'gz_profit_share': 'GZ Share',
+        }
+        st.dataframe(
+            leader_df.sort_values('profit', ascending=False)[[c for c in leader_columns if c in leader_df.columns]]
+            .rename(columns=leader_columns).style.format({
+                'Sales': '{:,}', 'Revenue': '₹{:,.0f}', 'Cost of Sales': '₹{:,.0f}', 'Discount': '₹{:,.0f}',
+                'Profit': '₹{:,.0f}', 'Margin %': '{:.1f}%', 'SZ Share': '₹{:,.0f}', 'GZ Share': '₹{:,.0f}',
+            }),
+            hide_index=True,
+            use_container_width=True
+        )
+    
+    # Geography (country → city, from the cube's segment × country × city aggregate)
+    st.subheader("Geography")
+    geo_segments = sorted(profit_cube.rollup(['segment'])['segment'].tolist())
+    geo_segment = st.selectbox(
+        "Segment",
+        ["All selected segments"] + geo_segments,
+        index=1 + geo_segments.index('EXPORT') if 'EXPORT' in geo_segments else 0,
+        key="geo_segment"
+    )
+    geo_cube = profit_cube if geo_segment == "All selected segments" else profit_cube.filter(segment=[geo_segment])
+    geo_df = geo_cube.rollup(['country', 'city'])
+    geo_df = geo_df[geo_df['revenue'] > 0]
+    if geo_df.empty:
+        st.info("No sales with revenue for this segment.")
+    else:
+        fig_geo = px.treemap(
+            geo_df, path=[px.Constant("All"), 'country', 'city'], values='revenue', color='profit_margin',
+            color_continuous_scale='RdYlGn', color_continuous_midpoint=0,
+            hover_data={'profit': ':,.0f', 'sale_qty': ':,.0f'},
+            labels={'revenue': 'Revenue (₹)', 'profit_margin': 'Margin (%)', 'profit': 'Profit (₹)',
+                    'sale_qty': 'Sale Qty'},
+            title="Revenue by Country and City (colour = margin)"
+        )
+        st.plotly_chart(fig_geo, use_container_width=True)
+        country_df = geo_cube.rollup(['country'])
+        st.dataframe(
+            country_df.sort_values('revenue', ascending=False)[
+                ['country', 'sale_count', 'sale_qty', 'free_qty', 'revenue', 'profit', 'profit_margin']
+            ].rename(columns={
+                'country': 'Country', 'sale_count': 'Sales', 'sale_qty': 'Sale Qty', 'free_qty': 'Free Qty',
+                'revenue': 'Revenue', 'profit': 'Profit', 'profit_margin': 'Margin %',
+            }).style.format({'Sales': '{:,}', 'Sale Qty': '{:,}', 'Free Qty': '{:,}', 'Revenue': '₹{:,.0f}',
+                             'Profit': '₹{:,.0f}', 'Margin %': '{:.1f}%'}),
+            hide_index=True,
+            use_container_width=True
+        )
+    
+    # Period Comparison (sales costed against all purchases, split by sale date)
+    st.subheader("Period Comparison")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        compare_mode = st.selectbox(
+            "Compare selected range with",
+            ["Previous period", "Same period last year", "Month over month"],
+            key="compare_mode"
+        )
+    with col2:
+        compare_level = st.selectbox("Movers by", ["Item", "Batch", "Segment", "Category"], key="compare_level")
+    with col3:
+        compare_measure = st.selectbox("Measure", ["Profit", "Revenue", "Sale Qty"], key="compare_measure")
+    
+    current_window = PeriodWindow(f"{start_date} to {end_date}", start_date, end_date)
+    if compare_mode == "Previous period":
+        windows = [previous_period(start_date, end_date), current_window]
+    elif compare_mode == "Same period last year":
+        windows = [same_period_last_year(start_date, end_date), current_window]
+    else:
+        windows = month_windows(start_date, end_date)
+    
+    with stage("Sales Profit: period comparison"):
+        comparison = get_period_comparison(
+            purchases, sales, (len(purchases), len(sales), min_date, max_date),
+            tuple((w.label, w.start, w.end) for w in windows),
+            tuple(categories), costing, tuple(selected_segments)
+        )
+    measure = compare_measure.lower().replace(' ', '_')
+    window_totals = comparison.window_totals()
+    if len(windows) > 1:
+        prev_total, last_total = window_totals[measure].iloc[-2], window_totals[measure].iloc[-1]
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric(f"{compare_measure} ({windows[-2].label})", f"{prev_total:,.0f}")
+        with col2:
+            change_pct = f"{(last_total - prev_total) / abs(prev_total) * 100:+.1f}%" if prev_total else None
+            st.metric(f"{compare_measure} ({windows[-1].label})", f"{last_total:,.0f}", change_pct)
+    if compare_mode == "Month over month":
+        fig_mom = px.bar(window_totals, x='window', y=measure, labels={'window': 'Month', measure: compare_measure})
+        fig_mom.update_layout(xaxis_type='category')
+        st.plotly_chart(fig_mom, use_container_width=True)
+    
+    movers_df = comparison.movers(compare_level.lower(), measure, n=15)
+    st.markdown(f"**Largest movers** ({windows[-2].label if len(windows) > 1 else '-'} → {windows[-1].label})")
+    st.dataframe(
+        movers_df.style.format(
+            {col: '{:,.2f}' for col in [w.label for w in windows] + ['change']} | {'change_pct': '{:+.1f}%'},
+            na_rep='-'
+        ),
+        hide_index=True,
+        use_container_width=True
+    )
     st.markdown("---")
     # Batch-wise Profit Table
     st.header("🔍 Batch-wise Profit Analysis")
@@ -449,6 +800,17 @@ def main():
                 st.metric("Free Qty", f"{batch_profit.total_free_qty:,}")
             with col4:
                 st.metric("Remaining", f"{batch_profit.remaining_qty:,}")
+            # Cost layers (every purchase of this item in the batch)
+            if len(batch_profit.purchases) > 1:
+                st.markdown(f"##### Cost Layers ({COSTING_LABELS[batch_profit.costing]})")
+                layers_df = pd.DataFrame([{
+                    'purchase_date': p.purchase_date.strftime('%Y-%m-%d') if p.purchase_date else None,
+                    'vendor_name': p.vendor_name,
+                    'qty': p.in_qty,
+                    'rate': round(p.in_rate, 2),
+                    'value': round(p.total_cost, 2),
+                } for p in sorted(batch_profit.purchases, key=lambda p: (p.purchase_date is not None, p.purchase_date or 0))])
+                st.dataframe(layers_df, use_container_width=True, hide_index=True)
             # Sales Details Table
             st.markdown("---")
             st.subheader("📊 Individual Sales Breakdown")
@@ -458,7 +820,7 @@ def main():
                 # Format sales detail dataframe for display
                 sales_display = sales_detail_df.copy()
                 # Format currency columns
-                currency_cols = ['out_rate', 'gross_value', 'discount_value', 'revenue_from_sale',
+                currency_cols = ['unit_cost', 'out_rate', 'gross_value', 'discount_value', 'revenue_from_sale',
                                 'cost_of_goods_sold', 'cost_due_to_free', 'cost_due_to_discount', 
                                 'final_profit', 'sz_profit_share', 'gz_profit_share']
                 for col in currency_cols:
@@ -475,6 +837,7 @@ def main():
                     'free_qty': 'Free Qty',
                     'out_qty': 'Out Qty',
                     'out_rate': 'Sale Rate',
+                    'unit_cost': 'Unit Cost',
                     'segment': 'Segment',
                     'gross_value': 'Gross Value (w/ GST)',
                     'discount_value': 'Discount',
@@ -594,6 +957,187 @@ def main():
             file_name="batch_profits.csv",
             mime="text/csv"
         )
+    # Inventory Position (full history, independent of the date filter)
+    st.markdown("---")
+    st.header("📦 Inventory Position")
+    with stage("Sales Profit: inventory position"):
+        inventory = get_inventory(purchases, sales, (len(purchases), len(sales), min_date, max_date), tuple(categories))
+    as_of_date = st.date_input(
+        "Stock as of",
+        value=end_date,
+        min_value=min_date,
+        max_value=max_date,
+        help="On-hand quantity = receipts minus sales up to this date, valued at the batch's average purchase rate",
+        key="inventory_as_of"
+    )
+    stock_df = inventory.as_of(as_of_date)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Stock Value", f"₹{stock_df['stock_value'].sum():,.0f}")
+    with col2:
+        st.metric("On-hand Quantity", f"{stock_df['on_hand'].sum():,.0f}")
+    with col3:
+        st.metric("Batches in Stock", f"{len(stock_df):,}")
+    if inventory.undated_sales:
+        st.caption(f"{inventory.undated_sales:,} sales without a transaction date are not included.")
+    
+    stock_dates = month_ends(start_date, end_date)
+    if stock_dates:
+        stock_series = inventory.category_series(stock_dates)
+        fig_stock = px.bar(stock_series, x='as_of', y='stock_value', color='category',
+                           labels={'as_of': 'Month End', 'stock_value': 'Stock Value (₹)', 'category': 'Category'},
+                           title="Month-end Stock Value")
+        st.plotly_chart(fig_stock, use_container_width=True)
+    st.dataframe(
+        stock_df.head(100).rename(columns={
+            'batch_ref_no': 'Batch', 'item_code': 'Item Code', 'item_name': 'Item', 'category': 'Category',
+            'vendor_name': 'Vendor', 'received_qty': 'Received', 'issued_qty': 'Issued',
+            'on_hand': 'On Hand', 'avg_rate': 'Avg Rate', 'stock_value': 'Stock Value', 'expiry_date': 'Expiry',
+        }).style.format({'Received': '{:,.0f}', 'Issued': '{:,.0f}', 'On Hand': '{:,.0f}',
+                         'Avg Rate': '₹{:,.2f}', 'Stock Value': '₹{:,.0f}', 'Expiry': '{:%m/%Y}'}, na_rep='-'),
+        hide_index=True,
+        use_container_width=True
+    )
+    
+    # Expiry Risk (stock on hand at the as-of date, by time left to expiry)
+    st.markdown("---")
+    st.header("⏳ Expiry Risk")
+    with stage("Sales Profit: expiry index"):
+        # Kept per session and updated in place when the stock position changes
+        expiry_index = st.session_state.get('expiry_index')
+        if expiry_index is None:
+            expiry_index = st.session_state['expiry_index'] = ExpiryIndex()
+        expiry_index.update(stock_df)
+    horizon = st.slider("Expiring within (days)", min_value=0, max_value=365, value=90, step=15,
+                        key="expiry_horizon")
+    expired = expiry_index.totals_between(None, as_of_date - timedelta(days=1))
+    expiring = expiry_index.expiring_within(horizon, as_of_date)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Expired Stock Value", f"₹{expired['stock_value']:,.0f}",
+                  help=f"{expired['batches']:,} batches, {expired['on_hand']:,.0f} units past expiry")
+    with col2:
+        st.metric(f"Expiring in {horizon} Days", f"₹{expiring['stock_value']:,.0f}")
+    with col3:
+        st.metric("Batches at Risk", f"{expiring['batches']:,}",
+                  help=f"{expiring['on_hand']:,.0f} units")
+    
+    ageing_df = expiry_index.ageing(as_of_date)
+    fig_ageing = px.bar(ageing_df, x='bucket', y='stock_value', text='batches',
+                        labels={'bucket': 'Time to Expiry', 'stock_value': 'Stock Value (₹)', 'batches': 'Batches'},
+                        title=f"Stock Value by Time to Expiry (as of {as_of_date})")
+    st.plotly_chart(fig_ageing, use_container_width=True)
+    expiring_df = expiry_index.batches_between(as_of_date, as_of_date + timedelta(days=horizon))
+    if expiring_df.empty:
+        st.info(f"No stock expires within {horizon} days of {as_of_date}.")
+    else:
+        st.dataframe(
+            expiring_df.rename(columns={
+                'batch_ref_no': 'Batch', 'expiry_date': 'Expiry', 'item_code': 'Item Code', 'item_name': 'Item',
+                'category': 'Category', 'vendor_name': 'Vendor', 'on_hand': 'On Hand', 'avg_rate': 'Avg Rate',
+                'stock_value': 'Stock Value',
+            }).style.format({'On Hand': '{:,.0f}', 'Avg Rate': '₹{:,.2f}', 'Stock Value': '₹{:,.0f}'}),
+            hide_index=True,
+            use_container_width=True
+        )
+    
+    # Sell-through Velocity (full history up to the as-of date)
+    st.markdown("---")
+    st.header("🚚 Sell-through Velocity")
+    with stage("Sales Profit: sell-through velocity"):
+        velocity_df = inventory.sell_through(as_of_date)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Median First-sale Lag", f"{velocity_df['first_sale_lag'].median():,.0f} days"
+                  if velocity_df['first_sale_lag'].notna().any() else "-")
+    with col2:
+        st.metric("Median Days to 50% Sold", f"{velocity_df['days_to_50'].median():,.0f} days"
+                  if velocity_df['days_to_50'].notna().any() else "-")
+    with col3:
+        st.metric("Batches Sold Out", f"{velocity_df['days_to_100'].notna().sum():,} / {len(velocity_df):,}")
+    pre_receipt = int(velocity_df['sold_before_receipt'].sum())
+    if pre_receipt:
+        st.caption(f"⚠️ {pre_receipt:,} batches have sales dated before their first receipt; "
+                   "their day counts start at 0.")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        velocity_level = st.radio("Level", ["Batch", "Item"], horizontal=True, key="velocity_level")
+    with col2:
+        velocity_sort = st.selectbox(
+            "Sort by",
+            ["Slowest movers (units/day)", "Lowest sell-through %", "Longest to 50% sold", "Longest first-sale lag"],
+            key="velocity_sort"
+        )
+    sort_column, ascending = {
+        "Slowest movers (units/day)": ('units_per_day', True),
+        "Lowest sell-through %": ('sell_through_pct', True),
+        "Longest to 50% sold": ('days_to_50', False),
+        "Longest first-sale lag": ('first_sale_lag', False),
+    }[velocity_sort]
+    velocity_view = velocity_df if velocity_level == "Batch" else item_sell_through(velocity_df)
+    velocity_view = velocity_view.sort_values(sort_column, ascending=ascending, na_position='last', kind='stable')
+    velocity_columns = {
+        'batch_ref_no': 'Batch', 'item_code': 'Item Code', 'item_name': 'Item', 'category': 'Category',
+        'batches': 'Batches', 'receipt_date': 'Received On', 'received_qty': 'Received', 'sold_qty': 'Sold',
+        'sell_through_pct': 'Sell-through %', 'first_sale_lag': 'First Sale (days)', 'days_to_50': 'Days to 50%',
+        'days_to_90': 'Days to 90%', 'days_to_100': 'Days to 100%', 'units_per_day': 'Units/Day',
+        'sold_before_receipt': 'Sold Before Receipt',
+    }
+    velocity_view = velocity_view[[c for c in velocity_columns if c in velocity_view.columns]]
+    st.dataframe(
+        velocity_view.head(100).rename(columns=velocity_columns).style.format({
+            'Received': '{:,.0f}', 'Sold': '{:,.0f}', 'Sell-through %': '{:.1f}%', 'First Sale (days)': '{:,.0f}',
+            'Days to 50%': '{:,.0f}', 'Days to 90%': '{:,.0f}', 'Days to 100%': '{:,.0f}', 'Units/Day': '{:,.2f}',
+        }, na_rep='-'),
+        hide_index=True,
+        use_container_width=True
+    )
+    
+    # Below-cost Sales (full history, costed with the selected costing method)
+    st.markdown("---")
+    st.header("🚨 Below-cost Sales")
+    st.caption(f"Unit cost: {COSTING_LABELS[costing]} (Costing Method in the sidebar)")
+    with stage("Sales Profit: below-cost detector"):
+        below_cost = get_below_cost(purchases, sales, (len(purchases), len(sales), min_date, max_date),
+                                    tuple(categories), costing)
+    only_range = st.checkbox("Only sales in the selected date range", value=True, key="below_cost_in_range")
+    alerts = below_cost.lines
+    alerts = alerts[alerts['segment'].isna() | alerts['segment'].isin(selected_segments)]
+    if only_range:
+        alert_dates = pd.to_datetime(alerts['transaction_date']).dt.date
+        alerts = alerts[(alert_dates >= start_date) & (alert_dates <= end_date)]
+    if alerts.empty:
+        st.success("No sales below cost or at a loss.")
+    else:
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Loss-making Lines", f"{len(alerts):,}",
+                      help=f"Out of {below_cost.sales_checked:,} costed sales in the full history")
+        with col2:
+            st.metric("Priced Below Cost", f"{int(alerts['below_cost'].sum()):,}")
+        with col3:
+            st.metric("Total Loss", f"₹{alerts['loss'].sum():,.0f}")
+        
+        alert_by = st.radio("Summarize by", ["Customer", "Manager", "Item"], horizontal=True, key="below_cost_group")
+        st.dataframe(
+            below_cost.summary(alert_by.lower(), alerts).head(50).style.format({
+                'revenue': '₹{:,.0f}', 'discount': '₹{:,.0f}', 'free_cost': '₹{:,.0f}', 'loss': '₹{:,.0f}',
+            }),
+            hide_index=True,
+            use_container_width=True
+        )
+        st.markdown("**Largest loss-making lines**")
+        st.dataframe(
+            alerts.nlargest(200, 'loss')[[
+                'transaction_date', 'bill_no', 'batch_no', 'item_name', 'customer_name', 'manager_name',
+                'sale_qty', 'free_qty', 'out_rate', 'unit_cost', 'discount', 'final_profit', 'reason',
+            ]].style.format({'out_rate': '₹{:,.2f}', 'unit_cost': '₹{:,.2f}', 'discount': '₹{:,.2f}',
+                             'final_profit': '₹{:,.2f}', 'sale_qty': '{:,.0f}', 'free_qty': '{:,.0f}'}),
+            hide_index=True,
+            use_container_width=True
+        )
+    
     # Orphan Sales Report
     st.markdown("---")
     st.header("⚠️ Sales Without Purchase Records (FG/TR)")
@@ -622,6 +1166,12 @@ def main():
         )
     else:
         st.success("✅ All FG/TR sales have matching purchase records!")
+    # Batch keys that only matched after normalization (e.g. "1234.0" vs "1234")
+    normalized_matches = calculator.get_normalized_matches()
+    if normalized_matches:
+        with st.expander(f"🔗 {len(normalized_matches)} batch(es) matched only after key normalization"):
+            st.caption("Purchase BTREFNO and sales Batch No. differed in number format, case or spacing.")
+            st.dataframe(pd.DataFrame(normalized_matches), use_container_width=True, hide_index=True)
     # Charges Analysis
     st.markdown("---")
     st.header("💼 Charges Analysis (SV/CO/CG)")
@@ -678,6 +1228,120 @@ def main():
                 st.metric("Net Impact", f"₹{net_charges:,.0f}", delta_color=delta_color)
     else:
         st.info("No charge items found in the dataset")
+    
+    # Charge allocation onto FG/TR batches (loaded cost and profit)
+    st.subheader("Charge Allocation")
+    st.caption(f"Allocated by {allocation_basis.lower()} (change in the sidebar)")
+    allocation_totals = allocation.totals()
+    if allocation_totals['charges'] == 0:
+        st.info("No SV/CO/CG charges booked on batches")
+    else:
+        charged = [bp for bp in batch_profits if bp.allocated_charges]
+        absorbed = sum(bp.allocated_charges for bp in charged)
+        loaded_profit = sum(bp.loaded_profit for bp in batch_profits)
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Charges Allocated", f"₹{allocation_totals['allocated']:,.0f}",
+                      help="Charges spread over goods lines, across the full history")
+        with col2:
+            st.metric("Unallocated Charges", f"₹{allocation_totals['unallocated']:,.0f}",
+                      help="Charges on batches without FG/TR purchase lines")
+        with col3:
+            st.metric("Charges on Goods Sold", f"₹{absorbed:,.0f}",
+                      help="Charge per unit × out quantity of the batches shown above")
+        with col4:
+            st.metric("Loaded Profit", f"₹{loaded_profit:,.0f}",
+                      f"₹{loaded_profit - overall_summary['total_profit']:,.0f}")
+        
+        if charged:
+            loaded_df = pd.DataFrame([{
+                'Batch No.': bp.batch_ref_no,
+                'Item Name': bp.item_name,
+                'Out Qty': bp.total_out_qty,
+                'Charge / Unit': bp.charge_per_unit,
+                'Charges': bp.allocated_charges,
+                'COGS': bp.total_cogs,
+                'Loaded Cost': bp.loaded_cost,
+                'Profit': bp.profit,
+                'Loaded Profit': bp.loaded_profit,
+            } for bp in charged]).sort_values('Charges', ascending=False)
+            st.dataframe(
+                loaded_df.style.format({
+                    'Out Qty': '{:,}', 'Charge / Unit': '₹{:,.2f}', 'Charges': '₹{:,.0f}', 'COGS': '₹{:,.0f}',
+                    'Loaded Cost': '₹{:,.0f}', 'Profit': '₹{:,.0f}', 'Loaded Profit': '₹{:,.0f}',
+                }),
+                hide_index=True,
+                use_container_width=True
+            )
+        unallocated_df = allocation.unallocated()
+        if not unallocated_df.empty:
+            with st.expander(f"⚠️ {len(unallocated_df)} batches with unallocated charges"):
+                st.dataframe(unallocated_df[['batch_no', 'charges', 'goods_qty']], hide_index=True,
+                             use_container_width=True)
+    
+    # GST Reconciliation (input tax on purchases vs output tax on sales, by transaction date)
+    st.markdown("---")
+    st.header("🧾 GST Reconciliation")
+    # Input tax cannot be split by segment: only admins looking at every segment see it
+    gst_segments = tuple(selected_segments)
+    include_inputs = (isinstance(st.session_state.user, AdminRole)
+                      and set(AdminRole().get_allowed_segments()) <= set(selected_segments))
+    with stage("Sales Profit: GST reconciliation"):
+        gst = get_tax_reconciliation(purchases, sales, (len(purchases), len(sales), min_date, max_date),
+                                     start_date, end_date, gst_segments, include_inputs)
+    gst_total = gst.reconcile([]).iloc[0]
+    if include_inputs:
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Input Tax (Purchases)", f"₹{gst_total['input_total_tax']:,.0f}")
+        with col2:
+            st.metric("Output Tax (Sales)", f"₹{gst_total['output_total_tax']:,.0f}")
+        with col3:
+            st.metric("Net Payable", f"₹{gst_total['net_payable']:,.0f}",
+                      help="Output tax minus input tax; negative means excess input credit")
+    else:
+        st.caption("Output tax of the selected segments only; input tax and net payable are "
+                   "company-wide and shown when every segment is selected.")
+        col2, col4 = st.columns(2)
+        with col2:
+            st.metric("Output Tax (Sales)", f"₹{gst_total['output_total_tax']:,.0f}")
+    with col4:
+        st.metric("Rate Mismatches", f"{int(gst_total['mismatched_lines']):,}",
+                  help="Sale lines whose tax amounts do not match taxable value × rate, or whose rates are inconsistent")
+    
+    gst_by = st.radio("Group by", ["Month", "HSN Code", "Location", "HSN × Month × Location"], horizontal=True,
+                      key="gst_group")
+    gst_keys = {'Month': ['month'], 'HSN Code': ['hsn_code'], 'Location': ['location_code'],
+                'HSN × Month × Location': ['hsn_code', 'month', 'location_code']}[gst_by]
+    gst_df = gst.reconcile(gst_keys)
+    amount_columns = [c for c in gst_df.columns if c.startswith(('input_', 'output_')) or c == 'net_payable']
+    st.dataframe(
+        gst_df.style.format({c: '₹{:,.2f}' for c in amount_columns}),
+        hide_index=True,
+        use_container_width=True
+    )
+    mismatches_df = gst.mismatches()
+    if not mismatches_df.empty:
+        with st.expander(f"⚠️ {len(mismatches_df):,} sale lines with rate mismatches"):
+            st.dataframe(mismatches_df, hide_index=True, use_container_width=True)
+    col1, col2, _ = st.columns([1, 1, 3])
+    with col1:
+        st.download_button(
+            label="Download Excel (filing)",
+            data=get_tax_workbook(gst, (len(purchases), len(sales), min_date, max_date), start_date, end_date,
+                                  gst_segments, include_inputs),
+            file_name=f"gst_reconciliation_{start_date}_{end_date}.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+    with col2:
+        st.download_button(
+            label="Download CSV",
+            data=gst_df.to_csv(index=False).encode('utf-8'),
+            file_name=f"gst_reconciliation_{start_date}_{end_date}.csv",
+            mime="text/csv"
+        )
 
 if __name__ == "__main__":
-    main()
+    with stage("Sales Profit: render page"):
+        main()
+    render_performance_panel()
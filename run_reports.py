@@ -0,0 +1,108 @@
+"""Headless report runner.
+
+Loads the workbooks once, builds the selected reports (in parallel worker
+processes) and writes them as CSV/Parquet/XLSX files.
+
+Example:
+    python run_reports.py --reports batch_profits orphan_sales charges \\
+        --start 2024-04-01 --end 2025-03-31 --segments PCD EXPORT \\
+        --formats csv xlsx --output reports/ --workers 4
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+from src.services.charge_allocation import ALLOCATION_BASES
+from src.services.data_transformer import DataTransformerService
+from src.services.excel_reader import ExcelReaderService
+from src.services.cost_layers import COSTING_METHODS
+from src.services.expense_reader import ExpenseReaderService
+from src.services.report_runner import (
+    EXPENSE_REPORTS,
+    OUTPUT_FORMATS,
+    REPORTS,
+    ReportOptions,
+    ReportRunnerService,
+)
+
+
+def parse_date(value: str):
+    """Parse a YYYY-MM-DD command-line date."""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid date (expected YYYY-MM-DD): {value}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command-line parser."""
+    parser = argparse.ArgumentParser(description="Generate Bayberry reports without Streamlit.")
+    parser.add_argument('--reports', nargs='+', choices=sorted(REPORTS), default=sorted(REPORTS),
+                        help="Reports to generate (default: all)")
+    parser.add_argument('--stock-file', default='BayberryStock.xlsx', help="Purchases/Sales workbook")
+    parser.add_argument('--expense-file', default='BayberryExpenses.xlsx', help="Expenses workbook")
+    parser.add_argument('--start', type=parse_date, help="Start date (YYYY-MM-DD)")
+    parser.add_argument('--end', type=parse_date, help="End date (YYYY-MM-DD)")
+    parser.add_argument('--categories', nargs='+', default=['FG', 'TR'], help="Item categories (default: FG TR)")
+    parser.add_argument('--segments', nargs='+', help="Sales segments (default: all)")
+    parser.add_argument('--expense-categories', nargs='+', help="Expense categories (default: all)")
+    parser.add_argument('--costing', choices=COSTING_METHODS, default='last',
+                        help="Costing for multi-purchase batches (default: last)")
+    parser.add_argument('--charge-basis', choices=ALLOCATION_BASES, default='value',
+                        help="Spread SV/CO/CG charges over batch lines by value or qty (default: value)")
+    parser.add_argument('--formats', nargs='+', choices=OUTPUT_FORMATS, default=['csv'], help="Output formats")
+    parser.add_argument('--output', default='reports', help="Output directory")
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                        help="Worker processes (1 = sequential)")
+    return parser
+
+
+def main(argv=None) -> int:
+    """Run the report generator."""
+    args = build_parser().parse_args(argv)
+
+    needs_stock = any(name not in EXPENSE_REPORTS for name in args.reports)
+    needs_expenses = any(name in EXPENSE_REPORTS for name in args.reports)
+
+    load_start = time.perf_counter()
+    purchases, sales, expenses = [], [], []
+    if needs_stock:
+        purchases_df, sales_df = ExcelReaderService(args.stock_file).load_data()
+        transformer = DataTransformerService()
+        purchases = transformer.transform_purchases(purchases_df)
+        sales = transformer.transform_sales(sales_df)
+    if needs_expenses:
+        expenses = ExpenseReaderService(args.expense_file).transform_expenses()
+    load_seconds = time.perf_counter() - load_start
+
+    options = ReportOptions(
+        start_date=args.start,
+        end_date=args.end,
+        categories=args.categories,
+        segments=args.segments,
+        expense_categories=args.expense_categories,
+        costing=args.costing,
+        charge_basis=args.charge_basis,
+    )
+
+    runner = ReportRunnerService(purchases, sales, expenses)
+    run_start = time.perf_counter()
+    results = runner.run(args.reports, options, workers=args.workers)
+    run_seconds = time.perf_counter() - run_start
+    runner.write_outputs(results, args.output, args.formats)
+
+    print()
+    print(f"{'Report':<20} {'Rows':>10} {'Seconds':>10}  Files")
+    print("-" * 80)
+    print(f"{'(load data)':<20} {len(purchases) + len(sales) + len(expenses):>10,} {load_seconds:>10.2f}")
+    for result in results.values():
+        print(f"{result.name:<20} {len(result.data):>10,} {result.seconds:>10.2f}  {', '.join(result.files)}")
+    print("-" * 80)
+    print(f"{'Total (wall)':<20} {'':>10} {load_seconds + run_seconds:>10.2f}  ({args.workers} worker(s))")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
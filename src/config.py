@@ -64,3 +64,68 @@ def validate_profit_shares():
         raise ValueError("Profit share configuration errors:\n" + "\n".join(errors))
     
     return True
+
+
+# Performance Instrumentation
+#
+# Stage timings are always collected in memory (they are cheap). Peak memory
+# per stage uses tracemalloc and is only recorded when PERF_TRACK_MEMORY is
+# on; the process peak RSS is recorded separately either way. Set
+# PERF_LOG_FILE to also append every stage to a rolling log file.
+PERF_MAX_RECORDS = 500
+PERF_TRACK_MEMORY = False
+PERF_LOG_FILE = None  # e.g. 'logs/perf.log'
+PERF_LOG_MAX_BYTES = 1_000_000
+PERF_LOG_BACKUP_COUNT = 5
+
+
+# Storage Backend
+#
+# 'memory' keeps all rows in Python lists (default). 'sqlite' additionally
+# loads the workbooks into an indexed SQLite file so date/category/segment
+# filters and summaries run as SQL queries. The file is rebuilt automatically
+# whenever one of the workbooks is newer than it.
+STORAGE_BACKEND = 'memory'
+SQLITE_DB_PATH = 'data/bayberry.db'
+STOCK_FILE = 'BayberryStock.xlsx'
+EXPENSE_FILE = 'BayberryExpenses.xlsx'
+
+
+# Parallel Profit Calculation
+#
+# With PROFIT_WORKERS > 1, calculate_batch_profits shards batches by key hash
+# and computes the per-sale metrics in that many worker processes. Inputs with
+# fewer than PROFIT_PARALLEL_MIN_SALES sales run in-process, where the pool
+# start-up would cost more than it saves.
+PROFIT_WORKERS = 1
+PROFIT_PARALLEL_MIN_SALES = 200_000
+
+
+# GST Reconciliation
+#
+# A sale's IGST/CGST/SGST amount is flagged when it differs from
+# taxable value (basic value less discount) x rate by more than
+# GST_AMOUNT_TOLERANCE rupees; invoice rounding stays well within it.
+GST_AMOUNT_TOLERANCE = 1.0
+
+
+# Vendor Rate Comparison
+#
+# In the same-period comparison each purchase is compared with the nearest
+# purchase of the same product from every other vendor, if that purchase is
+# at most VENDOR_RATE_WINDOW_DAYS days away; older rates are not compared.
+VENDOR_RATE_WINDOW_DAYS = 90
+
+
+# Purchase Rate History
+#
+# Rolling statistics of a (item, vendor) rate series (median, trend slope)
+# cover its last RATE_HISTORY_WINDOW purchases.
+RATE_HISTORY_WINDOW = 5
+
+
+# Purchase Rate Anomalies
+#
+# In the time-aware mode of the anomaly check, a purchase is compared with
+# the median rate of the product's ANOMALY_RATE_WINDOW preceding purchases.
+ANOMALY_RATE_WINDOW = 10
@@ -0,0 +1,30 @@
+"""Shared helpers for the slotted data models."""
+from dataclasses import fields
+from operator import attrgetter
+
+
+_INIT_GETTERS = {}
+
+
+def _init_getter(cls) -> attrgetter:
+    """Get (and cache) an attrgetter returning the ``__init__`` field values of ``cls``."""
+    getter = _INIT_GETTERS.get(cls)
+    if getter is None:
+        names = [f.name for f in fields(cls) if f.init]
+        getter = attrgetter(*names) if len(names) > 1 else (lambda obj, _g=attrgetter(*names): (_g(obj),))
+        _INIT_GETTERS[cls] = getter
+    return getter
+
+
+class SlotsPickleMixin:
+    """Compact pickling for ``dataclass(slots=True)`` models.
+
+    Slotted instances have no ``__dict__``, so the default pickle state is a
+    per-object dict of slot values. Instead pickle only the ``__init__``
+    arguments as a tuple and rebuild through the dataclass ``__init__``;
+    derived fields (``init=False``) are recomputed by ``__post_init__``.
+    """
+    __slots__ = ()
+
+    def __reduce__(self):
+        return (self.__class__, _init_getter(self.__class__)(self))
@@ -1,11 +1,13 @@
 """Expense data model."""
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Optional
+from .base import SlotsPickleMixin
+from ..utils.intern import EXPENSE_CATEGORIES, EXPENSE_GROUPS
 
 
-@dataclass
-class Expense:
+@dataclass(slots=True)
+class Expense(SlotsPickleMixin):
     """Represents an expense transaction."""
     
     # Transaction details
@@ -23,6 +25,10 @@ class Expense:
     group: str  # DIRECT EXP, IN DIRECT EXP
     category: str  # PCD, OTHER(S), EXPORT, etc.
     
+    # Derived in __post_init__
+    group_id: int = field(init=False, default=-1, repr=False, compare=False)
+    category_id: int = field(init=False, default=-1, repr=False, compare=False)
+    
     def __post_init__(self):
         """Process data after initialization."""
         # Handle NaN values
@@ -32,6 +38,12 @@ class Expense:
             self.credit = 0.0
         if self.transaction_type is None or (isinstance(self.transaction_type, float) and self.transaction_type != self.transaction_type):
             self.transaction_type = None
+        
+        # Share one string instance per distinct value and keep integer codes for filtering
+        self.group = EXPENSE_GROUPS.intern(self.group)
+        self.category = EXPENSE_CATEGORIES.intern(self.category)
+        self.group_id = EXPENSE_GROUPS.code(self.group)
+        self.category_id = EXPENSE_CATEGORIES.code(self.category)
     
     @property
     def net_amount(self) -> float:
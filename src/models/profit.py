@@ -3,11 +3,12 @@ from dataclasses import dataclass, field
 from typing import List, Optional, Dict
 from .purchase import Purchase
 from .sale import Sale
+from .base import SlotsPickleMixin
 from ..config import get_profit_share
 
 
-@dataclass
-class SaleDetail:
+@dataclass(slots=True)
+class SaleDetail(SlotsPickleMixin):
     """Detailed profit breakdown for a single sale."""
     sale: Sale
     purchase_rate: float
@@ -53,6 +54,7 @@ class SaleDetail:
             'transaction_date': self.sale.transaction_date.strftime('%Y-%m-%d') if self.sale.transaction_date else None,
             'customer_name': self.sale.customer_name,
             'segment': self.segment,
+            'unit_cost': round(self.purchase_rate, 2),
             'sale_qty': self.sale.sale_qty,
             'free_qty': self.sale.free_qty,
             'out_qty': self.sale.out_qty,
@@ -70,8 +72,8 @@ class SaleDetail:
         }
 
 
-@dataclass
-class BatchProfit:
+@dataclass(slots=True)
+class BatchProfit(SlotsPickleMixin):
     """Represents batch-wise profit calculation."""
     
     # Batch identification
@@ -81,13 +83,19 @@ class BatchProfit:
     category: str
     
     # Purchase data
-    purchase: Optional[Purchase] = None
+    purchase: Optional[Purchase] = None  # Last purchase of the batch
+    purchases: List[Purchase] = field(default_factory=list)  # Every purchase (cost layer) of the batch
     purchase_qty: int = 0
     purchase_rate: float = 0.0
     purchase_cost: float = 0.0
     purchase_date: Optional[str] = None
     vendor_name: Optional[str] = None
     
+    # Costing: 'last' uses the last purchase rate for every sale; otherwise
+    # sale_unit_costs holds one unit cost per sale (FIFO / weighted average)
+    costing: str = 'last'
+    sale_unit_costs: List[float] = field(default_factory=list)
+    
     # Sales data (aggregated)
     sales: List[Sale] = field(default_factory=list)
     sale_details: List[SaleDetail] = field(default_factory=list)
@@ -115,6 +123,10 @@ class BatchProfit:
     profit: float = 0.0
     profit_margin: float = 0.0
     
+    # SV/CO/CG charges of the batch (set by ``services.charge_allocation``)
+    charge_per_unit: float = 0.0
+    allocated_charges: float = 0.0  # charge_per_unit × total_out_qty
+    
     # Segment and Profit Sharing
     segment: Optional[str] = None  # Dominant segment from sales
     profit_share_ratio: str = "50/50"  # SZ/GZ ratio
@@ -127,14 +139,7 @@ class BatchProfit:
     
     def calculate(self):
         """Calculate profit and all derived metrics."""
-        # Purchase metrics
-        if self.purchase:
-            self.has_purchase = True
-            self.purchase_qty = self.purchase.in_qty
-            self.purchase_rate = self.purchase.in_rate
-            self.purchase_cost = self.purchase.total_cost
-            self.purchase_date = self.purchase.purchase_date.strftime('%Y-%m-%d') if self.purchase.purchase_date else None
-            self.vendor_name = self.purchase.vendor_name
+        self.calculate_purchase()
         
         # Sales metrics (aggregate from all sales)
         if self.sales:
@@ -142,8 +147,9 @@ class BatchProfit:
             
             # Create detailed sale breakdowns
             self.sale_details = []
-            for sale in self.sales:
-                sale_detail = SaleDetail(sale=sale, purchase_rate=self.purchase_rate)
+            for i, sale in enumerate(self.sales):
+                rate = self.sale_unit_costs[i] if self.sale_unit_costs else self.purchase_rate
+                sale_detail = SaleDetail(sale=sale, purchase_rate=rate)
                 sale_detail.calculate()
                 self.sale_details.append(sale_detail)
             
@@ -159,8 +165,13 @@ class BatchProfit:
             
             # New tax-exclusive revenue and cost calculations
             self.revenue_from_sales = sum(sd.revenue_from_sale for sd in self.sale_details)
-            self.total_cogs = self.purchase_rate * self.total_out_qty  # COGS for all outward items
-            self.total_cost_due_to_free = self.purchase_rate * self.total_free_qty  # For visibility
+            if self.sale_unit_costs:
+                # Each sale carries its own layer cost
+                self.total_cogs = sum(sd.purchase_rate * sd.sale.out_qty for sd in self.sale_details)
+                self.total_cost_due_to_free = sum(sd.cost_due_to_free for sd in self.sale_details)
+            else:
+                self.total_cogs = self.purchase_rate * self.total_out_qty  # COGS for all outward items
+                self.total_cost_due_to_free = self.purchase_rate * self.total_free_qty  # For visibility
             self.total_cost_due_to_discount = sum(sd.cost_due_to_discount for sd in self.sale_details)
             
             # Legacy fields from individual sales (for verification)
@@ -170,25 +181,51 @@ class BatchProfit:
             # Average sale rate
             if self.total_sale_qty > 0:
                 self.avg_sale_rate = self.revenue_from_sales / self.total_sale_qty
-        
-        # Final profit calculation: Revenue - COGS - Discount
-        # Note: COGS already includes cost of free items, so we don't subtract it separately
-        self.profit = self.revenue_from_sales - self.total_cogs - self.total_cost_due_to_discount
-        
-        # Determine dominant segment from sales (for display only)
-        if self.sales:
-            # Count sales by segment
+            
+            # Determine dominant segment from sales (for display only)
             segment_counts = {}
             for sale in self.sales:
                 seg = sale.segment if sale.segment else 'Unknown'
                 segment_counts[seg] = segment_counts.get(seg, 0) + 1
             # Get most common segment
             self.segment = max(segment_counts, key=segment_counts.get) if segment_counts else None
-        
-        # Sum profit shares from individual sales (calculated per sale based on each sale's segment)
-        if self.sale_details:
+            
+            # Sum profit shares from individual sales (calculated per sale based on each sale's segment)
             self.sz_profit_share = sum(sd.sz_profit_share for sd in self.sale_details)
             self.gz_profit_share = sum(sd.gz_profit_share for sd in self.sale_details)
+        
+        self.finish_totals()
+    
+    def calculate_purchase(self):
+        """Calculate the purchase-side metrics (first step of ``calculate``)."""
+        if self.purchase:
+            self.has_purchase = True
+            self.purchase_qty = self.purchase.in_qty
+            self.purchase_rate = self.purchase.in_rate
+            self.purchase_cost = self.purchase.total_cost
+            self.purchase_date = self.purchase.purchase_date.strftime('%Y-%m-%d') if self.purchase.purchase_date else None
+            self.vendor_name = self.purchase.vendor_name
+        
+        # With cost layers, purchase totals cover every purchase of the batch
+        if self.costing != 'last' and self.purchases:
+            self.has_purchase = True
+            self.purchase_qty = sum(p.in_qty for p in self.purchases)
+            self.purchase_cost = sum(p.total_cost for p in self.purchases)
+            if self.purchase_qty:
+                self.purchase_rate = self.purchase_cost / self.purchase_qty
+    
+    def finish_totals(self):
+        """Derive profit, share ratio and margin from the aggregated sales totals.
+        
+        Last step of ``calculate``; also used when the sale totals were
+        computed elsewhere (see ``services.parallel_profit``).
+        """
+        # Final profit calculation: Revenue - COGS - Discount
+        # Note: COGS already includes cost of free items, so we don't subtract it separately
+        self.profit = self.revenue_from_sales - self.total_cogs - self.total_cost_due_to_discount
+        
+        # Profit share ratio (shares are summed per sale, by each sale's segment)
+        if self.sale_details:
             # Calculate average ratio for display (weighted by profit)
             if self.profit != 0:
                 sz_pct = (self.sz_profit_share / self.profit * 100) if self.profit != 0 else 50
@@ -211,6 +248,16 @@ class BatchProfit:
         """Remaining quantity (not yet sold)."""
         return self.purchase_qty - self.total_out_qty
     
+    @property
+    def loaded_cost(self) -> float:
+        """COGS including the allocated SV/CO/CG charges."""
+        return self.total_cogs + self.allocated_charges
+    
+    @property
+    def loaded_profit(self) -> float:
+        """Profit after the allocated SV/CO/CG charges."""
+        return self.profit - self.allocated_charges
+    
     @property
     def is_complete(self) -> bool:
         """Check if batch has both purchase and sales data."""
@@ -257,6 +304,10 @@ class BatchProfit:
             'profit_share_ratio': self.profit_share_ratio,
             'sz_profit_share': round(self.sz_profit_share, 2),
             'gz_profit_share': round(self.gz_profit_share, 2),
+            'allocated_charges': round(self.allocated_charges, 2),
+            'loaded_cost': round(self.loaded_cost, 2),
+            'loaded_profit': round(self.loaded_profit, 2),
             'status': self.status,
             'num_sales': len(self.sale_details),
+            'num_purchases': len(self.purchases) if self.purchases else int(self.has_purchase),
         }
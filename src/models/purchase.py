@@ -1,11 +1,14 @@
 """Purchase data model."""
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Optional
+from .base import SlotsPickleMixin
+from ..utils.batch_keys import batch_key_id
+from ..utils.intern import ITEM_CODES, ITEM_NAMES, PRODUCTS, VENDORS
 
 
-@dataclass
-class Purchase:
+@dataclass(slots=True)
+class Purchase(SlotsPickleMixin):
     """Represents a purchase line item."""
     
     # Identifiers
@@ -50,11 +53,25 @@ class Purchase:
     uom_code: str  # Unit of measurement
     hsn_code: int
     
+    # Derived in __post_init__
+    category: Optional[str] = field(init=False, default=None)
+    product_id: int = field(init=False, default=-1, repr=False, compare=False)  # code of (item_code, item_name)
+    vendor_id: int = field(init=False, default=-1, repr=False, compare=False)
+    batch_id: int = field(init=False, default=-1, repr=False, compare=False)  # normalized batch_ref_no
+    
     def __post_init__(self):
         """Validate and process data after initialization."""
         # Extract category prefix (first 2 chars of item type)
         self.category = self.item_type_code[:2] if self.item_type_code else None
         
+        # Share one string instance per distinct value and keep integer codes for grouping
+        self.item_code = ITEM_CODES.intern(self.item_code)
+        self.item_name = ITEM_NAMES.intern(self.item_name)
+        self.vendor_name = VENDORS.intern(self.vendor_name)
+        self.product_id = PRODUCTS.code((self.item_code, self.item_name))
+        self.vendor_id = VENDORS.code(self.vendor_name)
+        self.batch_id = batch_key_id(self.batch_ref_no)
+        
     @property
     def is_tradeable(self) -> bool:
         """Check if item is a tradeable product (FG or TR)."""
@@ -1,11 +1,14 @@
 """Sale data model."""
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Optional
+from .base import SlotsPickleMixin
+from ..utils.batch_keys import batch_key_id
+from ..utils.intern import CITIES, COUNTRIES, CUSTOMERS, DIVISIONS, ITEM_CODES, ITEM_NAMES, MANAGERS, SEGMENTS
 
 
-@dataclass
-class Sale:
+@dataclass(slots=True)
+class Sale(SlotsPickleMixin):
     """Represents a sale line item."""
     
     # Identifiers
@@ -52,12 +55,32 @@ class Sale:
     country: Optional[str]
     city: Optional[str]
     segment: Optional[str] = None  # Final line wise segment: PCD, THIRD PARTY, Internal, EXPORT
+    hsn_code: int = 0  # HSNSACCD (0 when the export has no HSN column)
+    
+    # Derived in __post_init__
+    category: Optional[str] = field(init=False, default=None)
+    customer_id: int = field(init=False, default=-1, repr=False, compare=False)
+    segment_id: int = field(init=False, default=-1, repr=False, compare=False)
+    batch_id: int = field(init=False, default=-1, repr=False, compare=False)  # normalized batch_no
     
     def __post_init__(self):
         """Validate and process data after initialization."""
         # Extract category prefix (first 2 chars of item code)
         self.category = self.item_code[:2] if self.item_code else None
         
+        # Share one string instance per distinct value and keep integer codes for grouping
+        self.item_code = ITEM_CODES.intern(self.item_code)
+        self.item_name = ITEM_NAMES.intern(self.item_name)
+        self.customer_name = CUSTOMERS.intern(self.customer_name)
+        self.segment = SEGMENTS.intern(self.segment)
+        self.division = DIVISIONS.intern(self.division)
+        self.country = COUNTRIES.intern(self.country)
+        self.city = CITIES.intern(self.city)
+        self.manager_name = MANAGERS.intern(self.manager_name)
+        self.customer_id = CUSTOMERS.code(self.customer_name)
+        self.segment_id = SEGMENTS.code(self.segment)
+        self.batch_id = batch_key_id(self.batch_no)
+        
     @property
     def is_tradeable(self) -> bool:
         """Check if item is a tradeable product (FG or TR)."""
@@ -153,6 +176,7 @@ class Sale:
             'city': self.city,
             'category': self.category,
             'segment': self.segment,
+            'hsn_code': self.hsn_code,
             'total_qty': self.total_qty,
             'revenue': self.revenue,
             'free_qty_loss': self.free_qty_loss,
@@ -1,22 +1,37 @@
 """Analysis service for additional reports."""
+from collections import deque
 from typing import List, Dict, Tuple
 from ..models.purchase import Purchase
 from ..models.sale import Sale
 import pandas as pd
+from ..utils.batch_keys import normalize_batch_key
+from ..utils.perf import timed
+from ..utils.streaming_median import StreamingMedian
+from .batch_index import BatchKeyIndex
 
 
 class AnalysisService:
     """Service for additional analysis and reports."""
     
-    def __init__(self, purchases: List[Purchase], sales: List[Sale]):
-        """Initialize with purchases and sales data."""
+    @timed()
+    def __init__(self, purchases: List[Purchase], sales: List[Sale], store=None):
+        """Initialize with purchases and sales data.
+        
+        Args:
+            purchases: List of Purchase objects
+            sales: List of Sale objects
+            store: Optional SQLiteStore over the same data; when given, batch
+                   lookups and charge totals are answered by indexed queries
+        """
         self.purchases = purchases
         self.sales = sales
+        self.store = store
         
-        # Create lookups
-        self.purchase_batches = set(p.batch_ref_no for p in purchases if p.batch_ref_no)
-        self.sales_batches = set(s.batch_no for s in sales if s.batch_no)
+        # Create lookups (normalized batch ids)
+        self.purchase_batches = set(p.batch_id for p in purchases if p.batch_id >= 0)
+        self.sales_batches = set(s.batch_id for s in sales if s.batch_id >= 0)
     
+    @timed()
     def get_orphan_sales(self) -> Tuple[List[Sale], List[Sale]]:
         """Get sales without matching purchase records.
         
@@ -26,9 +41,14 @@ class AnalysisService:
         fg_tr_orphans = []
         other_orphans = []
         
-        for sale in self.sales:
+        if self.store is not None:
+            candidates = self.store.orphan_sales()
+        else:
+            candidates = self.sales
+        
+        for sale in candidates:
             # Skip if has matching purchase or no batch
-            if not sale.batch_no or sale.batch_no in self.purchase_batches:
+            if sale.batch_id < 0 or sale.batch_id in self.purchase_batches:
                 continue
             
             # Categorize
@@ -39,6 +59,7 @@ class AnalysisService:
         
         return fg_tr_orphans, other_orphans
     
+    @timed()
     def get_charge_items(self) -> Tuple[List[Purchase], List[Sale]]:
         """Get SV/CO/CG charge items from purchases and sales.
         
@@ -50,6 +71,7 @@ class AnalysisService:
         
         return charge_purchases, charge_sales
     
+    @timed()
     def get_advertising_items(self) -> Tuple[List[Purchase], List[Sale]]:
         """Get advertising items from purchases and sales.
         
@@ -61,6 +83,7 @@ class AnalysisService:
         
         return ad_purchases, ad_sales
     
+    @timed()
     def create_orphan_sales_report(self, orphan_sales: List[Sale]) -> pd.DataFrame:
         """Create a DataFrame report for orphan sales.
         
@@ -93,12 +116,23 @@ class AnalysisService:
         
         return pd.DataFrame(data)
     
+    @timed(rows=lambda r: len(r['purchase_items']) + len(r['sale_items']))
     def create_charges_report(self) -> Dict:
         """Create summary report for charge items.
         
         Returns:
             Dictionary with charges summary
         """
+        if self.store is not None:
+            charge_purchases = self.store.load_purchases("category IN ('SV', 'CO', 'CG')")
+            charge_sales = self.store.load_sales("category IN ('SV', 'CO')")
+            return {
+                'purchases': self.store.category_totals('purchases', ['SV', 'CO', 'CG'], 'in_qty'),
+                'sales': self.store.category_totals('sales', ['SV', 'CO'], 'out_qty'),
+                'purchase_items': charge_purchases,
+                'sale_items': charge_sales,
+            }
+        
         charge_purchases, charge_sales = self.get_charge_items()
         
         # Purchases by category
@@ -134,11 +168,12 @@ class AnalysisService:
             'sale_items': charge_sales,
         }
     
+    @timed()
     def get_other_batch_purchases(self, batch_ref_no: str) -> Tuple[List[Purchase], List[Purchase]]:
         """Get all purchases for a batch, separated by FG/TR and others.
         
         Args:
-            batch_ref_no: Batch reference number
+            batch_ref_no: Batch reference number (raw or normalized)
             
         Returns:
             Tuple of (fg_tr_purchases, other_purchases)
@@ -146,8 +181,17 @@ class AnalysisService:
         fg_tr_purchases = []
         other_purchases = []
         
-        for p in self.purchases:
-            if p.batch_ref_no == batch_ref_no:
+        batch_id = BatchKeyIndex.id_of(batch_ref_no)
+        if batch_id is None:
+            return fg_tr_purchases, other_purchases
+        
+        if self.store is not None:
+            candidates = self.store.load_purchases("batch_key = ?", [normalize_batch_key(batch_ref_no)])
+        else:
+            candidates = self.purchases
+        
+        for p in candidates:
+            if p.batch_id == batch_id:
                 if p.is_tradeable:
                     fg_tr_purchases.append(p)
                 else:
@@ -155,7 +199,9 @@ class AnalysisService:
         
         return fg_tr_purchases, other_purchases
     
-    def detect_anomalous_purchase_rates(self, categories: List[str] = None, threshold_pct: float = 50.0, iterations: int = 2) -> List[Dict]:
+    @timed()
+    def detect_anomalous_purchase_rates(self, categories: List[str] = None, threshold_pct: float = 50.0, iterations: int = 2,
+                                        window: int = None) -> List[Dict]:
         """Detect purchase records with suspiciously low rates (< threshold % of median).
         
         This identifies potential data entry errors or internal company transfers.
@@ -165,6 +211,11 @@ class AnalysisService:
             categories: List of categories to analyze (default: ['FG', 'TR'])
             threshold_pct: Percentage threshold (default: 50% - flags rates less than 50% of median)
             iterations: Number of passes to detect outliers (default: 2)
+            window: When set, compare each purchase with the median of the
+                    product's ``window`` preceding purchases (by transaction
+                    date) instead of the all-time median, so rate inflation
+                    does not make old purchases look anomalous. Undated
+                    purchases are not checked in this mode.
             
         Returns:
             List of anomalous purchase records with details
@@ -173,40 +224,50 @@ class AnalysisService:
             categories = ['FG', 'TR']
         
         anomalous_records = []
+        flagged_batches = set()
         
-        # Group purchases by product (item_code + item_name)
+        # Group purchases by product (item_code + item_name) code
         product_purchases = {}
         for p in self.purchases:
             if p.category not in categories:
                 continue
             
-            key = (p.item_code, p.item_name)
+            key = p.product_id
             if key not in product_purchases:
                 product_purchases[key] = []
             product_purchases[key].append(p)
         
+        if window is not None:
+            # Rolling mode walks each product's purchases in date order
+            for key, purchases in product_purchases.items():
+                dated = [p for p in purchases if p.transaction_date]
+                dated.sort(key=lambda p: p.transaction_date)
+                product_purchases[key] = dated
+        
         # Iterative outlier detection
         for iteration in range(iterations):
             iteration_anomalies = []
             
-            for (item_code, item_name), purchases in product_purchases.items():
+            for purchases in product_purchases.values():
                 # Need at least 2 purchases to compare
                 if len(purchases) < 2:
                     continue
                 
                 # Calculate median rate (excluding already flagged anomalies)
-                valid_purchases = [p for p in purchases if not any(
-                    a['batch_ref_no'] == p.batch_ref_no for a in anomalous_records
-                )]
+                valid_purchases = [p for p in purchases if p.batch_ref_no not in flagged_batches]
                 
                 if len(valid_purchases) < 2:
                     continue
                 
-                rates = sorted([p.in_rate for p in valid_purchases])
-                median_rate = rates[len(rates) // 2] if len(rates) % 2 == 1 else (rates[len(rates) // 2 - 1] + rates[len(rates) // 2]) / 2
+                if window is None:
+                    rates = sorted([p.in_rate for p in valid_purchases])
+                    median_rate = rates[len(rates) // 2] if len(rates) % 2 == 1 else (rates[len(rates) // 2 - 1] + rates[len(rates) // 2]) / 2
+                    comparisons = ((p, median_rate, len(valid_purchases)) for p in valid_purchases)
+                else:
+                    comparisons = self._rolling_medians(valid_purchases, window)
                 
                 # Check each purchase against median
-                for p in valid_purchases:
+                for p, median_rate, total_batches in comparisons:
                     if median_rate > 0:
                         rate_pct = (p.in_rate / median_rate) * 100
                         
@@ -224,13 +285,14 @@ class AnalysisService:
                                 'median_rate': median_rate,
                                 'rate_pct_of_median': rate_pct,
                                 'difference_pct': 100 - rate_pct,
-                                'total_batches': len(valid_purchases),
+                                'total_batches': total_batches,
                                 'iteration': iteration + 1,
                             }
                             iteration_anomalies.append(anomaly)
             
             # Add this iteration's anomalies
             anomalous_records.extend(iteration_anomalies)
+            flagged_batches.update(a['batch_ref_no'] for a in iteration_anomalies)
             
             # If no new anomalies found, stop early
             if not iteration_anomalies:
@@ -241,6 +303,23 @@ class AnalysisService:
         
         return anomalous_records
     
+    @staticmethod
+    def _rolling_medians(purchases: List[Purchase], window: int):
+        """Yield (purchase, median of its preceding ``window`` rates, window size).
+        
+        Purchases must be in date order; the first one has nothing to
+        compare with and is skipped.
+        """
+        median = StreamingMedian()
+        tokens = deque()
+        for p in purchases:
+            if tokens:
+                yield p, median.median(), len(tokens)
+            tokens.append(median.push(p.in_rate))
+            if len(tokens) > window:
+                median.remove(tokens.popleft())
+    
+    @timed(rows=lambda r: r['total_products'])
     def get_product_wise_purchase_analysis(self, categories: List[str] = None) -> Dict:
         """Analyze purchases by product with vendor rate comparisons.
         
@@ -253,14 +332,14 @@ class AnalysisService:
         if categories is None:
             categories = ['FG', 'TR']
         
-        # Group purchases by product
+        # Group purchases by product (item_code + item_name) code
         product_purchases = {}
         
         for p in self.purchases:
             if p.category not in categories:
                 continue
             
-            key = (p.item_code, p.item_name)
+            key = p.product_id
             if key not in product_purchases:
                 product_purchases[key] = []
             product_purchases[key].append(p)
@@ -268,13 +347,15 @@ class AnalysisService:
         # Analyze each product
         product_analysis = []
         
-        for (item_code, item_name), purchases in product_purchases.items():
+        for purchases in product_purchases.values():
+            item_code, item_name = purchases[0].item_code, purchases[0].item_name
+            
             # Sort purchases by rate (descending)
             sorted_purchases = sorted(purchases, key=lambda x: x.in_rate, reverse=True)
             
             # Calculate statistics
             rates = [p.in_rate for p in purchases]
-            vendors = {p.vendor_name for p in purchases}
+            vendors = {p.vendor_id for p in purchases}
             
             min_rate = min(rates)
             max_rate = max(rates)
@@ -295,18 +376,23 @@ class AnalysisService:
                 vendor_stats[p.vendor_name]['quantities'].append(p.in_qty)
                 vendor_stats[p.vendor_name]['total_cost'] += p.total_cost
             
-            # Calculate vendor averages
+            # Calculate vendor averages (simple and qty-weighted)
             vendor_avg_rates = {}
+            vendor_weighted_rates = {}
             for vendor, stats in vendor_stats.items():
                 vendor_avg_rates[vendor] = sum(stats['rates']) / len(stats['rates'])
+                vendor_qty = sum(stats['quantities'])
+                vendor_weighted_rates[vendor] = stats['total_cost'] / vendor_qty if vendor_qty else vendor_avg_rates[vendor]
             
             # Potential savings (if always bought at lowest rate)
             total_qty_purchased = sum(p.in_qty for p in purchases)
             actual_cost = sum(p.total_cost for p in purchases)
+            weighted_avg_rate = actual_cost / total_qty_purchased if total_qty_purchased else avg_rate
             potential_cost = total_qty_purchased * min_rate
             potential_savings = actual_cost - potential_cost
             
             product_analysis.append({
+                'product_id': purchases[0].product_id,
                 'item_code': item_code,
                 'item_name': item_name,
                 'category': purchases[0].category,
@@ -316,6 +402,7 @@ class AnalysisService:
                 'min_rate': min_rate,
                 'max_rate': max_rate,
                 'avg_rate': avg_rate,
+                'weighted_avg_rate': weighted_avg_rate,
                 'rate_variance': rate_variance,
                 'rate_variance_pct': rate_variance_pct,
                 'actual_cost': actual_cost,
@@ -325,6 +412,7 @@ class AnalysisService:
                 'purchases': sorted_purchases,
                 'vendor_stats': vendor_stats,
                 'vendor_avg_rates': vendor_avg_rates,
+                'vendor_weighted_rates': vendor_weighted_rates,
             })
         
         # Sort by rate variance (highest first) for summary
@@ -335,6 +423,7 @@ class AnalysisService:
             'total_products': len(product_analysis),
         }
     
+    @timed(rows=lambda r: len(r['vendors']))
     def get_vendor_rate_analysis(self, categories: List[str] = None) -> Dict:
         """Analyze vendors by their average rates across products.
         
@@ -0,0 +1,96 @@
+"""Purchase/sale join on normalized batch ids."""
+from typing import Dict, List, Optional, Set
+
+from ..models.purchase import Purchase
+from ..models.sale import Sale
+from ..utils.batch_keys import batch_key, normalize_batch_key
+from ..utils.intern import BATCH_KEYS
+
+
+class BatchKeyIndex:
+    """Hash join of purchases and sales on their integer batch ids.
+
+    Keeps every purchase per batch (in load order) and all sales per batch,
+    plus the raw keys seen on each side so batches that only matched after
+    normalization can be reported. The batch's purchase (its category, item
+    and legacy cost) is the last goods purchase: SV/CO/CG charge rows booked
+    on the batch only count when it has no other purchase.
+    """
+
+    def __init__(self, purchases: List[Purchase], sales: List[Sale]):
+        """Build the index.
+
+        Args:
+            purchases: List of Purchase objects
+            sales: List of Sale objects
+        """
+        self.purchase_by_id: Dict[int, Purchase] = {}
+        self.purchases_by_id: Dict[int, List[Purchase]] = {}
+        self.sales_by_id: Dict[int, List[Sale]] = {}
+        self._raw_purchase_keys: Dict[int, Set[str]] = {}
+        self._raw_sale_keys: Dict[int, Set[str]] = {}
+
+        for p in purchases:
+            if p.batch_id < 0:
+                continue
+            current = self.purchase_by_id.get(p.batch_id)
+            if current is None or current.is_charge or not p.is_charge:
+                self.purchase_by_id[p.batch_id] = p
+            if p.batch_id not in self.purchases_by_id:
+                self.purchases_by_id[p.batch_id] = []
+            self.purchases_by_id[p.batch_id].append(p)
+            self._raw_purchase_keys.setdefault(p.batch_id, set()).add(p.batch_ref_no)
+
+        for s in sales:
+            if s.batch_id < 0:
+                continue
+            if s.batch_id not in self.sales_by_id:
+                self.sales_by_id[s.batch_id] = []
+            self.sales_by_id[s.batch_id].append(s)
+            self._raw_sale_keys.setdefault(s.batch_id, set()).add(s.batch_no)
+
+    @property
+    def all_ids(self) -> Set[int]:
+        """Ids of every batch with a purchase or a sale."""
+        return set(self.purchase_by_id) | set(self.sales_by_id)
+
+    @property
+    def matched_ids(self) -> Set[int]:
+        """Ids of batches with both a purchase and a sale."""
+        return set(self.purchase_by_id) & set(self.sales_by_id)
+
+    @staticmethod
+    def id_of(raw_key) -> Optional[int]:
+        """Batch id of a raw key, or None if no row uses that batch."""
+        return BATCH_KEYS.lookup(normalize_batch_key(raw_key))
+
+    @staticmethod
+    def key_of(batch_id: int) -> Optional[str]:
+        """Normalized key of a batch id."""
+        return batch_key(batch_id)
+
+    def normalization_matches(self) -> List[Dict]:
+        """Batches where some sales only matched their purchase after normalization.
+
+        A sale counts when its raw ``batch_no`` differs from every raw
+        ``batch_ref_no`` of the batch's purchases (e.g. ``"1234"`` vs ``"1234.0"``).
+
+        Returns:
+            List of dicts with the normalized key, the raw purchase and sale
+            keys and the number of sales recovered, sorted by key
+        """
+        report = []
+        for batch_id in self.matched_ids:
+            purchase_keys = self._raw_purchase_keys[batch_id]
+            sale_keys = self._raw_sale_keys[batch_id]
+            unmatched_keys = sale_keys - purchase_keys
+            if not unmatched_keys:
+                continue
+            report.append({
+                'batch_key': batch_key(batch_id),
+                'purchase_keys': ', '.join(sorted(purchase_keys)),
+                'sale_keys': ', '.join(sorted(sale_keys)),
+                'recovered_sales': sum(1 for s in self.sales_by_id[batch_id] if s.batch_no in unmatched_keys),
+            })
+        report.sort(key=lambda r: r['batch_key'])
+        return report
@@ -0,0 +1,189 @@
+"""Sale lines sold below cost or at a loss.
+
+Batch costs are scattered into an array indexed by the interned batch id
+(the last goods purchase of each batch wins, as in the batch profit
+calculation),
+so joining every sale to its batch cost is one fancy-indexing step. Revenue,
+cost, free-goods cost, discount and final profit are then computed for the
+whole sales history as numpy arrays, and only the flagged lines are turned
+back into rows. With a layered costing method (FIFO or weighted average),
+the sales of batches purchased more than once are re-costed per sale
+through ``cost_layers``, as the batch profit calculation does.
+"""
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from ..models.purchase import Purchase
+from ..models.sale import Sale
+from ..utils.batch_keys import batch_key
+from .cost_layers import COSTING_METHODS, batch_unit_costs
+
+
+GROUPS = {
+    'customer': ['customer_code', 'customer_name'],
+    'manager': ['manager_name'],
+    'item': ['item_code', 'item_name'],
+}
+
+
+class BelowCostDetector:
+    """Flag sales priced below their batch purchase rate or with negative profit."""
+
+    def __init__(self, purchases: List[Purchase], sales: List[Sale], include_categories: List[str] = None,
+                 costing: str = 'last'):
+        """Join every sale to its unit cost and flag loss-making lines.
+
+        A line is flagged when ``out_rate`` is below its unit cost
+        (``below_cost``) or when its final profit (revenue - cost of sold and
+        free quantity - discount) is negative (``negative_profit``). Sales
+        whose batch has no purchase in ``include_categories`` are skipped.
+
+        Args:
+            purchases: List of Purchase objects (full history)
+            sales: List of Sale objects (full history)
+            include_categories: Batch categories to check (default: ['FG', 'TR'])
+            costing: One of cost_layers.COSTING_METHODS
+        """
+        if include_categories is None:
+            include_categories = ['FG', 'TR']
+        if costing not in COSTING_METHODS:
+            raise ValueError(f"Unknown costing method: {costing}")
+        self.costing = costing
+
+        # Batch cost by batch id: last purchase in load order, skipping charge rows
+        # unless the batch has nothing else (see BatchKeyIndex)
+        p_ids = np.array([p.batch_id for p in purchases], dtype=np.int64)
+        valid = p_ids >= 0
+        charge = np.array([p.is_charge for p in purchases], dtype=bool)
+        size = int(max(p_ids.max(initial=-1), max((s.batch_id for s in sales), default=-1))) + 1
+        last_of = np.full(size, -1, dtype=np.int64)
+        for rows in (np.flatnonzero(valid), np.flatnonzero(valid & ~charge)):  # goods rows win
+            ids, first = np.unique(p_ids[rows][::-1], return_index=True)
+            last_of[ids] = rows[::-1][first]
+        batches = np.flatnonzero(last_of >= 0)
+        last = last_of[batches]
+        rate_of = np.full(size, np.nan)
+        keep = np.array([purchases[i].category in include_categories for i in last], dtype=bool)
+        rate_of[batches[keep]] = np.array([purchases[i].in_rate for i in last[keep]], dtype=np.float64)
+
+        s_ids = np.array([s.batch_id for s in sales], dtype=np.int64)
+        rate = np.full(len(sales), np.nan)
+        matched = s_ids >= 0
+        rate[matched] = rate_of[s_ids[matched]]
+        costed = ~np.isnan(rate)
+        if costing != 'last':
+            self._cost_layers(purchases, sales, p_ids, s_ids, last[keep], size, costing, rate, costed)
+
+        sale_qty = np.array([s.sale_qty for s in sales], dtype=np.float64)
+        free_qty = np.array([s.free_qty for s in sales], dtype=np.float64)
+        out_rate = np.array([s.out_rate for s in sales], dtype=np.float64)
+        discount = np.abs(np.array([s.discount_value for s in sales], dtype=np.float64))
+        revenue = sale_qty * out_rate
+        cogs = sale_qty * rate
+        free_cost = free_qty * rate
+        final = revenue - cogs - free_cost - discount
+
+        below_cost = costed & (sale_qty > 0) & (out_rate < rate)
+        negative = costed & (final < 0)
+        flagged = np.flatnonzero(below_cost | negative)
+
+        self.sales_checked = int(costed.sum())
+        self.lines = pd.DataFrame({
+            'transaction_date': [sales[i].transaction_date for i in flagged],
+            'bill_no': [sales[i].bill_no for i in flagged],
+            'batch_no': [batch_key(int(s_ids[i])) for i in flagged],
+            'item_code': [sales[i].item_code for i in flagged],
+            'item_name': [sales[i].item_name for i in flagged],
+            'customer_code': [sales[i].customer_code for i in flagged],
+            'customer_name': [sales[i].customer_name for i in flagged],
+            'manager_name': [sales[i].manager_name or 'Unassigned' for i in flagged],
+            'segment': [sales[i].segment for i in flagged],
+            'sale_qty': sale_qty[flagged],
+            'free_qty': free_qty[flagged],
+            'out_rate': out_rate[flagged],
+            'unit_cost': rate[flagged],
+            'revenue': revenue[flagged],
+            'cogs': cogs[flagged],
+            'free_cost': free_cost[flagged],
+            'discount': discount[flagged],
+            'final_profit': final[flagged],
+            'below_cost': below_cost[flagged],
+            'negative_profit': negative[flagged],
+        })
+        reason = np.where(self.lines['below_cost'], 'Priced below cost', 'Discount/free goods')
+        self.lines['reason'] = reason
+        self.lines['loss'] = np.clip(-self.lines['final_profit'], 0, None)
+
+    @staticmethod
+    def _cost_layers(purchases: List[Purchase], sales: List[Sale], p_ids: np.ndarray, s_ids: np.ndarray,
+                     last_rows: np.ndarray, size: int, costing: str, rate: np.ndarray, costed: np.ndarray):
+        """Overwrite ``rate`` with per-sale layer costs for multi-purchase batches.
+
+        Layers are the batch's purchases of the same item as its last
+        purchase; sales keep load order within the batch.
+
+        Args:
+            purchases: List of Purchase objects
+            sales: List of Sale objects
+            p_ids: Batch id of each purchase
+            s_ids: Batch id of each sale
+            last_rows: Index of the last purchase of every costed batch
+            size: Number of batch ids
+            costing: 'fifo' or 'average'
+            rate: Unit cost of each sale (updated in place)
+            costed: Whether each sale has a unit cost
+        """
+        valid = p_ids >= 0
+        counts = np.bincount(p_ids[valid], minlength=size)
+        multi = last_rows[counts[p_ids[last_rows]] > 1]
+        if not len(multi):
+            return
+        layered = np.zeros(size, dtype=bool)
+        layered[p_ids[multi]] = True
+
+        p_rows = np.flatnonzero(valid & layered[np.maximum(p_ids, 0)])
+        p_rows = p_rows[np.argsort(p_ids[p_rows], kind='stable')]
+        s_rows = np.flatnonzero(costed & layered[np.maximum(s_ids, 0)])
+        s_rows = s_rows[np.argsort(s_ids[s_rows], kind='stable')]
+        p_bounds = np.searchsorted(p_ids[p_rows], p_ids[multi])
+        p_ends = np.searchsorted(p_ids[p_rows], p_ids[multi], side='right')
+        s_bounds = np.searchsorted(s_ids[s_rows], p_ids[multi])
+        s_ends = np.searchsorted(s_ids[s_rows], p_ids[multi], side='right')
+
+        for last, p_lo, p_hi, s_lo, s_hi in zip(multi, p_bounds, p_ends, s_bounds, s_ends):
+            rows = s_rows[s_lo:s_hi]
+            if not len(rows):
+                continue
+            item_code = purchases[last].item_code
+            layers = [purchases[i] for i in p_rows[p_lo:p_hi] if purchases[i].item_code == item_code]
+            rate[rows] = batch_unit_costs(costing, layers, [sales[j] for j in rows])
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def summary(self, by: str, lines: pd.DataFrame = None) -> pd.DataFrame:
+        """Flagged lines and loss per customer, manager or item.
+
+        Args:
+            by: One of GROUPS
+            lines: Subset of ``self.lines`` to summarize (default: all)
+
+        Returns:
+            DataFrame with the group columns, lines, below_cost_lines,
+            revenue, discount, free_cost and loss, largest loss first
+        """
+        if by not in GROUPS:
+            raise ValueError(f"Unknown grouping: {by}")
+        if lines is None:
+            lines = self.lines
+        grouped = lines.groupby(GROUPS[by], sort=False, dropna=False).agg(
+            lines=('loss', 'size'),
+            below_cost_lines=('below_cost', 'sum'),
+            revenue=('revenue', 'sum'),
+            discount=('discount', 'sum'),
+            free_cost=('free_cost', 'sum'),
+            loss=('loss', 'sum'),
+        )
+        return grouped.reset_index().sort_values('loss', ascending=False, ignore_index=True)
@@ -0,0 +1,113 @@
+"""Allocation of SV/CO/CG charges onto the FG/TR lines of their batch.
+
+Charge purchases (freight, insurance, cylinder charges) are booked on the
+same batch reference as the goods they came with. Each batch's charges are
+spread over its FG/TR purchase lines in proportion to line value
+(``in_qty × in_rate``) or quantity: one ``groupby`` sums the charges per
+batch, and one grouped ``transform`` gives each line's share of its batch.
+Charges are taken at ``in_qty × in_rate``, i.e. before GST, which is
+claimed back as input tax.
+"""
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from ..models.profit import BatchProfit
+from ..models.purchase import Purchase
+from ..utils.batch_keys import batch_key
+from .batch_index import BatchKeyIndex
+
+
+ALLOCATION_BASES = ('value', 'qty')
+
+
+class ChargeAllocationService:
+    """Charges per goods line and per batch, and the resulting loaded rates."""
+
+    def __init__(self, purchases: List[Purchase], basis: str = 'value', include_categories: List[str] = None):
+        """Allocate every batch's charge purchases across its goods lines.
+
+        Args:
+            purchases: List of Purchase objects (full history)
+            basis: 'value' (line value) or 'qty' (line quantity)
+            include_categories: Categories that absorb charges (default: ['FG', 'TR'])
+        """
+        if basis not in ALLOCATION_BASES:
+            raise ValueError(f"Unknown allocation basis: {basis}")
+        if include_categories is None:
+            include_categories = ['FG', 'TR']
+        self.basis = basis
+
+        ids = np.array([p.batch_id for p in purchases], dtype=np.int64)
+        qty = np.array([p.in_qty for p in purchases], dtype=np.float64)
+        rate = np.array([p.in_rate for p in purchases], dtype=np.float64)
+        value = qty * rate
+        is_charge = np.array([p.is_charge for p in purchases], dtype=bool) & (ids >= 0)
+        is_goods = np.array([p.category in include_categories for p in purchases], dtype=bool) & (ids >= 0)
+
+        charges = pd.Series(value[is_charge]).groupby(ids[is_charge]).sum()
+
+        rows = np.flatnonzero(is_goods)
+        lines = pd.DataFrame({
+            'batch_id': ids[rows],
+            'batch_ref_no': [purchases[i].batch_ref_no for i in rows],
+            'item_code': [purchases[i].item_code for i in rows],
+            'item_name': [purchases[i].item_name for i in rows],
+            'vendor_name': [purchases[i].vendor_name for i in rows],
+            'transaction_date': [purchases[i].transaction_date for i in rows],
+            'in_qty': qty[rows],
+            'in_rate': rate[rows],
+            'value': value[rows],
+        })
+        weight = lines['value'] if basis == 'value' else lines['in_qty']
+        batch_weight = weight.groupby(lines['batch_id']).transform('sum')
+        share = (weight / batch_weight.where(batch_weight > 0)).fillna(0.0)
+        lines['allocated_charge'] = lines['batch_id'].map(charges).fillna(0.0) * share
+        unit_charge = lines['allocated_charge'] / lines['in_qty'].where(lines['in_qty'] > 0)
+        lines['loaded_rate'] = lines['in_rate'] + unit_charge.fillna(0.0)
+        self.lines = lines
+
+        batches = lines.groupby('batch_id').agg(
+            goods_qty=('in_qty', 'sum'),
+            goods_value=('value', 'sum'),
+            allocated=('allocated_charge', 'sum'),
+        )
+        batches = batches.join(charges.rename('charges'), how='outer').fillna(0.0)
+        batches['unallocated'] = batches['charges'] - batches['allocated']
+        goods_qty = batches['goods_qty']
+        batches['charge_per_unit'] = (batches['allocated'] / goods_qty.where(goods_qty > 0)).fillna(0.0)
+        batches.insert(0, 'batch_no', [batch_key(int(i)) for i in batches.index])
+        self.batches = batches[batches['charges'] != 0]
+
+    def totals(self) -> Dict[str, float]:
+        """Total charges, the part allocated to goods lines and the part left over."""
+        return {
+            'charges': float(self.batches['charges'].sum()),
+            'allocated': float(self.batches['allocated'].sum()),
+            'unallocated': float(self.batches['unallocated'].sum()),
+        }
+
+    def unallocated(self) -> pd.DataFrame:
+        """Batches whose charges found no goods line to absorb them."""
+        return self.batches[self.batches['unallocated'].abs() > 0.005].reset_index(drop=True)
+
+    def apply(self, batch_profits: List[BatchProfit]) -> List[BatchProfit]:
+        """Set ``charge_per_unit`` and ``allocated_charges`` on calculated batches.
+
+        Charges are absorbed per unit of goods purchased, so a batch carries
+        the charges of the quantity it has sold or given free; the rest stays
+        with the unsold stock.
+
+        Args:
+            batch_profits: Calculated BatchProfit objects (updated in place)
+
+        Returns:
+            The same list
+        """
+        per_unit = self.batches['charge_per_unit'].to_dict()
+        for bp in batch_profits:
+            batch_id = bp.purchase.batch_id if bp.purchase is not None else BatchKeyIndex.id_of(bp.batch_ref_no)
+            bp.charge_per_unit = per_unit.get(batch_id, 0.0)
+            bp.allocated_charges = bp.charge_per_unit * bp.total_out_qty
+        return batch_profits
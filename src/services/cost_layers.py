@@ -0,0 +1,188 @@
+"""Cost-layer engine: assign purchase cost to sales across several purchases.
+
+A batch can be purchased more than once. Each purchase is a cost layer
+(quantity × rate, received on its purchase date). Sales consume the layers
+in date order:
+
+- ``fifo``: each sale takes units from the oldest layer that still has
+  stock, so a sale can span layers at different rates.
+- ``average``: perpetual weighted average, i.e. each sale is costed at the
+  average rate of the stock received up to its date.
+- ``last``: legacy behaviour, every sale is costed at the last purchase's
+  rate.
+
+The functions work on plain parallel lists (dates, quantities, rates) and
+walk both sides with a single pointer after sorting, so costing a batch is
+O((layers + sales) log(layers + sales)).
+"""
+from typing import List, Optional, Sequence
+
+from ..models.purchase import Purchase
+from ..models.sale import Sale
+
+
+COSTING_METHODS = ('last', 'fifo', 'average')
+
+COSTING_LABELS = {
+    'last': 'Last purchase rate',
+    'fifo': 'FIFO (first in, first out)',
+    'average': 'Weighted average',
+}
+
+
+def _date_order(dates: Sequence, undated_first: bool) -> List[int]:
+    """Indices sorted by date (stable), with undated entries first or last."""
+    undated = [i for i, d in enumerate(dates) if d is None]
+    if not undated:
+        return sorted(range(len(dates)), key=dates.__getitem__)
+    dated = sorted((i for i, d in enumerate(dates) if d is not None), key=dates.__getitem__)
+    return undated + dated if undated_first else dated + undated
+
+
+def _layer_order(dates: Sequence) -> List[int]:
+    """Layer indices by date; undated layers are treated as opening stock."""
+    return _date_order(dates, undated_first=True)
+
+
+def _sale_order(dates: Sequence) -> List[int]:
+    """Sale indices by date; undated sales are costed last."""
+    return _date_order(dates, undated_first=False)
+
+
+def fifo_unit_costs(layer_dates: Sequence, layer_qtys: Sequence[float], layer_rates: Sequence[float],
+                    sale_dates: Sequence, sale_qtys: Sequence[float]) -> List[float]:
+    """Per-sale unit cost under FIFO.
+
+    Args:
+        layer_dates: Purchase date of each layer (None = opening stock)
+        layer_qtys: Quantity of each layer
+        layer_rates: Unit rate of each layer
+        sale_dates: Date of each sale (None = costed last)
+        sale_qtys: Outward quantity of each sale
+
+    Returns:
+        Unit cost for each sale (in input order). Units sold beyond the
+        total purchased quantity are costed at the newest layer's rate.
+    """
+    order = _layer_order(layer_dates)
+    remaining = [max(layer_qtys[i], 0) for i in order]
+    rates = [layer_rates[i] for i in order]
+    n = len(order)
+    costs = [0.0] * len(sale_qtys)
+    if n == 0:
+        return costs
+
+    head = 0
+    for j in _sale_order(sale_dates):
+        need = sale_qtys[j]
+        while head < n and remaining[head] <= 0:
+            head += 1
+        if need <= 0:
+            costs[j] = rates[head] if head < n else rates[-1]
+            continue
+
+        total = need
+        value = 0.0
+        while need > 0 and head < n:
+            take = min(need, remaining[head])
+            value += take * rates[head]
+            remaining[head] -= take
+            need -= take
+            if remaining[head] <= 0:
+                head += 1
+        if need > 0:
+            value += need * rates[-1]
+        costs[j] = value / total
+
+    return costs
+
+
+def average_unit_costs(layer_dates: Sequence, layer_qtys: Sequence[float], layer_rates: Sequence[float],
+                       sale_dates: Sequence, sale_qtys: Sequence[float]) -> List[float]:
+    """Per-sale unit cost under a perpetual weighted average.
+
+    Args:
+        layer_dates: Purchase date of each layer (None = opening stock)
+        layer_qtys: Quantity of each layer
+        layer_rates: Unit rate of each layer
+        sale_dates: Date of each sale (None = after every purchase)
+        sale_qtys: Outward quantity of each sale
+
+    Returns:
+        Unit cost for each sale (in input order). A sale dated before any
+        receipt is costed at the first layer(s); oversold units keep the
+        last average.
+    """
+    order = _layer_order(layer_dates)
+    dates = [layer_dates[i] for i in order]
+    qtys = [max(layer_qtys[i], 0) for i in order]
+    rates = [layer_rates[i] for i in order]
+    n = len(order)
+    costs = [0.0] * len(sale_qtys)
+    if n == 0:
+        return costs
+
+    on_hand_qty = 0.0
+    on_hand_value = 0.0
+    unit = rates[0]
+    i = 0
+    for j in _sale_order(sale_dates):
+        sale_date = sale_dates[j]
+        # Receive every layer dated on or before this sale
+        while i < n and (dates[i] is None or sale_date is None or dates[i] <= sale_date):
+            on_hand_qty += qtys[i]
+            on_hand_value += qtys[i] * rates[i]
+            i += 1
+        # Nothing on hand yet: pull the next receipt(s) forward
+        while on_hand_qty <= 0 and i < n:
+            on_hand_qty += qtys[i]
+            on_hand_value += qtys[i] * rates[i]
+            i += 1
+
+        if on_hand_qty > 0:
+            unit = on_hand_value / on_hand_qty
+        costs[j] = unit
+
+        qty = max(sale_qtys[j], 0)
+        on_hand_qty -= qty
+        on_hand_value -= qty * unit
+        if on_hand_qty <= 0:
+            on_hand_qty = 0.0
+            on_hand_value = 0.0
+
+    return costs
+
+
+def unit_costs(method: str, layer_dates: Sequence, layer_qtys: Sequence[float], layer_rates: Sequence[float],
+               sale_dates: Sequence, sale_qtys: Sequence[float]) -> Optional[List[float]]:
+    """Per-sale unit costs for a costing method (None for ``last``)."""
+    if method == 'fifo':
+        return fifo_unit_costs(layer_dates, layer_qtys, layer_rates, sale_dates, sale_qtys)
+    if method == 'average':
+        return average_unit_costs(layer_dates, layer_qtys, layer_rates, sale_dates, sale_qtys)
+    if method == 'last':
+        return None
+    raise ValueError(f"Unknown costing method: {method}")
+
+
+def batch_unit_costs(method: str, purchases: List[Purchase], sales: List[Sale]) -> Optional[List[float]]:
+    """Per-sale unit costs for one batch.
+
+    Args:
+        method: One of COSTING_METHODS
+        purchases: Every purchase (cost layer) of the batch
+        sales: Sales of the batch
+
+    Returns:
+        Unit cost per sale (same order as ``sales``), or None for ``last``
+    """
+    if method == 'last' or not purchases:
+        return None
+    return unit_costs(
+        method,
+        [p.purchase_date or p.transaction_date for p in purchases],
+        [p.in_qty for p in purchases],
+        [p.in_rate for p in purchases],
+        [s.transaction_date for s in sales],
+        [s.out_qty for s in sales],
+    )
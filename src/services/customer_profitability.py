@@ -0,0 +1,122 @@
+"""Profit attributed to customers.
+
+Every ``SaleDetail`` already carries the sale's revenue, costs and profit
+shares, so per-customer totals are a single grouped pass: each sale's
+customer is mapped to a row number once, and every measure is summed with
+one ``bincount``. Top-N / bottom-N queries use a partial sort
+(``argpartition``) of the requested column rather than sorting all
+customers.
+"""
+from datetime import date
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from ..models.profit import BatchProfit
+
+
+MEASURES = (
+    'sale_count',
+    'sale_qty',
+    'free_qty',
+    'revenue',
+    'cogs',
+    'free_cost',
+    'discount',
+    'profit',
+    'sz_profit_share',
+    'gz_profit_share',
+)
+
+
+class CustomerProfitabilityService:
+    """Revenue, costs, profit and partner shares per customer."""
+
+    def __init__(self, batch_profits: List[BatchProfit], segments: Optional[List[str]] = None):
+        """Total the sale details of calculated batches per customer.
+
+        Customers are keyed by ``customer_code`` (by name when the code is
+        blank); the name shown is the first one seen for the code.
+
+        Args:
+            batch_profits: Calculated BatchProfit objects
+            segments: Segments of the sales to include (None = all; sales
+                      without a segment or in 'Unknown' are always kept)
+        """
+        row_of: Dict[str, int] = {}
+        labels = []
+        rows, ordinals = [], []
+        details = [sd for bp in batch_profits for sd in bp.sale_details]
+        if segments is not None:
+            allowed = set(segments) | {None, 'Unknown'}
+            details = [sd for sd in details if sd.sale.segment in allowed]
+        ordinal_of = {None: -1}
+        for sd in details:
+            sale = sd.sale
+            key = sale.customer_code or sale.customer_name
+            r = row_of.get(key)
+            if r is None:
+                r = row_of[key] = len(labels)
+                labels.append((sale.customer_code, sale.customer_name))
+            rows.append(r)
+            d = sale.transaction_date
+            o = ordinal_of.get(d)
+            if o is None:
+                o = ordinal_of[d] = d.toordinal()
+            ordinals.append(o)
+
+        rows = np.asarray(rows, dtype=np.int64)
+        size = len(labels)
+        values = {
+            'sale_count': np.ones(len(details)),
+            'sale_qty': np.array([sd.sale.sale_qty for sd in details], dtype=np.float64),
+            'free_qty': np.array([sd.sale.free_qty for sd in details], dtype=np.float64),
+            'revenue': np.array([sd.revenue_from_sale for sd in details], dtype=np.float64),
+            'cogs': np.array([sd.cost_of_goods_sold for sd in details], dtype=np.float64),
+            'free_cost': np.array([sd.cost_due_to_free for sd in details], dtype=np.float64),
+            'discount': np.array([sd.cost_due_to_discount for sd in details], dtype=np.float64),
+            'profit': np.array([sd.final_profit for sd in details], dtype=np.float64),
+            'sz_profit_share': np.array([sd.sz_profit_share for sd in details], dtype=np.float64),
+            'gz_profit_share': np.array([sd.gz_profit_share for sd in details], dtype=np.float64),
+        }
+
+        frame = pd.DataFrame(labels, columns=['customer_code', 'customer_name'])
+        for m in MEASURES:
+            frame[m] = np.bincount(rows, weights=values[m], minlength=size)
+        for m in ('sale_count', 'sale_qty', 'free_qty'):
+            frame[m] = frame[m].astype(np.int64)
+        revenue = frame['revenue']
+        frame['profit_margin'] = (frame['profit'] / revenue.where(revenue > 0) * 100).fillna(0.0)
+        last = np.full(size, -1, dtype=np.int64)
+        np.maximum.at(last, rows, np.asarray(ordinals, dtype=np.int64))
+        frame['last_sale_date'] = [date.fromordinal(int(o)) if o > 0 else None for o in last]
+        self.customers = frame
+
+    def __len__(self) -> int:
+        return len(self.customers)
+
+    def totals(self) -> Dict[str, float]:
+        """Grand total of every measure."""
+        return {m: self.customers[m].sum().item() for m in MEASURES}
+
+    def _extreme(self, n: int, by: str, largest: bool) -> pd.DataFrame:
+        """The ``n`` customers with the largest/smallest ``by`` (partial sort)."""
+        if by not in self.customers.columns:
+            raise ValueError(f"Unknown measure: {by}")
+        values = self.customers[by].to_numpy(dtype=np.float64)
+        n = min(n, len(values))
+        if n <= 0:
+            return self.customers.iloc[0:0]
+        keys = -values if largest else values
+        picked = np.argpartition(keys, n - 1)[:n] if n < len(values) else np.arange(len(values))
+        picked = picked[np.lexsort((picked, keys[picked]))]  # ties keep customer order
+        return self.customers.iloc[picked].reset_index(drop=True)
+
+    def top(self, n: int = 10, by: str = 'profit') -> pd.DataFrame:
+        """The ``n`` customers with the highest ``by``, highest first."""
+        return self._extreme(n, by, largest=True)
+
+    def bottom(self, n: int = 10, by: str = 'profit') -> pd.DataFrame:
+        """The ``n`` customers with the lowest ``by``, lowest first."""
+        return self._extreme(n, by, largest=False)
@@ -3,12 +3,16 @@ import pandas as pd
 from typing import List, Dict
 from ..models.purchase import Purchase
 from ..models.sale import Sale
+from ..utils.expiry import parse_expiry
+from ..utils.perf import timed
+from .batch_index import BatchKeyIndex
 
 
 class DataTransformerService:
     """Service to transform raw DataFrame data to domain models."""
     
     @staticmethod
+    @timed()
     def transform_purchases(df: pd.DataFrame) -> List[Purchase]:
         """Transform purchases DataFrame to Purchase objects.
         
@@ -47,7 +51,7 @@ class DataTransformerService:
                     transaction_date=row['TXDATE'] if pd.notna(row['TXDATE']) else None,
                     purchase_date=row['PODT'] if pd.notna(row['PODT']) else None,
                     manufacture_date=str(row['MNFMMYY']) if pd.notna(row['MNFMMYY']) else None,
-                    expiry_date=row['EXPMMYY'] if pd.notna(row['EXPMMYY']) else None,
+                    expiry_date=parse_expiry(row['EXPMMYY']) if pd.notna(row['EXPMMYY']) else None,
                     uom_code=str(row['UOMCD']) if pd.notna(row['UOMCD']) else '',
                     hsn_code=int(row['HSNSACCD']) if pd.notna(row['HSNSACCD']) else 0,
                 )
@@ -59,6 +63,7 @@ class DataTransformerService:
         return purchases
     
     @staticmethod
+    @timed()
     def transform_sales(df: pd.DataFrame) -> List[Sale]:
         """Transform sales DataFrame to Sale objects.
         
@@ -77,7 +82,7 @@ class DataTransformerService:
                     item_code=str(row['Item Code']) if pd.notna(row['Item Code']) else '',
                     item_name=str(row['Item Name']) if pd.notna(row['Item Name']) else '',
                     batch_no=str(row['Batch No.']) if pd.notna(row['Batch No.']) else None,
-                    expiry_date=row['EXPMMYY'] if pd.notna(row['EXPMMYY']) else None,
+                    expiry_date=parse_expiry(row['EXPMMYY']) if pd.notna(row['EXPMMYY']) else None,
                     customer_code=str(row['Cust. Code']) if pd.notna(row['Cust. Code']) else '',
                     customer_name=str(row['Customer Name']) if pd.notna(row['Customer Name']) else '',
                     bill_no=str(row['Bill No.']) if pd.notna(row['Bill No.']) else '',
@@ -102,6 +107,7 @@ class DataTransformerService:
                     country=str(row['COUNTRY']) if pd.notna(row['COUNTRY']) else None,
                     city=str(row['CITY']) if pd.notna(row['CITY']) else None,
                     segment=str(row['Final line wise segment ']).strip() if pd.notna(row['Final line wise segment ']) else None,
+                    hsn_code=int(row['HSNSACCD']) if pd.notna(row.get('HSNSACCD')) else 0,
                 )
                 sales.append(sale)
             except Exception as e:
@@ -111,6 +117,7 @@ class DataTransformerService:
         return sales
     
     @staticmethod
+    @timed(rows=lambda r: len(r['all_batches']))
     def create_lookup_dicts(purchases: List[Purchase], sales: List[Sale]) -> Dict:
         """Create lookup dictionaries for efficient querying.
         
@@ -119,30 +126,18 @@ class DataTransformerService:
             sales: List of Sale objects
             
         Returns:
-            Dictionary with various lookup structures
+            Dictionary with various lookup structures, keyed by normalized
+            batch id (see ``utils.batch_keys``)
         """
-        # Purchase lookup by batch ref no
-        purchase_by_batch = {}
-        for p in purchases:
-            if p.batch_ref_no:
-                purchase_by_batch[p.batch_ref_no] = p
-        
-        # Sales lookup by batch no (list because multiple sales per batch)
-        sales_by_batch = {}
-        for s in sales:
-            if s.batch_no:
-                if s.batch_no not in sales_by_batch:
-                    sales_by_batch[s.batch_no] = []
-                sales_by_batch[s.batch_no].append(s)
-        
-        # All unique batch numbers
-        all_batches = set(purchase_by_batch.keys()) | set(sales_by_batch.keys())
+        index = BatchKeyIndex(purchases, sales)
         
         return {
-            'purchase_by_batch': purchase_by_batch,
-            'sales_by_batch': sales_by_batch,
-            'all_batches': all_batches,
-            'purchases_with_ref': len(purchase_by_batch),
-            'sales_with_batch': len(sales_by_batch),
-            'matched_batches': len(set(purchase_by_batch.keys()) & set(sales_by_batch.keys())),
+            'purchase_by_batch': index.purchase_by_id,
+            'purchases_by_batch': index.purchases_by_id,
+            'sales_by_batch': index.sales_by_id,
+            'all_batches': index.all_ids,
+            'purchases_with_ref': len(index.purchase_by_id),
+            'sales_with_batch': len(index.sales_by_id),
+            'matched_batches': len(index.matched_ids),
+            'normalized_matches': index.normalization_matches(),
         }
@@ -2,6 +2,7 @@
 import pandas as pd
 from typing import Tuple
 from pathlib import Path
+from ..utils.perf import timed
 
 
 class ExcelReaderService:
@@ -16,6 +17,7 @@ class ExcelReaderService:
         self._purchases_df = None
         self._sales_df = None
     
+    @timed()
     def load_data(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
         """Load both Purchases and Sales sheets from Excel.
         
@@ -56,6 +58,7 @@ class ExcelReaderService:
             self.load_data()
         return self._sales_df
     
+    @timed(rows=lambda r: r['total_purchases'] + r['total_sales'])
     def get_summary(self) -> dict:
         """Get summary statistics of the data."""
         purchases_df = self.purchases_df
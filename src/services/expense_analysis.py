@@ -1,8 +1,10 @@
 """Expense analysis service."""
 import pandas as pd
+from datetime import date, datetime
 from typing import List, Dict
 from collections import defaultdict
 from ..models.expense import Expense
+from ..utils.perf import timed
 
 
 class ExpenseAnalysisService:
@@ -11,7 +13,55 @@ class ExpenseAnalysisService:
     def __init__(self, expenses: List[Expense]):
         """Initialize with expenses data."""
         self.expenses = expenses
+        
+        # Set by from_store(): grouped summaries are then computed in SQL
+        self.store = None
+        self._store_where = ("1 = 1", [])
+    
+    @classmethod
+    def from_store(cls, store, start_date: date = None, end_date: date = None, groups: List[str] = None,
+                   categories: List[str] = None, search: str = None) -> 'ExpenseAnalysisService':
+        """Create a service over the expenses matching the page filters.
+        
+        Filters are evaluated by the store and the group/category/month/type
+        summaries are aggregated there as well.
+        
+        Args:
+            store: SQLiteStore holding expenses
+            start_date: Keep expenses on or after this date
+            end_date: Keep expenses on or before this date
+            groups: Expense groups to keep (None = all)
+            categories: Expense categories to keep (None = all)
+            search: Case-insensitive substring of particulars
+        
+        Returns:
+            ExpenseAnalysisService
+        """
+        where, params = store.expense_where(start_date, end_date, groups, categories, search)
+        service = cls(store.load_expenses(where, params))
+        service.store = store
+        service._store_where = (where, params)
+        return service
     
+    def _store_totals(self, group_by: str, extra_where: str = None, extra_params: list = None) -> List[Dict]:
+        """Grouped debit/credit totals from the store, rounded like the Python path."""
+        where, params = self._store_where
+        if extra_where:
+            where = f"({where}) AND {extra_where}"
+            params = params + (extra_params or [])
+        df = self.store.expense_totals(group_by, where, params)
+        return [
+            {
+                'key': row['key'],
+                'count': int(row['count']),
+                'total_debit': round(float(row['total_debit']), 2),
+                'total_credit': round(float(row['total_credit']), 2),
+                'net_expense': round(float(row['net_expense']), 2),
+            }
+            for _, row in df.iterrows()
+        ]
+    
+    @timed(rows=lambda r: r['total_transactions'])
     def get_summary_stats(self) -> Dict:
         """Get overall summary statistics.
         
@@ -50,12 +100,16 @@ class ExpenseAnalysisService:
             }
         }
     
+    @timed()
     def get_group_summary(self) -> Dict:
         """Get summary by expense group (Direct/Indirect).
         
         Returns:
             Dictionary with group-wise summary
         """
+        if self.store is not None:
+            return {row.pop('key'): row for row in self._store_totals('"group"')}
+        
         summary = defaultdict(lambda: {
             'count': 0,
             'total_debit': 0.0,
@@ -78,12 +132,16 @@ class ExpenseAnalysisService:
         
         return dict(summary)
     
+    @timed()
     def get_category_summary(self) -> Dict:
         """Get summary by category.
         
         Returns:
             Dictionary with category-wise summary
         """
+        if self.store is not None:
+            return {row.pop('key'): row for row in self._store_totals('category')}
+        
         summary = defaultdict(lambda: {
             'count': 0,
             'total_debit': 0.0,
@@ -110,12 +168,22 @@ class ExpenseAnalysisService:
         
         return result
     
+    @timed()
     def get_monthly_summary(self) -> List[Dict]:
         """Get monthly expense trends.
         
         Returns:
             List of dictionaries with monthly summaries
         """
+        if self.store is not None:
+            result = []
+            for row in self._store_totals("strftime('%Y-%m', date)", "date IS NOT NULL"):
+                month_year = row.pop('key')
+                month_name = datetime.strptime(month_year, '%Y-%m').strftime('%B %Y')
+                result.append({'month_year': month_year, 'month_name': month_name, **row})
+            result.sort(key=lambda x: x['month_year'])
+            return result
+        
         monthly = defaultdict(lambda: {
             'month_year': '',
             'month_name': '',
@@ -152,6 +220,7 @@ class ExpenseAnalysisService:
         result.sort(key=lambda x: x['month_year'])
         return result
     
+    @timed()
     def get_top_expenses_by_particular(self, top_n: int = 20, exclude_particulars: List[str] = None) -> List[Dict]:
         """Get top expense particulars by total amount.
         
@@ -165,6 +234,18 @@ class ExpenseAnalysisService:
         if exclude_particulars is None:
             exclude_particulars = []
         
+        if self.store is not None:
+            extra_where, extra_params = None, []
+            if exclude_particulars:
+                extra_where = f"particulars NOT IN ({', '.join('?' * len(exclude_particulars))})"
+                extra_params = list(exclude_particulars)
+            result = [
+                {'particular': row.pop('key'), **row}
+                for row in self._store_totals('particulars', extra_where, extra_params)
+            ]
+            result.sort(key=lambda x: x['net_expense'], reverse=True)
+            return result[:top_n]
+        
         particular_summary = defaultdict(lambda: {
             'particular': '',
             'count': 0,
@@ -197,12 +278,19 @@ class ExpenseAnalysisService:
         result.sort(key=lambda x: x['net_expense'], reverse=True)
         return result[:top_n]
     
+    @timed()
     def get_transaction_type_summary(self) -> Dict:
         """Get summary by transaction type.
         
         Returns:
             Dictionary with transaction type summary
         """
+        if self.store is not None:
+            return {
+                row.pop('key'): row
+                for row in self._store_totals("COALESCE(NULLIF(transaction_type, ''), 'Unknown')")
+            }
+        
         summary = defaultdict(lambda: {
             'count': 0,
             'total_debit': 0.0,
@@ -229,6 +317,7 @@ class ExpenseAnalysisService:
         
         return result
     
+    @timed()
     def create_expense_dataframe(self, expenses: List[Expense] = None) -> pd.DataFrame:
         """Create a pandas DataFrame from expenses.
         
@@ -3,6 +3,7 @@ import pandas as pd
 from typing import List
 from pathlib import Path
 from ..models.expense import Expense
+from ..utils.perf import timed
 
 
 class ExpenseReaderService:
@@ -17,6 +18,7 @@ class ExpenseReaderService:
         self._expenses_df = None
         self._expenses = None
     
+    @timed()
     def load_data(self) -> pd.DataFrame:
         """Load expenses data from Excel.
         
@@ -42,6 +44,7 @@ class ExpenseReaderService:
             self.load_data()
         return self._expenses_df
     
+    @timed()
     def transform_expenses(self, df: pd.DataFrame = None) -> List[Expense]:
         """Transform expenses DataFrame to Expense objects.
         
@@ -84,6 +87,7 @@ class ExpenseReaderService:
             self.transform_expenses()
         return self._expenses
     
+    @timed(rows=lambda r: r['total_records'])
     def get_summary(self) -> dict:
         """Get summary statistics of the expense data."""
         df = self.expenses_df
@@ -0,0 +1,174 @@
+"""Expiry-risk index over batches with stock on hand.
+
+Batches with ``on_hand > 0`` are kept in a list sorted by (expiry date,
+batch key), with running totals of on-hand quantity and stock value along
+that order. "What expires between two dates, and at what cost" is then two
+``bisect`` calls and a difference of running totals, independent of how
+many batches are in stock; ageing buckets are one bisect per bucket edge.
+
+When the stock snapshot changes (new data, another as-of date), ``update``
+diffs the new positions against the indexed ones and only moves the batches
+whose expiry, quantity or value changed (``bisect.insort`` / delete), instead
+of re-sorting everything. The running totals are rebuilt lazily, with one
+``cumsum``, on the next query.
+"""
+from bisect import bisect_left, insort
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# (label, first day-to-expiry, last day-to-expiry); None = open-ended
+AGEING_BUCKETS = (
+    ('Expired', None, -1),
+    ('0-30 days', 0, 30),
+    ('31-90 days', 31, 90),
+    ('91-180 days', 91, 180),
+    ('181-365 days', 181, 365),
+    ('Over 1 year', 366, None),
+)
+
+_DETAIL_COLUMNS = ('item_code', 'item_name', 'category', 'vendor_name', 'on_hand', 'avg_rate', 'stock_value')
+
+
+def _ordinal(value) -> Optional[int]:
+    """Day ordinal of a date/datetime (None when missing)."""
+    if value is None or value is pd.NaT or (isinstance(value, float) and value != value):
+        return None
+    return value.toordinal()
+
+
+class ExpiryIndex:
+    """On-hand stock ordered by expiry date, with log-time range totals."""
+
+    def __init__(self):
+        """Create an empty index (fill it with ``update``)."""
+        self._keys: List[Tuple[int, str]] = []  # (expiry ordinal, batch) ascending
+        self._qty: List[float] = []  # parallel to _keys
+        self._value: List[float] = []
+        self._entries: Dict[str, Tuple] = {}  # batch -> (expiry ordinal, on_hand, stock_value, details)
+        self._undated: Dict[str, Tuple] = {}  # in-stock batches without an expiry date
+        self._cum_qty: Optional[np.ndarray] = None
+        self._cum_value: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @classmethod
+    def build(cls, stock: pd.DataFrame) -> 'ExpiryIndex':
+        """Index a stock position (see ``update``)."""
+        index = cls()
+        index.update(stock)
+        return index
+
+    def update(self, stock: pd.DataFrame) -> int:
+        """Bring the index in line with a new stock position.
+
+        Args:
+            stock: Per-batch position as returned by ``InventoryService.as_of``
+                   (needs ``batch_ref_no``, ``expiry_date``, ``on_hand``,
+                   ``stock_value`` and the detail columns); batches with
+                   nothing on hand are ignored
+
+        Returns:
+            Number of batches added, removed or moved
+        """
+        stock = stock[stock['on_hand'] > 0]
+        fresh: Dict[str, Tuple] = {}
+        undated: Dict[str, Tuple] = {}
+        columns = [stock[c].tolist() for c in ('batch_ref_no', 'expiry_date') + _DETAIL_COLUMNS]
+        for batch, expiry, *details in zip(*columns):
+            ordinal = _ordinal(expiry)
+            entry = (ordinal, float(details[4]), float(details[6]), tuple(details))
+            if ordinal is None:
+                undated[batch] = entry
+            else:
+                fresh[batch] = entry
+        self._undated = undated
+
+        touched = set()
+        for batch, old in list(self._entries.items()):
+            new = fresh.get(batch)
+            if new is not None and new[:3] == old[:3]:
+                self._entries[batch] = new  # details only; position unchanged
+                continue
+            pos = bisect_left(self._keys, (old[0], batch))
+            del self._keys[pos], self._qty[pos], self._value[pos]
+            del self._entries[batch]
+            touched.add(batch)
+        for batch, new in fresh.items():
+            if batch in self._entries:
+                continue
+            key = (new[0], batch)
+            insort(self._keys, key)
+            pos = bisect_left(self._keys, key)
+            self._qty.insert(pos, new[1])
+            self._value.insert(pos, new[2])
+            self._entries[batch] = new
+            touched.add(batch)
+
+        if touched:
+            self._cum_qty = self._cum_value = None
+        return len(touched)
+
+    def _totals(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Running quantity and value totals (index i = sum of the first i batches)."""
+        if self._cum_qty is None:
+            self._cum_qty = np.concatenate(([0.0], np.cumsum(self._qty)))
+            self._cum_value = np.concatenate(([0.0], np.cumsum(self._value)))
+        return self._cum_qty, self._cum_value
+
+    def _span(self, start: Optional[date], end: Optional[date]) -> Tuple[int, int]:
+        """Positions of the batches expiring in ``start``..``end`` (inclusive)."""
+        lo = bisect_left(self._keys, (start.toordinal(),)) if start else 0
+        hi = bisect_left(self._keys, (end.toordinal() + 1,)) if end else len(self._keys)
+        return lo, max(lo, hi)
+
+    def totals_between(self, start: Optional[date], end: Optional[date]) -> Dict[str, float]:
+        """Stock expiring between two dates (inclusive; None = unbounded).
+
+        Returns:
+            Dict with batches, on_hand and stock_value
+        """
+        lo, hi = self._span(start, end)
+        cum_qty, cum_value = self._totals()
+        return {
+            'batches': hi - lo,
+            'on_hand': float(cum_qty[hi] - cum_qty[lo]),
+            'stock_value': float(cum_value[hi] - cum_value[lo]),
+        }
+
+    def expiring_within(self, days: int, as_of: date) -> Dict[str, float]:
+        """Stock expiring in the ``days`` days from ``as_of`` (inclusive)."""
+        return self.totals_between(as_of, as_of + timedelta(days=days))
+
+    def batches_between(self, start: Optional[date], end: Optional[date]) -> pd.DataFrame:
+        """Batches expiring between two dates, soonest first."""
+        lo, hi = self._span(start, end)
+        rows = []
+        for ordinal, batch in self._keys[lo:hi]:
+            rows.append((batch, date.fromordinal(ordinal)) + self._entries[batch][3])
+        return pd.DataFrame(rows, columns=('batch_ref_no', 'expiry_date') + _DETAIL_COLUMNS)
+
+    def ageing(self, as_of: date) -> pd.DataFrame:
+        """Stock per ageing bucket (days from ``as_of`` to expiry).
+
+        Returns:
+            DataFrame with one row per AGEING_BUCKETS entry plus 'No expiry'
+            (in-stock batches without an expiry date): bucket, batches,
+            on_hand and stock_value
+        """
+        rows = []
+        for label, first, last in AGEING_BUCKETS:
+            start = as_of + timedelta(days=first) if first is not None else None
+            end = as_of + timedelta(days=last) if last is not None else None
+            rows.append({'bucket': label, **self.totals_between(start, end)})
+        rows.append({
+            'bucket': 'No expiry',
+            'batches': len(self._undated),
+            'on_hand': sum(e[1] for e in self._undated.values()),
+            'stock_value': sum(e[2] for e in self._undated.values()),
+        })
+        return pd.DataFrame(rows)
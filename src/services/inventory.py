@@ -0,0 +1,291 @@
+"""As-of-date inventory position and stock valuation.
+
+Every batch's stock movements become two event streams: receipts (purchase
+``in_qty`` on its purchase date) and issues (sale ``out_qty`` on its
+transaction date). For a set of as-of dates, each event is bucketed to the
+first as-of date on or after it, totalled per (batch, bucket) with one
+``bincount``, and a cumulative sum along the date axis gives receipts and
+issues to date for every batch and every date in a single sweep:
+
+    on_hand[b, t] = cum_received[b, t] - cum_issued[b, t]
+
+Stock is valued at the weighted average ``in_rate`` of the batch's receipts
+up to each date (equal to ``in_rate`` for single-purchase batches).
+"""
+from datetime import date, timedelta
+from typing import List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ..models.purchase import Purchase
+from ..models.sale import Sale
+from ..utils.batch_keys import batch_key
+from .batch_index import BatchKeyIndex
+
+
+_OPENING = np.iinfo(np.int64).min  # undated receipts count as opening stock
+_NO_DATE = np.iinfo(np.int64).max
+
+
+def month_ends(start: date, end: date) -> List[date]:
+    """Last day of every month from ``start``'s month to ``end``'s month."""
+    ends = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        ends.append(date(year, month, 1) - timedelta(days=1))
+    return ends
+
+
+class InventoryService:
+    """On-hand quantity and valuation per batch at any date."""
+
+    def __init__(self, purchases: List[Purchase], sales: List[Sale], include_categories: List[str] = None):
+        """Build the receipt and issue event arrays.
+
+        Receipts are the batch's purchases of its item (the same purchases
+        used as cost layers); issues are every sale of the batch. Undated
+        purchases count as opening stock; undated sales cannot be placed in
+        time and are left out (see ``undated_sales``). A batch's expiry is
+        its last purchase's, falling back to any other purchase or sale of
+        the batch that carries one.
+
+        Args:
+            purchases: List of Purchase objects
+            sales: List of Sale objects
+            include_categories: Batch categories to keep (default: ['FG', 'TR'])
+        """
+        if include_categories is None:
+            include_categories = ['FG', 'TR']
+        index = BatchKeyIndex(purchases, sales)
+
+        batches = []
+        in_batch, in_date, in_qty, in_rate = [], [], [], []
+        out_batch, out_date, out_qty = [], [], []
+        self.undated_sales = 0
+        ordinal_of = {None: _OPENING}
+        for batch_id, last in index.purchase_by_id.items():
+            if last.category not in include_categories:
+                continue
+            b = len(batches)
+            expiry = last.expiry_date
+            for p in index.purchases_by_id[batch_id]:
+                if p.item_code != last.item_code:
+                    continue
+                d = p.purchase_date or p.transaction_date
+                o = ordinal_of.get(d)
+                if o is None:
+                    o = ordinal_of[d] = d.toordinal()
+                in_batch.append(b)
+                in_date.append(o)
+                in_qty.append(p.in_qty)
+                in_rate.append(p.in_rate)
+                expiry = expiry or p.expiry_date
+            for s in index.sales_by_id.get(batch_id, ()):
+                expiry = expiry or s.expiry_date
+                if s.transaction_date is None:
+                    self.undated_sales += 1
+                    continue
+                o = ordinal_of.get(s.transaction_date)
+                if o is None:
+                    o = ordinal_of[s.transaction_date] = s.transaction_date.toordinal()
+                out_batch.append(b)
+                out_date.append(o)
+                out_qty.append(s.out_qty)
+            batches.append((batch_key(batch_id), last.item_code, last.item_name, last.category, last.vendor_name,
+                            expiry))
+
+        self.batches = pd.DataFrame(batches, columns=['batch_ref_no', 'item_code', 'item_name', 'category', 'vendor_name',
+                                                      'expiry_date'])
+        self._in_batch = np.asarray(in_batch, dtype=np.int64)
+        self._in_date = np.asarray(in_date, dtype=np.int64)
+        self._in_qty = np.asarray(in_qty, dtype=np.float64)
+        self._in_value = self._in_qty * np.asarray(in_rate, dtype=np.float64)
+        self._out_batch = np.asarray(out_batch, dtype=np.int64)
+        self._out_date = np.asarray(out_date, dtype=np.int64)
+        self._out_qty = np.asarray(out_qty, dtype=np.float64)
+
+    def _cumulative(self, batch: np.ndarray, when: np.ndarray, amount: np.ndarray,
+                    dates: np.ndarray) -> np.ndarray:
+        """Running total of ``amount`` per batch at each of the (sorted) ``dates``."""
+        num_batches, num_dates = len(self.batches), len(dates)
+        bucket = np.searchsorted(dates, when, side='left')  # first as-of date on/after the event
+        keep = bucket < num_dates
+        flat = batch[keep] * num_dates + bucket[keep]
+        # bincount returns int64 when there is nothing to count, even with weights
+        totals = np.bincount(flat, weights=amount[keep], minlength=num_batches * num_dates).astype(np.float64)
+        return np.cumsum(totals.reshape(num_batches, num_dates), axis=1)
+
+    def positions(self, dates: Sequence[date]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Received, issued and received value to date (batches × dates).
+
+        Args:
+            dates: As-of dates (inclusive), ascending
+
+        Returns:
+            Tuple of (received_qty, issued_qty, received_value) matrices
+        """
+        ordinals = np.array([d.toordinal() for d in dates], dtype=np.int64)
+        if np.any(np.diff(ordinals) < 0):
+            raise ValueError("As-of dates must be ascending")
+        received = self._cumulative(self._in_batch, self._in_date, self._in_qty, ordinals)
+        issued = self._cumulative(self._out_batch, self._out_date, self._out_qty, ordinals)
+        value = self._cumulative(self._in_batch, self._in_date, self._in_value, ordinals)
+        return received, issued, value
+
+    def as_of(self, when: date, in_stock_only: bool = True) -> pd.DataFrame:
+        """Per-batch stock position at the end of ``when``.
+
+        Args:
+            when: As-of date (inclusive)
+            in_stock_only: Drop batches with nothing on hand
+
+        Returns:
+            DataFrame with batch details, received/issued qty, on_hand
+            (negative when sales exceed recorded receipts), avg_rate and
+            stock_value (on-hand stock only)
+        """
+        received, issued, value = (m[:, 0] for m in self.positions([when]))
+        df = self.batches.copy()
+        df['received_qty'] = received
+        df['issued_qty'] = issued
+        df['on_hand'] = received - issued
+        df['avg_rate'] = np.divide(value, received, out=np.zeros_like(value), where=received > 0)
+        df['stock_value'] = np.clip(df['on_hand'], 0, None) * df['avg_rate']
+        if in_stock_only:
+            df = df[df['on_hand'] > 0]
+        return df.sort_values('stock_value', ascending=False, ignore_index=True)
+
+    def series(self, dates: Sequence[date]) -> pd.DataFrame:
+        """Total stock position at each as-of date.
+
+        Args:
+            dates: As-of dates, ascending (e.g. ``month_ends(start, end)``)
+
+        Returns:
+            DataFrame with one row per date: on_hand_qty, stock_value,
+            batches_in_stock and oversold_batches
+        """
+        received, issued, value = self.positions(dates)
+        on_hand = received - issued
+        avg_rate = np.divide(value, received, out=np.zeros_like(value), where=received > 0)
+        stock_value = np.clip(on_hand, 0, None) * avg_rate
+        return pd.DataFrame({
+            'as_of': list(dates),
+            'on_hand_qty': np.clip(on_hand, 0, None).sum(axis=0),
+            'stock_value': stock_value.sum(axis=0),
+            'batches_in_stock': (on_hand > 0).sum(axis=0),
+            'oversold_batches': (on_hand < 0).sum(axis=0),
+        })
+
+    def category_series(self, dates: Sequence[date]) -> pd.DataFrame:
+        """Stock value per category at each as-of date (long form)."""
+        received, issued, value = self.positions(dates)
+        avg_rate = np.divide(value, received, out=np.zeros_like(value), where=received > 0)
+        stock_value = np.clip(received - issued, 0, None) * avg_rate
+        frame = pd.DataFrame(stock_value, columns=list(dates))
+        frame['category'] = self.batches['category'].to_numpy()
+        long = frame.groupby('category').sum().reset_index().melt(
+            id_vars='category', var_name='as_of', value_name='stock_value'
+        )
+        return long
+
+    def sell_through(self, as_of: date = None) -> pd.DataFrame:
+        """How fast each batch sold after it was received.
+
+        Issues are sorted by (batch, date) and cumulatively summed once; the
+        date a batch crosses 50%/90%/100% of its received quantity is then a
+        ``searchsorted`` of the target into that running total (it only
+        grows, so every batch's targets land inside its own run). Returns
+        (negative ``out_qty``) are ignored for this purpose. Day counts of
+        sales dated before the batch's first receipt are clamped to 0 and
+        the batch is flagged ``sold_before_receipt``.
+
+        Args:
+            as_of: Ignore receipts and sales after this date (default: the last sale)
+
+        Returns:
+            DataFrame with batch details, receipt_date (first dated receipt),
+            received_qty, sold_qty, sell_through_pct, first_sale_lag,
+            days_to_50/90/100 (days after receipt; NaN when not reached or
+            the batch has no dated receipt), sold_before_receipt, days_active
+            (receipt to sell-out or ``as_of``) and units_per_day
+        """
+        num_batches = len(self.batches)
+        if as_of is None:
+            as_of_ordinal = int(self._out_date.max()) if len(self._out_date) else date.today().toordinal()
+        else:
+            as_of_ordinal = as_of.toordinal()
+
+        arrived = self._in_date <= as_of_ordinal  # opening stock always counts
+        received = np.bincount(self._in_batch[arrived], weights=self._in_qty[arrived], minlength=num_batches)
+        dated = arrived & (self._in_date != _OPENING)
+        receipt = np.full(num_batches, _NO_DATE, dtype=np.int64)
+        np.minimum.at(receipt, self._in_batch[dated], self._in_date[dated])
+        has_receipt = receipt != _NO_DATE
+
+        keep = self._out_date <= as_of_ordinal
+        batch, when, qty = self._out_batch[keep], self._out_date[keep], np.clip(self._out_qty[keep], 0, None)
+        order = np.lexsort((when, batch))
+        batch, when, qty = batch[order], when[order], qty[order]
+        starts = np.searchsorted(batch, np.arange(num_batches), side='left')
+        ends = np.searchsorted(batch, np.arange(num_batches), side='right')
+        running = np.cumsum(qty)
+        before = np.concatenate(([0.0], running))
+        sold = before[ends] - before[starts]
+        has_sales = ends > starts
+
+        def days_after_receipt(index: np.ndarray, valid: np.ndarray) -> np.ndarray:
+            days = np.full(num_batches, np.nan)
+            ok = valid & has_receipt
+            days[ok] = np.maximum(when[index[ok]] - receipt[ok], 0)
+            return days
+
+        df = self.batches.copy()
+        df['receipt_date'] = [date.fromordinal(int(o)) if ok else None for o, ok in zip(receipt, has_receipt)]
+        df['received_qty'] = received
+        df['sold_qty'] = sold
+        df['sell_through_pct'] = np.divide(sold, received, out=np.zeros_like(sold), where=received > 0) * 100
+        first_sale = np.minimum(starts, max(len(when) - 1, 0))
+        df['first_sale_lag'] = days_after_receipt(first_sale, has_sales)
+        df['sold_before_receipt'] = has_sales & has_receipt & (when[first_sale] < receipt) if len(when) else False
+        for pct in (50, 90, 100):
+            target = before[starts] + received * pct / 100
+            hit = np.searchsorted(running, target, side='left')
+            reached = (received > 0) & (hit < ends)
+            df[f'days_to_{pct}'] = days_after_receipt(np.minimum(hit, max(len(when) - 1, 0)), reached)
+        sold_out = df['days_to_100'].to_numpy()
+        active = np.where(np.isnan(sold_out), as_of_ordinal - receipt, sold_out).clip(1, None)
+        df['days_active'] = np.where(has_receipt, active, np.nan)
+        df['units_per_day'] = df['sold_qty'] / df['days_active']
+        return df
+
+
+def item_sell_through(batch_velocity: pd.DataFrame) -> pd.DataFrame:
+    """Roll ``InventoryService.sell_through`` rows up to items.
+
+    Day counts are medians over the item's batches; units_per_day is total
+    sold over total active days and sold_before_receipt counts batches.
+
+    Args:
+        batch_velocity: Output of ``InventoryService.sell_through``
+
+    Returns:
+        DataFrame with one row per item
+    """
+    grouped = batch_velocity.groupby(['item_code', 'item_name', 'category'], sort=False, dropna=False)
+    items = grouped.agg(
+        batches=('batch_ref_no', 'size'),
+        received_qty=('received_qty', 'sum'),
+        sold_qty=('sold_qty', 'sum'),
+        first_sale_lag=('first_sale_lag', 'median'),
+        days_to_50=('days_to_50', 'median'),
+        days_to_90=('days_to_90', 'median'),
+        days_to_100=('days_to_100', 'median'),
+        days_active=('days_active', 'sum'),
+        sold_before_receipt=('sold_before_receipt', 'sum'),
+    ).reset_index()
+    items['sell_through_pct'] = (items['sold_qty'] / items['received_qty'].where(items['received_qty'] > 0) * 100).fillna(0.0)
+    items['units_per_day'] = items['sold_qty'] / items['days_active'].where(items['days_active'] > 0)
+    return items
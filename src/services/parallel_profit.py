@@ -0,0 +1,270 @@
+"""Process-pool batch profit calculation.
+
+Batches are partitioned into shards by a stable hash of their normalized key
+(``crc32``, so the same batch always lands in the same shard regardless of
+process or run). Each shard is sent to a worker as a columnar payload: numpy
+arrays of the sale and cost-layer fields plus offsets marking where each
+batch starts, instead of pickled ``Sale``/``Purchase`` lists. Workers compute
+the per-sale and per-batch metrics (including FIFO / weighted-average unit
+costs) and return them as arrays; the parent then fills in the
+``BatchProfit``/``SaleDetail`` objects without recomputing anything.
+
+Per-sale arithmetic and the per-batch sums run in the same order as
+``BatchProfit.calculate``, so the results are identical to the sequential
+path.
+"""
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from ..config import get_profit_share
+from ..models.profit import BatchProfit, SaleDetail
+from ..utils.intern import SEGMENTS
+from .cost_layers import unit_costs
+
+
+_NAT = np.iinfo(np.int64).min
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def shard_of(key: str, num_shards: int) -> int:
+    """Shard index of a batch key (stable across processes)."""
+    return zlib.crc32(key.encode('utf-8')) % num_shards
+
+
+def _timestamps(values: Sequence) -> np.ndarray:
+    """Microseconds since the epoch as int64 (_NAT for missing dates).
+
+    Converted through a per-call cache: rows share a small number of
+    distinct dates, and per-object datetime64 parsing is the slowest part of
+    building a payload.
+    """
+    cache = {None: _NAT}
+    out = []
+    for d in values:
+        v = cache.get(d)
+        if v is None:
+            v = cache[d] = (d - _EPOCH) // _MICROSECOND
+        out.append(v)
+    return np.array(out, dtype=np.int64)
+
+
+def _optional_dates(arr: np.ndarray) -> List:
+    """Timestamps with None for missing dates (the form cost_layers expects)."""
+    return [None if v == _NAT else v for v in arr.tolist()]
+
+
+def build_shard_payload(batches: List[BatchProfit], costing: str, segments: List[str]) -> Dict:
+    """Columnar payload for one shard.
+
+    Args:
+        batches: BatchProfit objects of the shard with purchase metrics
+                 already calculated (see ``BatchProfit.calculate_purchase``)
+        costing: Costing method
+        segments: Segment values indexed by their intern code, with None
+                  appended so code -1 resolves to None
+
+    Returns:
+        Dict of numpy arrays and offsets
+    """
+    sale_offsets = [0]
+    layer_offsets = [0]
+    sales = []
+    layers = []
+    for bp in batches:
+        sales.extend(bp.sales)
+        sale_offsets.append(len(sales))
+        if costing != 'last':
+            layers.extend(bp.purchases)
+        layer_offsets.append(len(layers))
+
+    return {
+        'costing': costing,
+        'sale_offsets': np.array(sale_offsets, dtype=np.int64),
+        'purchase_rate': np.array([bp.purchase_rate for bp in batches], dtype=np.float64),
+        'sale_qty': np.array([s.sale_qty for s in sales], dtype=np.int64),
+        'free_qty': np.array([s.free_qty for s in sales], dtype=np.int64),
+        'out_qty': np.array([s.out_qty for s in sales], dtype=np.int64),
+        'out_rate': np.array([s.out_rate for s in sales], dtype=np.float64),
+        'gross_value': np.array([s.gross_value for s in sales], dtype=np.float64),
+        'discount_value': np.array([s.discount_value for s in sales], dtype=np.float64),
+        'sale_date': _timestamps([s.transaction_date for s in sales]),
+        'segment': np.array([s.segment_id for s in sales], dtype=np.int32),
+        'segments': segments,
+        'layer_offsets': np.array(layer_offsets, dtype=np.int64),
+        'layer_date': _timestamps([p.purchase_date or p.transaction_date for p in layers]),
+        'layer_qty': np.array([p.in_qty for p in layers], dtype=np.int64),
+        'layer_rate': np.array([p.in_rate for p in layers], dtype=np.float64),
+    }
+
+
+def compute_shard(payload: Dict) -> Dict:
+    """Compute per-sale and per-batch metrics for one shard (runs in a worker).
+
+    Args:
+        payload: Output of ``build_shard_payload``
+
+    Returns:
+        Dict with per-sale arrays (unit cost, revenue, costs, profit, shares),
+        per-batch totals (None for batches without sales) and the ratio
+        string of each segment
+    """
+    costing = payload['costing']
+    offsets = payload['sale_offsets'].tolist()
+    purchase_rates = payload['purchase_rate'].tolist()
+    num_batches = len(purchase_rates)
+    segments = payload['segments']
+    seg_codes = payload['segment']
+    sale_qty = payload['sale_qty']
+    free_qty = payload['free_qty']
+    out_qty = payload['out_qty']
+
+    # Per-sale unit cost: the batch rate, or its cost layers
+    rates = np.repeat(payload['purchase_rate'], np.diff(payload['sale_offsets']))
+    layered = [False] * num_batches
+    if costing != 'last':
+        layer_offsets = payload['layer_offsets'].tolist()
+        layer_dates = _optional_dates(payload['layer_date'])
+        layer_qtys = payload['layer_qty'].tolist()
+        layer_rates = payload['layer_rate'].tolist()
+        sale_dates = _optional_dates(payload['sale_date'])
+        out_qtys = out_qty.tolist()
+        for b in range(num_batches):
+            la, lz = layer_offsets[b], layer_offsets[b + 1]
+            sa, sz = offsets[b], offsets[b + 1]
+            if la == lz or sa == sz:
+                continue
+            layered[b] = True
+            rates[sa:sz] = unit_costs(
+                costing, layer_dates[la:lz], layer_qtys[la:lz], layer_rates[la:lz],
+                sale_dates[sa:sz], out_qtys[sa:sz],
+            )
+
+    # Per-sale metrics (same operation order as Sale.calculate_profit_metrics)
+    shares = [get_profit_share(seg) for seg in segments]
+    sz_factor = np.array([s['SZ'] / 100 for s in shares], dtype=np.float64)[seg_codes]
+    gz_factor = np.array([s['GZ'] / 100 for s in shares], dtype=np.float64)[seg_codes]
+    revenue = sale_qty * payload['out_rate']
+    cogs = sale_qty * rates
+    free_cost = free_qty * rates
+    discount = np.abs(payload['discount_value'])
+    final = revenue - cogs - free_cost - discount
+    sz_share = final * sz_factor
+    gz_share = final * gz_factor
+    layer_cogs = rates * out_qty
+
+    # Per-batch totals, summed sequentially like BatchProfit.calculate
+    lists = {
+        'sale_qty': sale_qty.tolist(), 'free_qty': free_qty.tolist(), 'out_qty': out_qty.tolist(),
+        'gross_value': payload['gross_value'].tolist(), 'discount_value': payload['discount_value'].tolist(),
+        'revenue': revenue.tolist(), 'cogs': cogs.tolist(), 'free_cost': free_cost.tolist(),
+        'discount': discount.tolist(), 'sz': sz_share.tolist(), 'gz': gz_share.tolist(),
+        'layer_cogs': layer_cogs.tolist(), 'segment': seg_codes.tolist(),
+    }
+    totals = []
+    for b in range(num_batches):
+        a, z = offsets[b], offsets[b + 1]
+        if a == z:
+            totals.append(None)
+            continue
+        rate = purchase_rates[b]
+        total_sale_qty = sum(lists['sale_qty'][a:z])
+        total_free_qty = sum(lists['free_qty'][a:z])
+        total_out_qty = sum(lists['out_qty'][a:z])
+        revenue_from_sales = sum(lists['revenue'][a:z])
+        if layered[b]:
+            total_cogs = sum(lists['layer_cogs'][a:z])
+            total_cost_due_to_free = sum(lists['free_cost'][a:z])
+        else:
+            total_cogs = rate * total_out_qty
+            total_cost_due_to_free = rate * total_free_qty
+
+        segment_counts = {}
+        for code in lists['segment'][a:z]:
+            seg = segments[code] or 'Unknown'
+            segment_counts[seg] = segment_counts.get(seg, 0) + 1
+
+        totals.append((
+            total_sale_qty, total_free_qty, total_out_qty,
+            sum(lists['gross_value'][a:z]), sum(lists['discount_value'][a:z]),
+            revenue_from_sales, total_cogs, total_cost_due_to_free, sum(lists['discount'][a:z]),
+            sum(lists['cogs'][a:z]), sum(lists['sz'][a:z]), sum(lists['gz'][a:z]),
+            max(segment_counts, key=segment_counts.get),
+        ))
+
+    return {
+        'rate': rates,
+        'revenue': revenue,
+        'cogs': cogs,
+        'free_cost': free_cost,
+        'discount': discount,
+        'final': final,
+        'sz': sz_share,
+        'gz': gz_share,
+        'ratio': [f"{s['SZ']}/{s['GZ']}" for s in shares],
+        'layered': layered,
+        'totals': totals,
+    }
+
+
+def apply_shard_result(batches: List[BatchProfit], payload: Dict, result: Dict) -> None:
+    """Fill the shard's BatchProfit objects from a worker result."""
+    offsets = payload['sale_offsets'].tolist()
+    seg_codes = payload['segment'].tolist()
+    rate, revenue, cogs, free_cost, discount, final, sz, gz = (
+        result[k].tolist() for k in ('rate', 'revenue', 'cogs', 'free_cost', 'discount', 'final', 'sz', 'gz')
+    )
+    ratio = result['ratio']
+
+    for b, bp in enumerate(batches):
+        totals = result['totals'][b]
+        if totals is None:
+            bp.finish_totals()
+            continue
+        a = offsets[b]
+        bp.sale_details = [
+            SaleDetail(
+                sale, rate[i], revenue[i], cogs[i], free_cost[i], discount[i], final[i],
+                sale.segment, ratio[seg_codes[i]], sz[i], gz[i],
+            )
+            for i, sale in enumerate(bp.sales, a)
+        ]
+        if result['layered'][b]:
+            bp.sale_unit_costs = rate[a:offsets[b + 1]]
+        (bp.total_sale_qty, bp.total_free_qty, bp.total_out_qty,
+         bp.gross_revenue, bp.discount_given,
+         bp.revenue_from_sales, bp.total_cogs, bp.total_cost_due_to_free, bp.total_cost_due_to_discount,
+         bp.total_cost_of_goods_sold, bp.sz_profit_share, bp.gz_profit_share, bp.segment) = totals
+        bp.has_sales = True
+        bp.net_revenue = bp.gross_revenue - bp.discount_given
+        bp.total_revenue_from_sales = bp.revenue_from_sales
+        if bp.total_sale_qty > 0:
+            bp.avg_sale_rate = bp.revenue_from_sales / bp.total_sale_qty
+        bp.finish_totals()
+
+
+def calculate_parallel(batches: List[BatchProfit], costing: str, workers: int) -> None:
+    """Calculate sale metrics for ``batches`` across a process pool (in place).
+
+    Args:
+        batches: BatchProfit objects with purchase metrics calculated
+        costing: Costing method
+        workers: Number of worker processes (and shards)
+    """
+    shards: List[List[BatchProfit]] = [[] for _ in range(workers)]
+    for bp in batches:
+        shards[shard_of(bp.batch_ref_no, workers)].append(bp)
+    shards = [shard for shard in shards if shard]
+
+    segments = SEGMENTS.values + [None]
+    payloads = [build_shard_payload(shard, costing, segments) for shard in shards]
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(payloads))) as pool:
+        results = list(pool.map(compute_shard, payloads))
+
+    for shard, payload, result in zip(shards, payloads, results):
+        apply_shard_result(shard, payload, result)
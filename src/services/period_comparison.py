@@ -0,0 +1,215 @@
+"""Profit comparison across date windows (quarter vs quarter, month over month).
+
+Sale-level profit components are taken from calculated batches, sorted once
+by sale date, and each window becomes a contiguous slice of the sorted
+arrays (two ``searchsorted`` calls). Per-window totals by batch, item,
+segment and category are then ``bincount`` sums over the slice, so N windows
+cost N vectorized passes instead of N full recalculations.
+"""
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ..models.profit import BatchProfit
+from ..utils.intern import SEGMENTS
+
+
+LEVELS = ('batch', 'item', 'segment', 'category')
+
+MEASURES = ('sale_qty', 'revenue', 'cost_of_sales', 'discount', 'profit', 'sz_profit_share', 'gz_profit_share')
+
+
+@dataclass
+class PeriodWindow:
+    """A named, inclusive date range."""
+    label: str
+    start: date
+    end: date
+
+
+def previous_period(start: date, end: date) -> PeriodWindow:
+    """The window of the same length ending the day before ``start``."""
+    days = (end - start).days
+    prev_end = start - timedelta(days=1)
+    prev_start = prev_end - timedelta(days=days)
+    return PeriodWindow(f"{prev_start} to {prev_end}", prev_start, prev_end)
+
+
+def same_period_last_year(start: date, end: date) -> PeriodWindow:
+    """``start``..``end`` shifted back one year (29 Feb maps to 28 Feb)."""
+    def shift(d: date) -> date:
+        try:
+            return d.replace(year=d.year - 1)
+        except ValueError:
+            return d.replace(year=d.year - 1, day=28)
+    prev_start, prev_end = shift(start), shift(end)
+    return PeriodWindow(f"{prev_start} to {prev_end}", prev_start, prev_end)
+
+
+def month_windows(start: date, end: date) -> List[PeriodWindow]:
+    """Calendar months overlapping ``start``..``end`` (clipped to the range)."""
+    windows = []
+    cursor = date(start.year, start.month, 1)
+    while cursor <= end:
+        next_month = date(cursor.year + cursor.month // 12, cursor.month % 12 + 1, 1)
+        windows.append(PeriodWindow(cursor.strftime('%Y-%m'), max(cursor, start), min(next_month - timedelta(days=1), end)))
+        cursor = next_month
+    return windows
+
+
+class PeriodComparison:
+    """Per-window profit totals by batch, item, segment and category."""
+
+    def __init__(self, batch_profits: List[BatchProfit], windows: List[PeriodWindow]):
+        """Sort the sale-level components by date and total them per window.
+
+        Args:
+            batch_profits: Calculated BatchProfit objects covering every window
+            windows: Date windows to compare, oldest first
+        """
+        if not windows:
+            raise ValueError("At least one window is required")
+        self.windows = windows
+
+        # Key tables per level
+        items: Dict[str, int] = {}
+        item_rows: List[Tuple[str, str]] = []
+        categories = sorted({bp.category for bp in batch_profits})
+        category_code = {cat: i for i, cat in enumerate(categories)}
+        self.labels = {
+            'batch': pd.DataFrame({
+                'batch_ref_no': [bp.batch_ref_no for bp in batch_profits],
+                'item_name': [bp.item_name for bp in batch_profits],
+            }),
+            'category': pd.DataFrame({'category': categories}),
+        }
+
+        ordinals, batch_idx, item_idx, segment_idx = [], [], [], []
+        details = []
+        ordinal_of = {None: -1}
+        for b, bp in enumerate(batch_profits):
+            for sd in bp.sale_details:
+                sale = sd.sale
+                d = sale.transaction_date
+                o = ordinal_of.get(d)
+                if o is None:
+                    o = ordinal_of[d] = d.toordinal()
+                ordinals.append(o)
+                batch_idx.append(b)
+                i = items.get(sale.item_code)
+                if i is None:
+                    i = items[sale.item_code] = len(item_rows)
+                    item_rows.append((sale.item_code, sale.item_name))
+                item_idx.append(i)
+                segment_idx.append(sale.segment_id if sale.segment else -1)
+                details.append(sd)
+        self.labels['item'] = pd.DataFrame(item_rows, columns=['item_code', 'item_name'])
+        segment_codes = sorted(set(segment_idx))
+        self.labels['segment'] = pd.DataFrame({
+            'segment': [SEGMENTS.value(c) or 'Unknown' for c in segment_codes],
+        })
+
+        # Sort everything once by sale date
+        order = np.argsort(np.asarray(ordinals, dtype=np.int64), kind='stable')
+        dates = np.asarray(ordinals, dtype=np.int64)[order]
+        batch_keys = np.asarray(batch_idx, dtype=np.int64)
+        segment_pos = {c: i for i, c in enumerate(segment_codes)}
+        keys = {
+            'batch': batch_keys,
+            'item': np.asarray(item_idx, dtype=np.int64),
+            'segment': np.array([segment_pos[c] for c in segment_idx], dtype=np.int64),
+            'category': np.array([category_code[bp.category] for bp in batch_profits], dtype=np.int64)[batch_keys]
+            if batch_profits else np.zeros(0, dtype=np.int64),
+        }
+        keys = {level: k[order] for level, k in keys.items()}
+
+        revenue = np.array([sd.revenue_from_sale for sd in details], dtype=np.float64)
+        out_qty = np.array([sd.sale.out_qty for sd in details], dtype=np.float64)
+        cost = np.array([sd.purchase_rate for sd in details], dtype=np.float64) * out_qty
+        discount = np.array([sd.cost_due_to_discount for sd in details], dtype=np.float64)
+        measures = {
+            'sale_qty': np.array([sd.sale.sale_qty for sd in details], dtype=np.float64),
+            'revenue': revenue,
+            'cost_of_sales': cost,
+            'discount': discount,
+            'profit': revenue - cost - discount,
+            'sz_profit_share': np.array([sd.sz_profit_share for sd in details], dtype=np.float64),
+            'gz_profit_share': np.array([sd.gz_profit_share for sd in details], dtype=np.float64),
+        }
+        measures = {m: v[order] for m, v in measures.items()}
+
+        # Each window is a contiguous slice of the sorted arrays
+        starts = np.searchsorted(dates, [w.start.toordinal() for w in windows], side='left')
+        stops = np.searchsorted(dates, [w.end.toordinal() for w in windows], side='right')
+        self.slices: List[Tuple[int, int]] = list(zip(starts.tolist(), stops.tolist()))
+
+        # totals[level][measure]: windows × keys (per-sale arrays are not kept)
+        self.totals = {}
+        for level in LEVELS:
+            size = len(self.labels[level])
+            self.totals[level] = {m: np.zeros((len(windows), size)) for m in MEASURES}
+        for w, (lo, hi) in enumerate(self.slices):
+            for level in LEVELS:
+                k = keys[level][lo:hi]
+                size = len(self.labels[level])
+                for m in MEASURES:
+                    self.totals[level][m][w] = np.bincount(k, weights=measures[m][lo:hi], minlength=size)
+
+    def window_totals(self) -> pd.DataFrame:
+        """One row per window with every measure."""
+        rows = []
+        for w, window in enumerate(self.windows):
+            row = {'window': window.label, 'start': window.start, 'end': window.end}
+            for m in MEASURES:
+                row[m] = float(self.totals['category'][m][w].sum())
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    def deltas(self, level: str) -> pd.DataFrame:
+        """Long-form totals per key and window, with the change from the previous window.
+
+        Args:
+            level: One of LEVELS
+
+        Returns:
+            DataFrame with the level's key columns, ``window``, every measure
+            and ``<measure>_change`` (NaN for the first window); keys with no
+            sales in any window are dropped
+        """
+        if level not in LEVELS:
+            raise ValueError(f"Unknown level: {level}")
+        totals = self.totals[level]
+        active = np.flatnonzero(np.abs(totals['revenue']).sum(axis=0) + totals['sale_qty'].sum(axis=0)
+                                + np.abs(totals['profit']).sum(axis=0))
+        frames = []
+        for w, window in enumerate(self.windows):
+            frame = self.labels[level].iloc[active].reset_index(drop=True)
+            frame['window'] = window.label
+            for m in MEASURES:
+                frame[m] = totals[m][w][active]
+                frame[f"{m}_change"] = totals[m][w][active] - totals[m][w - 1][active] if w else np.nan
+            frames.append(frame)
+        return pd.concat(frames, ignore_index=True)
+
+    def pivot(self, level: str, measure: str = 'profit') -> pd.DataFrame:
+        """One row per key, one column per window, plus change (last vs previous window)."""
+        if level not in LEVELS:
+            raise ValueError(f"Unknown level: {level}")
+        values = self.totals[level][measure]
+        frame = self.labels[level].copy()
+        for w, window in enumerate(self.windows):
+            frame[window.label] = values[w]
+        last = values[-1]
+        prev = values[-2] if len(self.windows) > 1 else np.zeros_like(last)
+        frame['change'] = last - prev
+        frame['change_pct'] = np.where(prev != 0, (last - prev) / np.where(prev != 0, np.abs(prev), 1) * 100, np.nan)
+        return frame[(values != 0).any(axis=0)].reset_index(drop=True)
+
+    def movers(self, level: str, measure: str = 'profit', n: int = 10) -> pd.DataFrame:
+        """The ``n`` keys with the largest absolute change between the last two windows."""
+        frame = self.pivot(level, measure)
+        order = frame['change'].abs().sort_values(ascending=False, kind='stable').index[:n]
+        return frame.loc[order].reset_index(drop=True)
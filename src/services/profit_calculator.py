@@ -1,53 +1,150 @@
 """Profit calculation service."""
-from typing import List, Dict
+from datetime import date
+from typing import List, Dict, Tuple
 from ..models.purchase import Purchase
 from ..models.sale import Sale
 from ..models.profit import BatchProfit
+from ..utils.batch_keys import batch_key
+from .. import config
+from ..utils.perf import stage, timed
+from .batch_index import BatchKeyIndex
+from .cost_layers import COSTING_METHODS, batch_unit_costs
+from .period_comparison import PeriodComparison, PeriodWindow
 
 
 class ProfitCalculatorService:
     """Service to calculate batch-wise profit."""
     
-    def __init__(self, purchases: List[Purchase], sales: List[Sale]):
-        """Initialize with purchases and sales data."""
+    @timed()
+    def __init__(self, purchases: List[Purchase], sales: List[Sale], costing: str = 'last'):
+        """Initialize with purchases and sales data.
+        
+        Args:
+            purchases: List of Purchase objects
+            sales: List of Sale objects
+            costing: How sales are costed when a batch was purchased more than
+                     once: 'last' (last purchase rate), 'fifo' or 'average'
+                     (see ``cost_layers``)
+        """
+        if costing not in COSTING_METHODS:
+            raise ValueError(f"Unknown costing method: {costing}")
         self.purchases = purchases
         self.sales = sales
+        self.costing = costing
         
-        # Create lookups
-        self.purchase_by_batch = {}
-        for p in purchases:
-            if p.batch_ref_no:
-                self.purchase_by_batch[p.batch_ref_no] = p
-        
-        self.sales_by_batch = {}
-        for s in sales:
-            if s.batch_no:
-                if s.batch_no not in self.sales_by_batch:
-                    self.sales_by_batch[s.batch_no] = []
-                self.sales_by_batch[s.batch_no].append(s)
+        # Create lookups (keyed by normalized batch id)
+        self.batch_index = BatchKeyIndex(purchases, sales)
+        self.purchase_by_batch = self.batch_index.purchase_by_id
+        self.purchases_by_batch = self.batch_index.purchases_by_id
+        self.sales_by_batch = self.batch_index.sales_by_id
         
         # Get all unique batches
-        self.all_batches = set(self.purchase_by_batch.keys()) | set(self.sales_by_batch.keys())
+        self.all_batches = self.batch_index.all_ids
+    
+    @classmethod
+    def from_store(cls, store, start_date: date = None, end_date: date = None,
+                   include_categories: List[str] = None, costing: str = 'last') -> 'ProfitCalculatorService':
+        """Create a calculator over only the rows needed for the given filters.
+        
+        The date and category predicates are evaluated by the store's indexes,
+        so the result matches filtering the full lists in Python.
+        
+        Args:
+            store: SQLiteStore holding purchases and sales
+            start_date: Filter purchases (purchase date) and sales (sale date) from this date
+            end_date: Filter up to and including this date
+            include_categories: Batch categories to keep (default: ['FG', 'TR'])
+            costing: Costing method (layered methods load every purchase of each batch)
+        
+        Returns:
+            ProfitCalculatorService
+        """
+        purchases, sales = store.load_profit_inputs(
+            start_date, end_date, include_categories, all_purchases=costing != 'last'
+        )
+        return cls(purchases, sales, costing=costing)
+    
+    @staticmethod
+    @timed()
+    def get_summaries_from_store(store, start_date: date = None, end_date: date = None,
+                                 include_categories: List[str] = None,
+                                 segments: List[str] = None) -> Tuple[Dict, Dict]:
+        """Compute get_summary_stats and get_summary_by_category in the store.
+        
+        Args:
+            store: SQLiteStore holding purchases and sales
+            start_date: Filter start date
+            end_date: Filter end date
+            include_categories: Batch categories to keep (default: ['FG', 'TR'])
+            segments: Keep batches whose dominant segment is in this list
+                      (batches with no sales or an unknown segment are kept)
+        
+        Returns:
+            Tuple of (overall_summary, summary_by_category)
+        """
+        df = store.batch_totals(start_date, end_date, include_categories)
+        if segments is not None:
+            df = df[df['segment'].isna() | (df['segment'] == 'Unknown') | df['segment'].isin(segments)]
+        
+        total_batches = len(df)
+        total_revenue = float(df['revenue'].sum())
+        total_profit = float(df['profit'].sum())
+        batches_with_profit = int((df['profit'] > 0).sum())
+        batches_with_loss = int((df['profit'] < 0).sum())
+        overall = {
+            'total_batches': total_batches,
+            'total_purchase_cost': round(float(df['purchase_cost'].sum()), 2),
+            'total_revenue': round(total_revenue, 2),
+            'total_profit': round(total_profit, 2),
+            'avg_profit_margin': round(total_profit / total_revenue * 100, 2) if total_revenue > 0 else 0.0,
+            'batches_with_profit': batches_with_profit,
+            'batches_with_loss': batches_with_loss,
+            'batches_breakeven': total_batches - batches_with_profit - batches_with_loss,
+        }
+        
+        by_category = {}
+        for cat, group in df.groupby('category', sort=False):
+            revenue = float(group['revenue'].sum())
+            profit = float(group['profit'].sum())
+            by_category[cat] = {
+                'total_batches': len(group),
+                'total_purchase_cost': float(group['purchase_cost'].sum()),
+                'total_revenue': revenue,
+                'total_profit': profit,
+                'avg_profit_margin': (profit / revenue * 100) if revenue > 0 else 0.0,
+                'batches_with_profit': int((group['profit'] > 0).sum()),
+                'batches_with_loss': int((group['profit'] <= 0).sum()),
+            }
+        
+        return overall, by_category
     
-    def calculate_batch_profits(self, include_categories: List[str] = None) -> List[BatchProfit]:
+    @timed()
+    def calculate_batch_profits(self, include_categories: List[str] = None, workers: int = None) -> List[BatchProfit]:
         """Calculate profit for all batches.
         
         Args:
             include_categories: List of categories to include (e.g., ['FG', 'TR'])
                                If None, includes FG and TR by default
+            workers: Worker processes for the sale metrics (default: config
+                     PROFIT_WORKERS). Batches are sharded by key hash; small
+                     inputs (< PROFIT_PARALLEL_MIN_SALES sales) always run
+                     in this process.
         
         Returns:
             List of BatchProfit objects
         """
         if include_categories is None:
             include_categories = ['FG', 'TR']  # Default to tradeable items only
+        if workers is None:
+            workers = config.PROFIT_WORKERS
+        parallel = workers > 1 and len(self.sales) >= config.PROFIT_PARALLEL_MIN_SALES
         
         batch_profits = []
         
-        for batch_ref_no in self.all_batches:
+        for batch_id in self.all_batches:
             # Get purchase and sales for this batch
-            purchase = self.purchase_by_batch.get(batch_ref_no)
-            sales = self.sales_by_batch.get(batch_ref_no, [])
+            purchase = self.purchase_by_batch.get(batch_id)
+            sales = self.sales_by_batch.get(batch_id, [])
             
             # Determine category and item info
             if purchase:
@@ -65,23 +162,67 @@ class ProfitCalculatorService:
             if category not in include_categories:
                 continue
             
+            # Cost layers: every purchase of this item under the batch
+            layers = [p for p in self.purchases_by_batch.get(batch_id, []) if p.item_code == item_code]
+            
             # Create BatchProfit object
             batch_profit = BatchProfit(
-                batch_ref_no=batch_ref_no,
+                batch_ref_no=batch_key(batch_id),
                 item_code=item_code,
                 item_name=item_name,
                 category=category,
                 purchase=purchase,
+                purchases=layers,
+                costing=self.costing,
+                sale_unit_costs=[] if parallel else (batch_unit_costs(self.costing, layers, sales) or []),
                 sales=sales,
             )
             
-            # Calculate all metrics
-            batch_profit.calculate()
+            # Calculate all metrics (sale metrics are computed by the workers in parallel mode)
+            if parallel:
+                batch_profit.calculate_purchase()
+            else:
+                batch_profit.calculate()
             
             batch_profits.append(batch_profit)
         
+        if parallel:
+            from .parallel_profit import calculate_parallel
+            with stage("Profit: parallel sale metrics") as info:
+                info['rows'] = len(self.sales)
+                calculate_parallel(batch_profits, self.costing, workers)
+    
         return batch_profits
     
+    @timed()
+    def compare_periods(self, windows: List[PeriodWindow], include_categories: List[str] = None,
+                        batch_profits: List[BatchProfit] = None) -> PeriodComparison:
+        """Compare profit across date windows (by sale date) in one pass.
+        
+        Sales are costed once over everything this calculator holds, then split
+        into the windows, so every window uses the same purchase costs.
+        
+        Args:
+            windows: Date windows to compare, oldest first
+            include_categories: Categories to include (default: FG and TR)
+            batch_profits: Already calculated batches to reuse (optional)
+        
+        Returns:
+            PeriodComparison with totals and deltas by batch, item, segment and category
+        """
+        if batch_profits is None:
+            batch_profits = self.calculate_batch_profits(include_categories=include_categories)
+        return PeriodComparison(batch_profits, windows)
+    
+    def get_normalized_matches(self) -> List[Dict]:
+        """Batches whose sales only matched a purchase after key normalization.
+        
+        Returns:
+            List of dicts (see BatchKeyIndex.normalization_matches)
+        """
+        return self.batch_index.normalization_matches()
+    
+    @timed()
     def get_summary_by_category(self, batch_profits: List[BatchProfit]) -> Dict:
         """Get summary statistics by category.
         
@@ -124,6 +265,7 @@ class ProfitCalculatorService:
         
         return summary
     
+    @timed(rows=lambda r: r['total_batches'])
     def get_summary_stats(self, batch_profits: List[BatchProfit]) -> Dict:
         """Get overall summary statistics.
         
@@ -0,0 +1,261 @@
+"""Pre-aggregated profit cube.
+
+Sale-level profit components are summed once into cells keyed by
+month × segment × category × item × customer × manager × division ×
+country × city, plus much smaller month × segment × category,
+month × manager × division and segment × country × city aggregates. Page
+summaries (partner shares, category performance, monthly trends,
+manager/division margins, geography) roll up from the smallest aggregate that
+has the dimensions they need. Batch-level figures (purchase cost,
+profit/loss counts, the batch table) still come from the BatchProfit rows.
+"""
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ..models.profit import BatchProfit
+from ..utils.intern import CITIES, COUNTRIES, CUSTOMERS, DIVISIONS, MANAGERS, SEGMENTS, InternTable
+
+
+DIMENSIONS = ('month', 'segment', 'category', 'item', 'customer', 'manager', 'division', 'country', 'city')
+
+MEASURES = (
+    'sale_count',
+    'sale_qty',
+    'free_qty',
+    'out_qty',
+    'revenue',
+    'cogs',
+    'free_cost',
+    'discount',
+    'cost_of_sales',
+    'profit',
+    'sz_profit_share',
+    'gz_profit_share',
+)
+
+# Materialized aggregates, smallest first; the full cube is always last
+AGGREGATES = (
+    ('month', 'segment', 'category'),
+    ('month', 'manager', 'division'),
+    ('segment', 'country', 'city'),
+    DIMENSIONS,
+)
+
+
+_MAX_KEY = 2 ** 62
+
+
+def _aggregate(columns: Dict[str, np.ndarray], dims: Sequence[str]) -> pd.DataFrame:
+    """Sum MEASURES over unique combinations of ``dims``.
+
+    The dimension codes are packed into one int64 key (each column is
+    factorized first, so the key stays small), then every measure is summed
+    with a single ``bincount``. When the packed range would overflow, the
+    partial key is re-factorized to its distinct values first (an
+    order-preserving remap, so cells stay sorted by the dims).
+    """
+    n = len(columns['sale_count'])
+    key = np.zeros(n, dtype=np.int64)
+    key_range = 1
+    for dim in dims:
+        codes, uniques = pd.factorize(columns[dim], sort=True)
+        size = max(len(uniques), 1)
+        if key_range * size >= _MAX_KEY:
+            key, distinct = pd.factorize(key, sort=True)
+            key_range = max(len(distinct), 1)
+        key = key * size + codes
+        key_range *= size
+    uniq, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+
+    cells = {dim: np.asarray(columns[dim])[first] for dim in dims}
+    for m in MEASURES:
+        values = np.asarray(columns[m])
+        sums = np.bincount(inverse, weights=values, minlength=len(uniq))
+        cells[m] = sums.astype(values.dtype) if values.dtype.kind == 'i' else sums
+    return pd.DataFrame(cells)
+
+
+def _intern_codes(table: InternTable, values: List) -> np.ndarray:
+    """Intern codes of ``values``, looking each distinct value up once."""
+    code_of = {v: table.code(v) for v in set(values)}
+    return np.array([code_of[v] for v in values], dtype=np.int32)
+
+
+class ProfitCube:
+    """Sale-level profit measures summed by month, segment, category, item,
+    customer, manager, division, country and city.
+
+    Dimensions are stored as integer codes (month as ``YYYYMM``, 0 when the
+    sale is undated; item/category as indexes into the cube's own label
+    lists; the rest as intern codes) and decoded to labels only for
+    the rolled-up result.
+
+    ``cost_of_sales`` is unit cost × outward quantity (free goods included),
+    so ``profit = revenue - cost_of_sales - discount`` adds up to
+    ``BatchProfit.profit``.
+    """
+
+    def __init__(self, aggregates: Dict[Tuple[str, ...], pd.DataFrame], categories: List[str],
+                 item_names: List[str]):
+        """Wrap pre-aggregated cells.
+
+        Args:
+            aggregates: Cells per materialized dimension tuple (see AGGREGATES)
+            categories: Category labels indexed by the ``category`` code
+            item_names: Item names indexed by the ``item`` code
+        """
+        self.aggregates = aggregates
+        self.categories = categories
+        self.item_names = item_names
+
+    @property
+    def cells(self) -> pd.DataFrame:
+        """The full-grain cells."""
+        return self.aggregates[DIMENSIONS]
+
+    @classmethod
+    def build(cls, batch_profits: List[BatchProfit]) -> 'ProfitCube':
+        """Aggregate the sale details of calculated batches.
+
+        Args:
+            batch_profits: Calculated BatchProfit objects
+
+        Returns:
+            ProfitCube
+        """
+        categories = sorted({bp.category for bp in batch_profits})
+        category_code = {cat: i for i, cat in enumerate(categories)}
+        details = [sd for bp in batch_profits for sd in bp.sale_details]
+        sales = [sd.sale for sd in details]
+
+        # Month and item codes through small local lookups
+        month_of = {None: 0}
+        item_of: Dict[str, int] = {}
+        item_names: List[str] = []
+        months, items = [], []
+        for sale in sales:
+            d = sale.transaction_date
+            m = month_of.get(d)
+            if m is None:
+                m = month_of[d] = d.year * 100 + d.month
+            months.append(m)
+            i = item_of.get(sale.item_code)
+            if i is None:
+                i = item_of[sale.item_code] = len(item_names)
+                item_names.append(sale.item_name)
+            items.append(i)
+
+        out_qty = np.array([s.out_qty for s in sales], dtype=np.int64)
+        revenue = np.array([sd.revenue_from_sale for sd in details], dtype=np.float64)
+        discount = np.array([sd.cost_due_to_discount for sd in details], dtype=np.float64)
+        cost_of_sales = np.array([sd.purchase_rate for sd in details], dtype=np.float64) * out_qty
+        rows = {
+            'month': np.array(months, dtype=np.int32),
+            'segment': np.array([s.segment_id for s in sales], dtype=np.int32),
+            'category': np.repeat(
+                np.array([category_code[bp.category] for bp in batch_profits], dtype=np.int32),
+                [len(bp.sale_details) for bp in batch_profits],
+            ),
+            'item': np.array(items, dtype=np.int32),
+            'customer': np.array([s.customer_id for s in sales], dtype=np.int32),
+            'manager': _intern_codes(MANAGERS, [s.manager_name for s in sales]),
+            'division': _intern_codes(DIVISIONS, [s.division for s in sales]),
+            'country': _intern_codes(COUNTRIES, [s.country for s in sales]),
+            'city': _intern_codes(CITIES, [s.city for s in sales]),
+            'sale_count': np.ones(len(sales), dtype=np.int64),
+            'sale_qty': np.array([s.sale_qty for s in sales], dtype=np.int64),
+            'free_qty': np.array([s.free_qty for s in sales], dtype=np.int64),
+            'out_qty': out_qty,
+            'revenue': revenue,
+            'cogs': np.array([sd.cost_of_goods_sold for sd in details], dtype=np.float64),
+            'free_cost': np.array([sd.cost_due_to_free for sd in details], dtype=np.float64),
+            'discount': discount,
+            'cost_of_sales': cost_of_sales,
+            'profit': revenue - cost_of_sales - discount,
+            'sz_profit_share': np.array([sd.sz_profit_share for sd in details], dtype=np.float64),
+            'gz_profit_share': np.array([sd.gz_profit_share for sd in details], dtype=np.float64),
+        }
+        cells = _aggregate(rows, DIMENSIONS)
+        aggregates = {dims: _aggregate(cells, dims) for dims in AGGREGATES[:-1]}
+        aggregates[DIMENSIONS] = cells
+        return cls(aggregates, categories, item_names)
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def _source(self, dims) -> pd.DataFrame:
+        """Smallest materialized aggregate containing ``dims``."""
+        for unknown in set(dims) - set(DIMENSIONS):
+            raise ValueError(f"Unknown dimension: {unknown}")
+        for agg_dims, cells in self.aggregates.items():
+            if set(dims) <= set(agg_dims):
+                return cells
+        return self.cells
+
+    def filter(self, **criteria) -> 'ProfitCube':
+        """Sub-cube keeping cells whose dimension labels are in the given lists.
+
+        Only aggregates that have every filtered dimension are kept.
+        Example: ``cube.filter(segment=['PCD'], category=['FG'])``
+        """
+        aggregates = {}
+        for agg_dims, cells in self.aggregates.items():
+            if not set(criteria) <= set(agg_dims):
+                continue
+            mask = np.ones(len(cells), dtype=bool)
+            for dim, labels in criteria.items():
+                mask &= self._labels(dim, cells[dim]).isin(list(labels)).to_numpy()
+            aggregates[agg_dims] = cells[mask].reset_index(drop=True)
+        self._source(criteria)  # validates the dimension names
+        return ProfitCube(aggregates, self.categories, self.item_names)
+
+    def totals(self) -> Dict[str, float]:
+        """Grand total of every measure."""
+        cells = self._source(())
+        return {m: cells[m].sum().item() for m in MEASURES}
+
+    def rollup(self, by: List[str]) -> pd.DataFrame:
+        """Sum the measures by some dimensions, with decoded labels.
+
+        Args:
+            by: Dimensions to keep (subset of DIMENSIONS)
+
+        Returns:
+            DataFrame with the ``by`` columns, every measure and
+            ``profit_margin`` (% of revenue), sorted by the ``by`` columns
+        """
+        cells = self._source(by)
+        if by:
+            result = _aggregate({c: cells[c].to_numpy() for c in cells.columns}, by)
+            result = result.sort_values(list(by), ignore_index=True)
+        else:
+            result = cells[list(MEASURES)].sum().to_frame().T
+        for dim in by:
+            result[dim] = self._labels(dim, result[dim])
+        revenue = result['revenue']
+        result['profit_margin'] = (result['profit'] / revenue.where(revenue > 0) * 100).fillna(0.0)
+        return result
+
+    def _labels(self, dim: str, codes: pd.Series) -> pd.Series:
+        """Decode a dimension's codes to display labels."""
+        if dim == 'month':
+            decode = lambda m: f"{m // 100:04d}-{m % 100:02d}" if m else 'Undated'
+        elif dim == 'segment':
+            decode = lambda c: SEGMENTS.value(c) or 'Unknown'
+        elif dim == 'category':
+            decode = self.categories.__getitem__
+        elif dim == 'item':
+            decode = self.item_names.__getitem__
+        elif dim == 'manager':
+            decode = lambda c: MANAGERS.value(c) or 'Unassigned'
+        elif dim == 'division':
+            decode = lambda c: DIVISIONS.value(c) or 'Unassigned'
+        elif dim == 'country':
+            decode = lambda c: COUNTRIES.value(c) or 'Unknown'
+        elif dim == 'city':
+            decode = lambda c: CITIES.value(c) or 'Unknown'
+        else:
+            decode = CUSTOMERS.value
+        return codes.map({code: decode(code) for code in codes.unique().tolist()})
@@ -0,0 +1,162 @@
+"""What-if analysis of SZ/GZ profit-share configurations.
+
+Profit shares are linear in profit: a batch's SZ share is the sum over its
+sales of ``final_profit × SZ% / 100`` for each sale's segment. So instead of
+recomputing every ``SaleDetail``, per-batch profit is first totalled per
+segment into a (batches × segments) matrix; evaluating K candidate
+configurations is then a single product with a (segments × K) share matrix.
+Hundreds of scenarios cost about the same as one.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from ..config import DEFAULT_PROFIT_SHARE, PROFIT_SHARE_CONFIG
+from ..models.profit import BatchProfit
+from ..utils.intern import SEGMENTS
+
+
+@dataclass
+class ShareScenario:
+    """A candidate profit-share configuration (same shape as PROFIT_SHARE_CONFIG)."""
+    name: str
+    shares: Dict[str, Dict[str, float]]
+    default: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_PROFIT_SHARE))
+
+    @classmethod
+    def current(cls, name: str = 'Current') -> 'ShareScenario':
+        """The configuration in ``src/config.py``."""
+        return cls(name, {seg: dict(s) for seg, s in PROFIT_SHARE_CONFIG.items()}, dict(DEFAULT_PROFIT_SHARE))
+
+    def share(self, segment: Optional[str]) -> Dict[str, float]:
+        """Shares for a segment (same fallback rule as ``config.get_profit_share``)."""
+        if segment and segment in self.shares:
+            return self.shares[segment]
+        return self.default
+
+    def validate(self) -> List[str]:
+        """Segments whose shares do not add up to 100%."""
+        errors = []
+        for segment, shares in list(self.shares.items()) + [('Default', self.default)]:
+            total = shares['SZ'] + shares['GZ']
+            if total != 100:
+                errors.append(f"{self.name} / {segment}: shares total {total}% (should be 100%)")
+        return errors
+
+
+@dataclass
+class ScenarioResult:
+    """SZ/GZ shares for every scenario (last axis = scenario)."""
+    scenarios: List[str]
+    segments: List[str]
+    batch_sz: np.ndarray  # batches × scenarios
+    batch_gz: np.ndarray
+    segment_sz: np.ndarray  # segments × scenarios
+    segment_gz: np.ndarray
+    total_sz: np.ndarray  # scenarios
+    total_gz: np.ndarray
+
+    def totals_frame(self) -> pd.DataFrame:
+        """One row per scenario with total SZ and GZ shares."""
+        return pd.DataFrame({
+            'scenario': self.scenarios,
+            'sz_profit_share': self.total_sz,
+            'gz_profit_share': self.total_gz,
+        })
+
+    def segment_frame(self, partner: str = 'SZ') -> pd.DataFrame:
+        """Partner share per segment (rows) and scenario (columns)."""
+        values = self.segment_sz if partner == 'SZ' else self.segment_gz
+        return pd.DataFrame(values, index=self.segments, columns=self.scenarios)
+
+
+class ProfitShareScenarioService:
+    """Evaluate many profit-share configurations against one set of batch profits."""
+
+    def __init__(self, batch_profits: List[BatchProfit]):
+        """Total each batch's sale profit per segment.
+
+        Args:
+            batch_profits: Calculated BatchProfit objects
+        """
+        self.batch_profits = batch_profits
+        num_codes = len(SEGMENTS) + 1  # column 0 = no segment
+
+        batch_idx, seg_idx, profits = [], [], []
+        for b, bp in enumerate(batch_profits):
+            for sd in bp.sale_details:
+                batch_idx.append(b)
+                seg_idx.append(sd.sale.segment_id + 1)
+                profits.append(sd.final_profit)
+        # Blank segments share the no-segment column (both use the default share)
+        column = np.arange(num_codes)
+        column[[code + 1 for code, seg in enumerate(SEGMENTS.values) if not seg]] = 0
+        seg_idx = column[np.asarray(seg_idx, dtype=np.int64)]
+
+        flat = np.asarray(batch_idx, dtype=np.int64) * num_codes + seg_idx
+        size = len(batch_profits) * num_codes
+        matrix = np.bincount(flat, weights=profits, minlength=size).reshape(len(batch_profits), num_codes)
+        used = np.bincount(seg_idx, minlength=num_codes) > 0
+
+        # Keep only segments that actually occur
+        self.segment_codes = np.flatnonzero(used) - 1
+        self.segments = [SEGMENTS.value(int(code)) for code in self.segment_codes]
+        self.profit_matrix = matrix[:, used]  # batches × segments
+        self.segment_profit = self.profit_matrix.sum(axis=0)
+
+    def share_matrix(self, scenarios: List[ShareScenario], partner: str = 'SZ') -> np.ndarray:
+        """Fraction of profit going to ``partner`` (segments × scenarios)."""
+        return np.array(
+            [[scenario.share(seg)[partner] / 100 for scenario in scenarios] for seg in self.segments],
+            dtype=np.float64,
+        ).reshape(len(self.segments), len(scenarios))
+
+    def evaluate(self, scenarios: List[ShareScenario]) -> ScenarioResult:
+        """Compute per-batch, per-segment and total SZ/GZ shares for every scenario.
+
+        Args:
+            scenarios: Candidate configurations
+
+        Returns:
+            ScenarioResult
+        """
+        sz = self.share_matrix(scenarios, 'SZ')
+        gz = self.share_matrix(scenarios, 'GZ')
+        segment_sz = self.segment_profit[:, None] * sz
+        segment_gz = self.segment_profit[:, None] * gz
+        return ScenarioResult(
+            scenarios=[s.name for s in scenarios],
+            segments=[seg if seg else 'Unknown' for seg in self.segments],
+            batch_sz=self.profit_matrix @ sz,
+            batch_gz=self.profit_matrix @ gz,
+            segment_sz=segment_sz,
+            segment_gz=segment_gz,
+            total_sz=segment_sz.sum(axis=0),
+            total_gz=segment_gz.sum(axis=0),
+        )
+
+    def sweep(self, segment: Optional[str], sz_values: List[float],
+              base: ShareScenario = None) -> ScenarioResult:
+        """Vary one segment's SZ share (GZ = 100 - SZ), keeping the others from ``base``.
+
+        Args:
+            segment: Segment to vary (None = the default share)
+            sz_values: SZ percentages to try
+            base: Configuration for the other segments (default: current config)
+
+        Returns:
+            ScenarioResult with one scenario per value
+        """
+        base = base or ShareScenario.current()
+        scenarios = []
+        for sz in sz_values:
+            shares = {seg: dict(s) for seg, s in base.shares.items()}
+            default = dict(base.default)
+            if segment is None:
+                default = {'SZ': sz, 'GZ': 100 - sz}
+            else:
+                shares[segment] = {'SZ': sz, 'GZ': 100 - sz}
+            scenarios.append(ShareScenario(f"{segment or 'Default'} SZ {sz:g}%", shares, default))
+        return self.evaluate(scenarios)
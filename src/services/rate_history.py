@@ -0,0 +1,148 @@
+"""Purchase-rate history per (item code, vendor).
+
+Purchases are sorted once by (item code, vendor, transaction date) into flat
+arrays, and each series is a contiguous slice of them. The rate in effect at
+any date is a ``searchsorted`` (bisect) within that slice. Rolling
+statistics over the last ``window`` purchases of each series are computed
+for all series at once: the median with a grouped ``rolling``, and the
+least-squares trend slope from windowed differences of running sums of
+x, y, x·y and x² (x = days since the series' first purchase).
+"""
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ..config import RATE_HISTORY_WINDOW
+from ..models.purchase import Purchase
+
+
+def _windowed(values: np.ndarray, starts: np.ndarray, window: int) -> np.ndarray:
+    """Sum of each element and the previous ``window - 1`` of its series.
+
+    Args:
+        values: Values in series order
+        starts: Index of the first element of each element's series
+        window: Window length
+    """
+    running = np.concatenate(([0.0], np.cumsum(values)))
+    idx = np.arange(len(values))
+    first = np.maximum(idx - window + 1, starts)
+    return running[idx + 1] - running[first]
+
+
+class RateHistoryIndex:
+    """Date-ordered ``in_rate`` series per (item code, vendor) with rolling statistics."""
+
+    def __init__(self, purchases: List[Purchase], categories: List[str] = None, window: int = RATE_HISTORY_WINDOW):
+        """Sort dated purchases into per-series slices and compute rolling statistics.
+
+        Args:
+            purchases: List of Purchase objects
+            categories: Categories to include (default: ['FG', 'TR'])
+            window: Purchases covered by the rolling median and trend slope
+        """
+        if categories is None:
+            categories = ['FG', 'TR']
+        self.window = window
+        rows = [p for p in purchases if p.category in categories and p.transaction_date]
+        item_codes = np.array([p.item_code for p in rows], dtype=object)
+        vendors = np.array([p.vendor_id for p in rows], dtype=np.int64)
+        ordinals = np.array([p.transaction_date.toordinal() for p in rows], dtype=np.int64)
+        _, item_ids = np.unique(item_codes, return_inverse=True) if rows else (None, np.empty(0, dtype=np.int64))
+        order = np.lexsort((ordinals, vendors, item_ids))  # stable: load order within a day
+
+        self.ordinals = ordinals[order]
+        self.rates = np.array([rows[i].in_rate for i in order], dtype=np.float64)
+        self.qty = np.array([rows[i].in_qty for i in order], dtype=np.float64)
+        self.item_codes = item_codes[order]
+        self.vendor_names = np.array([rows[i].vendor_name for i in order], dtype=object)
+
+        # Series boundaries: (item code, vendor) -> [lo, hi)
+        keys_item, keys_vendor = item_ids[order], vendors[order]
+        new_series = np.ones(len(order), dtype=bool)
+        new_series[1:] = (keys_item[1:] != keys_item[:-1]) | (keys_vendor[1:] != keys_vendor[:-1])
+        bounds = np.append(np.flatnonzero(new_series), len(order))
+        self._slices: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            self._slices[(self.item_codes[lo], self.vendor_names[lo])] = (int(lo), int(hi))
+        series_start = np.repeat(bounds[:-1], np.diff(bounds))
+
+        self.rolling_median = pd.Series(self.rates).groupby(series_start).rolling(window, min_periods=1).median().to_numpy()
+
+        # Least-squares slope of rate vs days over the window (₹ per day)
+        x = (self.ordinals - self.ordinals[series_start]).astype(np.float64) if len(order) else np.empty(0)
+        n = _windowed(np.ones(len(x)), series_start, window)
+        sx = _windowed(x, series_start, window)
+        sy = _windowed(self.rates, series_start, window)
+        sxy = _windowed(x * self.rates, series_start, window)
+        sxx = _windowed(x * x, series_start, window)
+        denominator = n * sxx - sx * sx
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.slope = np.where(denominator > 1e-9, (n * sxy - sx * sy) / denominator, np.nan)
+
+    def __len__(self) -> int:
+        return len(self._slices)
+
+    def keys(self) -> List[Tuple[str, str]]:
+        """(item code, vendor) of every series."""
+        return list(self._slices)
+
+    def vendors_of(self, item_code: str) -> List[str]:
+        """Vendors with a rate series for an item."""
+        return [vendor for item, vendor in self._slices if item == item_code]
+
+    def rate_at(self, item_code: str, vendor_name: str, when: date) -> Optional[float]:
+        """Rate of the vendor's last purchase of the item on or before ``when``.
+
+        Returns:
+            The rate, or None when the vendor had not supplied the item yet
+        """
+        bounds = self._slices.get((item_code, vendor_name))
+        if bounds is None:
+            return None
+        lo, hi = bounds
+        pos = lo + int(np.searchsorted(self.ordinals[lo:hi], when.toordinal(), side='right'))
+        return float(self.rates[pos - 1]) if pos > lo else None
+
+    def series(self, item_code: str, vendor_name: str = None) -> pd.DataFrame:
+        """Purchases of an item (optionally one vendor) with rolling statistics.
+
+        Returns:
+            DataFrame with vendor_name, transaction_date, in_qty, in_rate,
+            rolling_median and slope_per_30d, ordered by vendor and date
+        """
+        vendors = [vendor_name] if vendor_name is not None else self.vendors_of(item_code)
+        spans = [self._slices[(item_code, v)] for v in vendors if (item_code, v) in self._slices]
+        idx = np.concatenate([np.arange(lo, hi) for lo, hi in spans]) if spans else np.empty(0, dtype=np.int64)
+        return pd.DataFrame({
+            'vendor_name': self.vendor_names[idx],
+            'transaction_date': [date.fromordinal(int(o)) for o in self.ordinals[idx]],
+            'in_qty': self.qty[idx],
+            'in_rate': self.rates[idx],
+            'rolling_median': self.rolling_median[idx],
+            'slope_per_30d': self.slope[idx] * 30,
+        })
+
+    def summary(self, item_code: str = None) -> pd.DataFrame:
+        """Latest statistics per series (optionally for one item).
+
+        Returns:
+            DataFrame with item_code, vendor_name, purchases, first_date,
+            last_date, last_rate, rolling_median and slope_per_30d (trend
+            over the last ``window`` purchases)
+        """
+        spans = [(k, b) for k, b in self._slices.items() if item_code is None or k[0] == item_code]
+        lo = np.array([b[0] for _, b in spans], dtype=np.int64)
+        last = np.array([b[1] - 1 for _, b in spans], dtype=np.int64)
+        return pd.DataFrame({
+            'item_code': [k[0] for k, _ in spans],
+            'vendor_name': [k[1] for k, _ in spans],
+            'purchases': last - lo + 1,
+            'first_date': [date.fromordinal(int(o)) for o in self.ordinals[lo]],
+            'last_date': [date.fromordinal(int(o)) for o in self.ordinals[last]],
+            'last_rate': self.rates[last],
+            'rolling_median': self.rolling_median[last],
+            'slope_per_30d': self.slope[last] * 30,
+        })
@@ -0,0 +1,269 @@
+"""Headless report runner for batch/nightly report generation."""
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import date
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from ..models.expense import Expense
+from ..models.purchase import Purchase
+from ..models.sale import Sale
+from .analysis import AnalysisService
+from .charge_allocation import ChargeAllocationService
+from .expense_analysis import ExpenseAnalysisService
+from .profit_calculator import ProfitCalculatorService
+
+
+OUTPUT_FORMATS = ('csv', 'parquet', 'xlsx')
+
+
+@dataclass
+class ReportOptions:
+    """Filters applied to every report."""
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    categories: List[str] = field(default_factory=lambda: ['FG', 'TR'])
+    segments: Optional[List[str]] = None  # None = all segments
+    expense_categories: Optional[List[str]] = None  # None = all expense categories
+    costing: str = 'last'  # see cost_layers.COSTING_METHODS
+    charge_basis: str = 'value'  # see charge_allocation.ALLOCATION_BASES
+
+    def in_range(self, value) -> bool:
+        """Check whether a datetime falls inside the date range."""
+        if value is None:
+            return False
+        d = value.date()
+        if self.start_date and d < self.start_date:
+            return False
+        if self.end_date and d > self.end_date:
+            return False
+        return True
+
+    def segment_allowed(self, segment: Optional[str]) -> bool:
+        """Same rule as the Sales Profit page: unknown segments are kept."""
+        if self.segments is None:
+            return True
+        return segment is None or segment == 'Unknown' or segment in self.segments
+
+
+@dataclass
+class ReportResult:
+    """Output of a single report run."""
+    name: str
+    data: pd.DataFrame
+    seconds: float
+    files: List[str] = field(default_factory=list)
+
+
+def _filter_inputs(purchases: List[Purchase], sales: List[Sale], options: ReportOptions):
+    """Apply the date range the same way the Sales Profit page does."""
+    if options.start_date is None and options.end_date is None:
+        return purchases, sales
+    filtered_purchases = [p for p in purchases if options.in_range(p.purchase_date)]
+    filtered_sales = [s for s in sales if options.in_range(s.transaction_date)]
+    return filtered_purchases, filtered_sales
+
+
+def batch_profits_report(purchases, sales, expenses, options: ReportOptions) -> pd.DataFrame:
+    """Batch-wise profit table (as exported from the Sales Profit page)."""
+    allocation = ChargeAllocationService(purchases, basis=options.charge_basis,
+                                         include_categories=options.categories)
+    purchases, sales = _filter_inputs(purchases, sales, options)
+    calculator = ProfitCalculatorService(purchases, sales, costing=options.costing)
+    batch_profits = calculator.calculate_batch_profits(include_categories=options.categories)
+    batch_profits = [bp for bp in batch_profits if options.segment_allowed(bp.segment)]
+    allocation.apply(batch_profits)
+    return pd.DataFrame([bp.to_dict() for bp in batch_profits])
+
+
+def batch_key_matches_report(purchases, sales, expenses, options: ReportOptions) -> pd.DataFrame:
+    """Batches whose purchase and sales keys only matched after normalization."""
+    purchases, sales = _filter_inputs(purchases, sales, options)
+    return pd.DataFrame(ProfitCalculatorService(purchases, sales).get_normalized_matches())
+
+
+def orphan_sales_report(purchases, sales, expenses, options: ReportOptions) -> pd.DataFrame:
+    """FG/TR sales without a matching purchase record."""
+    purchases, sales = _filter_inputs(purchases, sales, options)
+    analyzer = AnalysisService(purchases, sales)
+    fg_tr_orphans, _ = analyzer.get_orphan_sales()
+    fg_tr_orphans = [
+        s for s in fg_tr_orphans
+        if s.category in options.categories and options.segment_allowed(s.segment)
+    ]
+    return analyzer.create_orphan_sales_report(fg_tr_orphans)
+
+
+def charges_report(purchases, sales, expenses, options: ReportOptions) -> pd.DataFrame:
+    """SV/CO/CG charges paid (purchases) and recovered (sales) by category."""
+    purchases, sales = _filter_inputs(purchases, sales, options)
+    report = AnalysisService(purchases, sales).create_charges_report()
+    rows = []
+    for side in ('purchases', 'sales'):
+        for cat, data in report[side].items():
+            rows.append({
+                'side': side,
+                'category': cat,
+                'count': data['count'],
+                'total_qty': data['total_qty'],
+                'total_value': round(data['total_value'], 2),
+            })
+    return pd.DataFrame(rows)
+
+
+def vendor_analysis_report(purchases, sales, expenses, options: ReportOptions) -> pd.DataFrame:
+    """Vendor scores across multi-vendor products."""
+    purchases, sales = _filter_inputs(purchases, sales, options)
+    vendor_analysis = AnalysisService(purchases, sales).get_vendor_rate_analysis(options.categories)
+    return pd.DataFrame([
+        {k: v for k, v in vendor.items() if k != 'products'}
+        for vendor in vendor_analysis['vendors']
+    ])
+
+
+def product_rates_report(purchases, sales, expenses, options: ReportOptions) -> pd.DataFrame:
+    """Product-wise purchase rate spread and potential savings."""
+    purchases, sales = _filter_inputs(purchases, sales, options)
+    product_analysis = AnalysisService(purchases, sales).get_product_wise_purchase_analysis(options.categories)
+    skip = {'product_id', 'purchases', 'vendor_stats', 'vendor_avg_rates', 'vendor_weighted_rates'}
+    return pd.DataFrame([
+        {k: v for k, v in product.items() if k not in skip}
+        for product in product_analysis['products']
+    ])
+
+
+def _filter_expenses(expenses: List[Expense], options: ReportOptions) -> List[Expense]:
+    """Apply date range and expense category filters."""
+    result = expenses
+    if options.start_date is not None or options.end_date is not None:
+        result = [e for e in result if options.in_range(e.date)]
+    if options.expense_categories:
+        result = [e for e in result if e.category in options.expense_categories]
+    return result
+
+
+def expense_summary_report(purchases, sales, expenses, options: ReportOptions) -> pd.DataFrame:
+    """Expense totals by category."""
+    summary = ExpenseAnalysisService(_filter_expenses(expenses, options)).get_category_summary()
+    return pd.DataFrame([{'category': cat, **data} for cat, data in summary.items()])
+
+
+def expense_monthly_report(purchases, sales, expenses, options: ReportOptions) -> pd.DataFrame:
+    """Expense totals by month."""
+    return pd.DataFrame(ExpenseAnalysisService(_filter_expenses(expenses, options)).get_monthly_summary())
+
+
+# Report name -> builder(purchases, sales, expenses, options) -> DataFrame
+REPORTS: Dict[str, Callable] = {
+    'batch_profits': batch_profits_report,
+    'orphan_sales': orphan_sales_report,
+    'batch_key_matches': batch_key_matches_report,
+    'charges': charges_report,
+    'vendor_analysis': vendor_analysis_report,
+    'product_rates': product_rates_report,
+    'expense_summary': expense_summary_report,
+    'expense_monthly': expense_monthly_report,
+}
+
+# Reports that need the expenses workbook
+EXPENSE_REPORTS = {'expense_summary', 'expense_monthly'}
+
+# Data shipped once to each worker process by the pool initializer
+_WORKER_DATA = {}
+
+
+def _init_worker(purchases, sales, expenses, options):
+    """Process pool initializer: keep the shared inputs in the worker."""
+    _WORKER_DATA.update(purchases=purchases, sales=sales, expenses=expenses, options=options)
+
+
+def _run_in_worker(name: str):
+    """Build one report inside a worker process."""
+    start = time.perf_counter()
+    data = REPORTS[name](
+        _WORKER_DATA['purchases'],
+        _WORKER_DATA['sales'],
+        _WORKER_DATA['expenses'],
+        _WORKER_DATA['options'],
+    )
+    return name, data, time.perf_counter() - start
+
+
+class ReportRunnerService:
+    """Run several reports over data loaded once."""
+
+    def __init__(self, purchases: List[Purchase], sales: List[Sale], expenses: List[Expense] = None):
+        """Initialize with already loaded purchases, sales and expenses."""
+        self.purchases = purchases
+        self.sales = sales
+        self.expenses = expenses or []
+
+    def run(self, report_names: List[str], options: ReportOptions = None, workers: int = 1) -> Dict[str, ReportResult]:
+        """Run the selected reports, concurrently when ``workers > 1``.
+
+        Args:
+            report_names: Names from REPORTS
+            options: Filters applied to every report
+            workers: Number of worker processes (1 = run in this process)
+
+        Returns:
+            Dictionary of report name to ReportResult (in requested order)
+        """
+        if options is None:
+            options = ReportOptions()
+
+        unknown = [n for n in report_names if n not in REPORTS]
+        if unknown:
+            raise ValueError(f"Unknown report(s): {', '.join(unknown)}")
+
+        results = {}
+        if workers <= 1 or len(report_names) <= 1:
+            for name in report_names:
+                start = time.perf_counter()
+                data = REPORTS[name](self.purchases, self.sales, self.expenses, options)
+                results[name] = ReportResult(name=name, data=data, seconds=time.perf_counter() - start)
+        else:
+            with ProcessPoolExecutor(
+                max_workers=min(workers, len(report_names)),
+                initializer=_init_worker,
+                initargs=(self.purchases, self.sales, self.expenses, options),
+            ) as pool:
+                futures = [pool.submit(_run_in_worker, name) for name in report_names]
+                for future in as_completed(futures):
+                    name, data, seconds = future.result()
+                    results[name] = ReportResult(name=name, data=data, seconds=seconds)
+
+        return {name: results[name] for name in report_names}
+
+    @staticmethod
+    def write_outputs(results: Dict[str, ReportResult], output_dir: str, formats: List[str]) -> Dict[str, ReportResult]:
+        """Write every report in each requested format.
+
+        Args:
+            results: Output of run()
+            output_dir: Directory to write into (created if missing)
+            formats: Any of 'csv', 'parquet', 'xlsx'
+
+        Returns:
+            The same results with ``files`` filled in
+        """
+        out = Path(output_dir)
+        out.mkdir(parents=True, exist_ok=True)
+
+        for result in results.values():
+            for fmt in formats:
+                path = out / f"{result.name}.{fmt}"
+                if fmt == 'csv':
+                    result.data.to_csv(path, index=False)
+                elif fmt == 'parquet':
+                    result.data.to_parquet(path, index=False)
+                elif fmt == 'xlsx':
+                    result.data.to_excel(path, index=False)
+                else:
+                    raise ValueError(f"Unsupported output format: {fmt}")
+                result.files.append(str(path))
+
+        return results
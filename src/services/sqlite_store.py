@@ -0,0 +1,493 @@
+"""Embedded SQLite store for purchases, sales and expenses.
+
+An optional storage backend: the three sheets are loaded once into a database
+file with indexes on the join and filter columns, so services can push date,
+category and segment predicates (and simple aggregations) down to SQL instead
+of scanning every in-memory row.
+"""
+import sqlite3
+from contextlib import closing
+from dataclasses import fields
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from ..models.expense import Expense
+from ..models.purchase import Purchase
+from ..models.sale import Sale
+from ..utils.batch_keys import batch_key
+from ..utils.perf import timed
+
+
+def _init_fields(model) -> List[str]:
+    """Constructor fields of a model dataclass."""
+    return [f.name for f in fields(model) if f.init]
+
+
+PURCHASE_COLUMNS = _init_fields(Purchase)
+SALE_COLUMNS = _init_fields(Sale)
+EXPENSE_COLUMNS = _init_fields(Expense)
+
+# Bump when the table layout or stored value format changes so existing files are rebuilt
+SCHEMA_VERSION = 4
+
+# Derived columns stored next to the model fields: name -> getter
+EXTRA_COLUMNS = {
+    'purchases': {
+        'category': lambda p: p.category,
+        'batch_key': lambda p: batch_key(p.batch_id),
+    },
+    'sales': {
+        'category': lambda s: s.category,
+        'batch_key': lambda s: batch_key(s.batch_id),
+    },
+    'expenses': {},
+}
+
+# Columns holding datetimes (stored as ISO text so range predicates can use indexes)
+DATE_COLUMNS = {
+    'purchases': {'transaction_date', 'purchase_date', 'expiry_date'},
+    'sales': {'transaction_date', 'expiry_date'},
+    'expenses': {'date'},
+}
+
+INDEXES = [
+    ('purchases', 'batch_key'),
+    ('purchases', 'transaction_date'),
+    ('purchases', 'purchase_date'),
+    ('purchases', 'item_code'),
+    ('purchases', 'vendor_name'),
+    ('purchases', 'category'),
+    ('sales', 'batch_key'),
+    ('sales', 'transaction_date'),
+    ('sales', 'item_code'),
+    ('sales', 'segment'),
+    ('sales', 'category'),
+    ('expenses', 'date'),
+    ('expenses', 'category'),
+]
+
+_ISO_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _to_db(value):
+    """Convert a model attribute to a SQLite value."""
+    if isinstance(value, datetime):
+        return value.strftime(_ISO_FORMAT)
+    if isinstance(value, date):
+        return value.strftime(_ISO_FORMAT)
+    return value
+
+
+def _from_db(value):
+    """Convert a stored date column back to datetime (non-ISO text is kept)."""
+    if isinstance(value, str):
+        try:
+            return datetime.strptime(value, _ISO_FORMAT)
+        except ValueError:
+            return value
+    return value
+
+
+def _date_bounds(start_date: Optional[date], end_date: Optional[date]) -> Tuple[Optional[str], Optional[str]]:
+    """Inclusive date range as [start, end + 1 day) ISO strings."""
+    start = start_date.strftime(_ISO_FORMAT) if start_date else None
+    end = (end_date + timedelta(days=1)).strftime(_ISO_FORMAT) if end_date else None
+    return start, end
+
+
+def _range_clause(column: str, start: Optional[str], end: Optional[str], params: list) -> str:
+    """SQL predicate for an indexed date range.
+
+    Without bounds every row matches, undated ones included (as the
+    in-memory path, which only filters when a range is given); with a
+    bound, rows with no date never match.
+    """
+    if not start and not end:
+        return "1 = 1"
+    clauses = [f"{column} IS NOT NULL"]
+    if start:
+        clauses.append(f"{column} >= ?")
+        params.append(start)
+    if end:
+        clauses.append(f"{column} < ?")
+        params.append(end)
+    return " AND ".join(clauses)
+
+
+def _in_clause(column: str, values: List, params: list) -> str:
+    """SQL ``IN`` predicate."""
+    params.extend(values)
+    return f"{column} IN ({', '.join('?' * len(values))})"
+
+
+class SQLiteStore:
+    """Purchases, sales and expenses in an indexed SQLite database file."""
+
+    def __init__(self, db_path: str):
+        """Open an existing store."""
+        self.db_path = Path(db_path)
+        if not self.db_path.exists():
+            raise FileNotFoundError(f"Store not found: {db_path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection (one per call, so sessions on other threads are safe)."""
+        return sqlite3.connect(self.db_path)
+
+    @classmethod
+    @timed('SQLiteStore.build')
+    def build(cls, db_path: str, purchases: List[Purchase], sales: List[Sale],
+              expenses: List[Expense] = None) -> 'SQLiteStore':
+        """Create (or replace) the store from domain objects.
+
+        Args:
+            db_path: Database file to write
+            purchases: List of Purchase objects
+            sales: List of Sale objects
+            expenses: Optional list of Expense objects
+
+        Returns:
+            SQLiteStore opened on the new file
+        """
+        path = Path(db_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + '.tmp')
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+        conn = sqlite3.connect(tmp_path)
+        try:
+            for table, columns, rows in (
+                ('purchases', PURCHASE_COLUMNS, purchases),
+                ('sales', SALE_COLUMNS, sales),
+                ('expenses', EXPENSE_COLUMNS, expenses or []),
+            ):
+                extras = EXTRA_COLUMNS[table]
+                all_columns = columns + list(extras)
+                column_defs = ', '.join(f'"{c}"' for c in all_columns)
+                conn.execute(f"CREATE TABLE {table} ({column_defs})")
+                conn.executemany(
+                    f"INSERT INTO {table} VALUES ({', '.join('?' * len(all_columns))})",
+                    (
+                        tuple(_to_db(getattr(obj, c)) for c in columns) + tuple(get(obj) for get in extras.values())
+                        for obj in rows
+                    ),
+                )
+            for table, column in INDEXES:
+                conn.execute(f"CREATE INDEX idx_{table}_{column} ON {table} ({column})")
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.execute("ANALYZE")
+            conn.commit()
+        finally:
+            conn.close()
+
+        tmp_path.replace(path)
+        return cls(str(path))
+
+    def schema_version(self) -> int:
+        """Layout version the file was built with."""
+        with closing(self._connect()) as conn:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+    
+    @classmethod
+    def open_or_build(cls, db_path: str, source_paths: List[str], loader) -> 'SQLiteStore':
+        """Open the store, rebuilding it when any source workbook is newer
+        or the file was built with an older layout.
+
+        Args:
+            db_path: Database file
+            source_paths: Workbooks the store was built from
+            loader: Callable returning (purchases, sales, expenses) for a rebuild
+        """
+        path = Path(db_path)
+        sources = [Path(p) for p in source_paths if Path(p).exists()]
+        if path.exists() and all(path.stat().st_mtime >= s.stat().st_mtime for s in sources):
+            store = cls(str(path))
+            if store.schema_version() == SCHEMA_VERSION:
+                return store
+        purchases, sales, expenses = loader()
+        return cls.build(str(path), purchases, sales, expenses)
+
+    def query(self, sql: str, params: list = None) -> pd.DataFrame:
+        """Run a read-only SQL query and return a DataFrame."""
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(sql, conn, params=params or [])
+
+    def _load(self, model, table: str, columns: List[str], sql: str, params: list) -> list:
+        """Materialize model objects from a SELECT over ``columns``."""
+        date_columns = DATE_COLUMNS[table]
+        date_idx = [i for i, c in enumerate(columns) if c in date_columns]
+        with closing(self._connect()) as conn:
+            rows = conn.execute(sql, params).fetchall()
+        result = []
+        for row in rows:
+            if date_idx:
+                row = list(row)
+                for i in date_idx:
+                    row[i] = _from_db(row[i])
+            result.append(model(**dict(zip(columns, row))))
+        return result
+
+    # ------------------------------------------------------------------
+    # Profit calculation queries
+    # ------------------------------------------------------------------
+
+    def _batch_scope_sql(self, start_date, end_date, categories: List[str]) -> Tuple[str, list]:
+        """CTEs reproducing ProfitCalculatorService's batch selection in SQL.
+
+        Batches are joined on the normalized ``batch_key`` column.
+        ``last_p`` is the last purchase per batch (by load order) among
+        purchases in the date range, skipping SV/CO/CG charge rows unless the
+        batch has nothing else (as ``BatchKeyIndex``); ``s`` is the sales in the date range and
+        ``batch_cat`` is each batch's category, taken from ``last_p`` or,
+        for batches without a purchase, from the first sale.
+        """
+        start, end = _date_bounds(start_date, end_date)
+        params = []
+        p_range = _range_clause('purchase_date', start, end, params)
+        s_range = _range_clause('transaction_date', start, end, params)
+        cat_params = []
+        cat_clause = _in_clause('category', categories, cat_params)
+        sql = f"""
+            WITH p AS (
+                SELECT rowid AS rid, batch_key, category IN ('SV', 'CO', 'CG') AS is_charge FROM purchases
+                WHERE batch_key IS NOT NULL AND {p_range}
+            ),
+            last_p AS (
+                SELECT rowid AS rid, * FROM purchases
+                WHERE rowid IN (
+                    SELECT COALESCE(MAX(CASE WHEN NOT is_charge THEN rid END), MAX(rid))
+                    FROM p GROUP BY batch_key
+                )
+            ),
+            s AS (
+                SELECT rowid AS rid, * FROM sales
+                WHERE batch_key IS NOT NULL AND {s_range}
+            ),
+            first_s AS (
+                SELECT batch_key, category FROM s
+                WHERE rid IN (SELECT MIN(rid) FROM s GROUP BY batch_key)
+            ),
+            batch_cat AS (
+                SELECT batch_key AS batch, category FROM last_p
+                UNION ALL
+                SELECT batch_key, category FROM first_s
+                WHERE batch_key NOT IN (SELECT batch_key FROM last_p)
+            ),
+            scope AS (
+                SELECT batch FROM batch_cat WHERE {cat_clause}
+            )
+        """
+        return sql, params + cat_params
+
+    @timed('SQLiteStore.load_profit_inputs', rows=lambda r: len(r[0]) + len(r[1]))
+    def load_profit_inputs(self, start_date: date = None, end_date: date = None,
+                           categories: List[str] = None,
+                           all_purchases: bool = False) -> Tuple[List[Purchase], List[Sale]]:
+        """Load only the purchases and sales that affect the batch profit calculation.
+
+        Same date semantics as the Sales Profit page (purchases by purchase
+        date, sales by transaction date). Returns the last purchase per batch
+        (or, with ``all_purchases``, every in-range purchase, for cost layers)
+        and the sales of batches whose category is in ``categories``.
+        """
+        if categories is None:
+            categories = ['FG', 'TR']
+        scope_sql, params = self._batch_scope_sql(start_date, end_date, categories)
+
+        purchase_cols = ', '.join(PURCHASE_COLUMNS)
+        if all_purchases:
+            purchase_sql = (
+                f"SELECT {purchase_cols} FROM purchases WHERE rowid IN (SELECT rid FROM p) "
+                f"AND batch_key IN (SELECT batch FROM scope) ORDER BY rowid"
+            )
+        else:
+            purchase_sql = f"SELECT {purchase_cols} FROM last_p WHERE batch_key IN (SELECT batch FROM scope) ORDER BY rid"
+        purchases = self._load(Purchase, 'purchases', PURCHASE_COLUMNS, scope_sql + purchase_sql, params)
+        sale_cols = ', '.join(SALE_COLUMNS)
+        sales = self._load(
+            Sale, 'sales', SALE_COLUMNS,
+            scope_sql + f"SELECT {sale_cols} FROM s WHERE batch_key IN (SELECT batch FROM scope) ORDER BY rid",
+            params,
+        )
+        return purchases, sales
+
+    def count_in_range(self, start_date: date = None, end_date: date = None) -> Tuple[int, int]:
+        """Number of purchases (by purchase date) and sales (by sale date) in range."""
+        start, end = _date_bounds(start_date, end_date)
+        counts = []
+        for table, column in (('purchases', 'purchase_date'), ('sales', 'transaction_date')):
+            params = []
+            clause = _range_clause(column, start, end, params)
+            with closing(self._connect()) as conn:
+                counts.append(conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {clause}", params).fetchone()[0])
+        return counts[0], counts[1]
+
+    @timed('SQLiteStore.batch_totals')
+    def batch_totals(self, start_date: date = None, end_date: date = None,
+                     categories: List[str] = None) -> pd.DataFrame:
+        """Per-batch profit components aggregated in SQL.
+
+        Mirrors BatchProfit.calculate: revenue = sale_qty × out_rate,
+        COGS = purchase rate × out_qty, discount = |discount value| and the
+        dominant segment is the most frequent one (first seen wins ties).
+        """
+        if categories is None:
+            categories = ['FG', 'TR']
+        scope_sql, params = self._batch_scope_sql(start_date, end_date, categories)
+        sql = scope_sql + """,
+            seg AS (
+                SELECT batch_key, COALESCE(segment, 'Unknown') AS segment,
+                       COUNT(*) AS n, MIN(rid) AS first_rid
+                FROM s WHERE batch_key IN (SELECT batch FROM scope)
+                GROUP BY batch_key, COALESCE(segment, 'Unknown')
+            ),
+            dominant AS (
+                SELECT batch_key, segment FROM (
+                    SELECT batch_key, segment,
+                           ROW_NUMBER() OVER (PARTITION BY batch_key ORDER BY n DESC, first_rid) AS rn
+                    FROM seg
+                ) WHERE rn = 1
+            ),
+            sale_totals AS (
+                SELECT batch_key,
+                       SUM(sale_qty * out_rate) AS revenue,
+                       SUM(out_qty) AS out_qty,
+                       SUM(ABS(discount_value)) AS discount
+                FROM s WHERE batch_key IN (SELECT batch FROM scope)
+                GROUP BY batch_key
+            )
+            SELECT b.batch AS batch_ref_no,
+                   b.category,
+                   d.segment,
+                   COALESCE(p.in_qty * p.in_rate, 0) AS purchase_cost,
+                   COALESCE(t.revenue, 0) AS revenue,
+                   COALESCE(p.in_rate, 0) * COALESCE(t.out_qty, 0) AS cogs,
+                   COALESCE(t.discount, 0) AS discount
+            FROM batch_cat b
+            JOIN scope ON scope.batch = b.batch
+            LEFT JOIN last_p p ON p.batch_key = b.batch
+            LEFT JOIN sale_totals t ON t.batch_key = b.batch
+            LEFT JOIN dominant d ON d.batch_key = b.batch
+        """
+        df = self.query(sql, params)
+        df['profit'] = df['revenue'] - df['cogs'] - df['discount']
+        return df
+
+    # ------------------------------------------------------------------
+    # Analysis queries
+    # ------------------------------------------------------------------
+
+    @timed('SQLiteStore.load_purchases')
+    def load_purchases(self, where: str = "1 = 1", params: list = None) -> List[Purchase]:
+        """Load purchases matching a SQL predicate (in load order)."""
+        cols = ', '.join(PURCHASE_COLUMNS)
+        return self._load(
+            Purchase, 'purchases', PURCHASE_COLUMNS,
+            f"SELECT {cols} FROM purchases WHERE {where} ORDER BY rowid", params or [],
+        )
+
+    @timed('SQLiteStore.load_sales')
+    def load_sales(self, where: str = "1 = 1", params: list = None) -> List[Sale]:
+        """Load sales matching a SQL predicate (in load order)."""
+        cols = ', '.join(SALE_COLUMNS)
+        return self._load(
+            Sale, 'sales', SALE_COLUMNS,
+            f"SELECT {cols} FROM sales WHERE {where} ORDER BY rowid", params or [],
+        )
+
+    def orphan_sales(self) -> List[Sale]:
+        """Sales whose batch has no purchase record (anti-join on the batch indexes)."""
+        return self.load_sales(
+            "batch_key IS NOT NULL AND NOT EXISTS "
+            "(SELECT 1 FROM purchases p WHERE p.batch_key = sales.batch_key)"
+        )
+
+    def category_totals(self, table: str, categories: List[str], qty_column: str) -> Dict:
+        """Count, quantity and gross value per category for one table."""
+        params = []
+        clause = _in_clause('category', categories, params)
+        df = self.query(
+            f"SELECT category, COUNT(*) AS count, SUM({qty_column}) AS total_qty, "
+            f"SUM(gross_value) AS total_value FROM {table} WHERE {clause} GROUP BY category",
+            params,
+        )
+        return {
+            row['category']: {
+                'count': int(row['count']),
+                'total_qty': int(row['total_qty']),
+                'total_value': float(row['total_value']),
+            }
+            for _, row in df.iterrows()
+        }
+
+    # ------------------------------------------------------------------
+    # Expense queries
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def expense_where(start_date: date = None, end_date: date = None, groups: List[str] = None,
+                      categories: List[str] = None, search: str = None) -> Tuple[str, list]:
+        """SQL predicate matching the Expense Analysis page filters."""
+        params = []
+        clauses = []
+        if start_date or end_date:
+            start, end = _date_bounds(start_date, end_date)
+            clauses.append(_range_clause('date', start, end, params))
+        if groups:
+            clauses.append(_in_clause('"group"', groups, params))
+        if categories:
+            clauses.append(_in_clause('category', categories, params))
+        if search:
+            clauses.append("INSTR(LOWER(particulars), ?) > 0")
+            params.append(search.lower())
+        return (" AND ".join(clauses) or "1 = 1"), params
+
+    @timed('SQLiteStore.load_expenses')
+    def load_expenses(self, where: str = "1 = 1", params: list = None) -> List[Expense]:
+        """Load expenses matching a SQL predicate (in load order)."""
+        cols = ', '.join(f'"{c}"' for c in EXPENSE_COLUMNS)
+        return self._load(
+            Expense, 'expenses', EXPENSE_COLUMNS,
+            f"SELECT {cols} FROM expenses WHERE {where} ORDER BY rowid", params or [],
+        )
+
+    def expense_totals(self, group_by: str, where: str = "1 = 1", params: list = None) -> pd.DataFrame:
+        """Count, debit, credit and net expense grouped by an SQL expression."""
+        return self.query(
+            f"SELECT {group_by} AS key, COUNT(*) AS count, "
+            f"SUM(COALESCE(debit, 0)) AS total_debit, SUM(COALESCE(credit, 0)) AS total_credit, "
+            f"SUM(COALESCE(debit, 0) - COALESCE(credit, 0)) AS net_expense "
+            f"FROM expenses WHERE {where} GROUP BY {group_by}",
+            params or [],
+        )
+
+
+def open_default_store(db_path: str = None, stock_file: str = None, expense_file: str = None) -> SQLiteStore:
+    """Open the configured store, (re)building it from the workbooks if stale.
+
+    Args:
+        db_path: Database file (default: config.SQLITE_DB_PATH)
+        stock_file: Purchases/Sales workbook (default: config.STOCK_FILE)
+        expense_file: Expenses workbook (default: config.EXPENSE_FILE)
+    """
+    from .. import config
+    from .data_transformer import DataTransformerService
+    from .excel_reader import ExcelReaderService
+    from .expense_reader import ExpenseReaderService
+
+    db_path = db_path or config.SQLITE_DB_PATH
+    stock_file = stock_file or config.STOCK_FILE
+    expense_file = expense_file or config.EXPENSE_FILE
+
+    def loader():
+        purchases_df, sales_df = ExcelReaderService(stock_file).load_data()
+        transformer = DataTransformerService()
+        purchases = transformer.transform_purchases(purchases_df)
+        sales = transformer.transform_sales(sales_df)
+        expenses = ExpenseReaderService(expense_file).transform_expenses() if Path(expense_file).exists() else []
+        return purchases, sales, expenses
+
+    return SQLiteStore.open_or_build(db_path, [stock_file, expense_file], loader)
@@ -0,0 +1,167 @@
+"""GST reconciliation of input tax (purchases) against output tax (sales).
+
+Both sides are flattened once into columnar frames keyed by HSN code, month
+and location, and totalled with one ``groupby`` each; the reconciliation is
+an outer join of the two totals. Sale lines are also checked against their
+own rates: each IGST/CGST/SGST amount should equal taxable value × rate, a
+line should not charge IGST together with CGST/SGST, and CGST and SGST
+rates should be equal.
+"""
+from datetime import date
+from io import BytesIO
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from ..config import GST_AMOUNT_TOLERANCE
+from ..models.purchase import Purchase
+from ..models.sale import Sale
+
+
+KEYS = ('hsn_code', 'month', 'location_code')
+
+COMPONENTS = ('igst', 'cgst', 'sgst')
+
+
+def _months(dates: Sequence, cache: Dict) -> List[str]:
+    """``YYYY-MM`` of each date ('Undated' when missing), formatting each distinct date once."""
+    out = []
+    for d in dates:
+        m = cache.get(d)
+        if m is None:
+            m = cache[d] = f"{d.year:04d}-{d.month:02d}" if d else 'Undated'
+        out.append(m)
+    return out
+
+
+def _in_range(d, start_date: date, end_date: date) -> bool:
+    """Whether a transaction date falls in the (optional) inclusive range."""
+    if start_date is None and end_date is None:
+        return True
+    if d is None:
+        return False
+    d = d.date()
+    return (start_date is None or d >= start_date) and (end_date is None or d <= end_date)
+
+
+class TaxReconciliationService:
+    """Input vs output GST by HSN code, month and location."""
+
+    def __init__(self, purchases: Optional[List[Purchase]], sales: List[Sale], start_date: date = None,
+                 end_date: date = None, tolerance: float = GST_AMOUNT_TOLERANCE):
+        """Flatten the tax columns of purchases and sales in the date range.
+
+        Args:
+            purchases: List of Purchase objects, or None to reconcile output
+                       tax only (purchases carry no segment, so input tax
+                       cannot be scoped to a subset of sales)
+            sales: List of Sale objects
+            start_date: First transaction date to include (default: no limit)
+            end_date: Last transaction date to include (default: no limit)
+            tolerance: Allowed difference (₹) between a sale's tax amount and
+                       taxable value × rate
+        """
+        self.tolerance = tolerance
+        self.has_inputs = purchases is not None
+        purchases = [p for p in purchases or [] if _in_range(p.transaction_date, start_date, end_date)]
+        sales = [s for s in sales if _in_range(s.transaction_date, start_date, end_date)]
+
+        months: Dict[object, str] = {}
+        self.inputs = pd.DataFrame({
+            'hsn_code': np.array([p.hsn_code for p in purchases], dtype=np.int64),
+            'month': _months([p.transaction_date for p in purchases], months),
+            'location_code': [p.location_code for p in purchases],
+            'taxable': np.array([p.taxable_value for p in purchases], dtype=np.float64),
+            'igst': np.array([p.igst for p in purchases], dtype=np.float64),
+            'cgst': np.array([p.cgst for p in purchases], dtype=np.float64),
+            'sgst': np.array([p.sgst for p in purchases], dtype=np.float64),
+        })
+
+        basic = np.array([s.basic_value for s in sales], dtype=np.float64)
+        discount = np.abs(np.array([s.discount_value for s in sales], dtype=np.float64))
+        self.outputs = pd.DataFrame({
+            'hsn_code': np.array([s.hsn_code for s in sales], dtype=np.int64),
+            'month': _months([s.transaction_date for s in sales], months),
+            'location_code': [s.location_code for s in sales],
+            'bill_no': [s.bill_no for s in sales],
+            'item_code': [s.item_code for s in sales],
+            'item_name': [s.item_name for s in sales],
+            'customer_name': [s.customer_name for s in sales],
+            'taxable': basic - discount,
+            'igst_rate': np.array([s.igst_rate for s in sales], dtype=np.float64),
+            'cgst_rate': np.array([s.cgst_rate for s in sales], dtype=np.float64),
+            'sgst_rate': np.array([s.sgst_rate for s in sales], dtype=np.float64),
+            'igst': np.array([s.igst_amount for s in sales], dtype=np.float64),
+            'cgst': np.array([s.cgst_amount for s in sales], dtype=np.float64),
+            'sgst': np.array([s.sgst_amount for s in sales], dtype=np.float64),
+        })
+        self._check_rates()
+
+    def _check_rates(self):
+        """Add expected amounts and an ``issues`` column to the sale lines."""
+        out = self.outputs
+        issues = np.full(len(out), '', dtype=object)
+        for c in COMPONENTS:
+            out[f'expected_{c}'] = out['taxable'] * out[f'{c}_rate'] / 100
+            off = np.abs(out[c] - out[f'expected_{c}']) > self.tolerance
+            issues[off.to_numpy()] += f"{c.upper()} amount ≠ rate; "
+        mixed = (out['igst_rate'] > 0) & ((out['cgst_rate'] > 0) | (out['sgst_rate'] > 0))
+        issues[mixed.to_numpy()] += "IGST with CGST/SGST; "
+        unequal = out['cgst_rate'] != out['sgst_rate']
+        issues[unequal.to_numpy()] += "CGST ≠ SGST rate; "
+        out['issues'] = pd.Series(issues, index=out.index).str.rstrip('; ')
+
+    def mismatches(self) -> pd.DataFrame:
+        """Sale lines whose tax amounts or rates are inconsistent."""
+        columns = ['month', 'location_code', 'hsn_code', 'bill_no', 'item_code', 'item_name', 'customer_name',
+                   'taxable', 'igst_rate', 'cgst_rate', 'sgst_rate', 'igst', 'expected_igst',
+                   'cgst', 'expected_cgst', 'sgst', 'expected_sgst', 'issues']
+        return self.outputs.loc[self.outputs['issues'] != '', columns].reset_index(drop=True)
+
+    def reconcile(self, by: Sequence[str] = KEYS) -> pd.DataFrame:
+        """Input and output tax side by side.
+
+        Args:
+            by: Grouping keys (subset of KEYS)
+
+        Returns:
+            DataFrame with the keys, input_/output_ taxable value and
+            IGST/CGST/SGST/total tax, net_payable (output - input tax) and
+            mismatched_lines (sale lines flagged by ``mismatches``). Without
+            input tax, only the output_ columns and mismatched_lines.
+        """
+        by = list(by)
+        for key in set(by) - set(KEYS):
+            raise ValueError(f"Unknown key: {key}")
+        values = ['taxable'] + list(COMPONENTS)
+
+        def totals(frame: pd.DataFrame, side: str) -> pd.DataFrame:
+            grouped = frame.groupby(by, sort=False)[values].sum() if by else frame[values].sum().to_frame().T
+            grouped[f'{side}_total_tax'] = grouped[list(COMPONENTS)].sum(axis=1)
+            return grouped.rename(columns={v: f'{side}_{v}' for v in values})
+
+        inputs = totals(self.inputs, 'input')
+        outputs = totals(self.outputs, 'output')
+        flagged = self.outputs['issues'] != ''
+        if by:
+            mismatched = flagged.groupby([self.outputs[k] for k in by], sort=False).sum().rename('mismatched_lines')
+            result = inputs.join(outputs, how='outer').join(mismatched, how='left').fillna(0)
+            result = result.reset_index().sort_values(by, ignore_index=True)
+        else:
+            result = pd.concat([inputs, outputs], axis=1)
+            result['mismatched_lines'] = int(flagged.sum())
+        result['mismatched_lines'] = result['mismatched_lines'].astype(np.int64)
+        result['net_payable'] = result['output_total_tax'] - result['input_total_tax']
+        if not self.has_inputs:
+            result = result.drop(columns=[c for c in result.columns if c.startswith('input_')] + ['net_payable'])
+        return result
+
+    def to_excel(self) -> bytes:
+        """Workbook for the monthly filing: monthly summary, full reconciliation and mismatched lines."""
+        buffer = BytesIO()
+        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+            self.reconcile(['month']).to_excel(writer, sheet_name='Monthly Summary', index=False)
+            self.reconcile().to_excel(writer, sheet_name='By HSN-Month-Location', index=False)
+            self.mismatches().to_excel(writer, sheet_name='Rate Mismatches', index=False)
+        return buffer.getvalue()
@@ -0,0 +1,161 @@
+"""Sparse vendor × product matrix of purchase rates.
+
+Each (vendor, product) pair that has purchases is one stored entry. Entries
+are kept in CSR order (row = vendor, sorted by product) with ``indptr`` /
+``indices`` arrays and one data array per measure, plus a CSC permutation
+(column = product, sorted by vendor) into the same data. A vendor's products
+are then a row slice, a product's vendors a column slice, and per-vendor or
+per-product totals a single ``bincount`` / ``reduceat`` over the entries.
+SciPy is not a dependency, so the index arrays are built with NumPy.
+"""
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from ..utils.intern import PRODUCTS, VENDORS
+
+
+MEASURES = ('purchases', 'qty', 'spend', 'simple_rate', 'weighted_rate', 'min_rate', 'last_rate')
+
+RANK_BASES = ('simple', 'weighted')
+
+
+class VendorProductMatrix:
+    """Per (vendor, product) purchase totals with row and column slicing."""
+
+    def __init__(self, rates: pd.DataFrame):
+        """Build the CSR/CSC index over per (item, vendor) rates.
+
+        Args:
+            rates: ``VendorRateService.rates`` (one row per product and vendor)
+        """
+        self.vendor_ids, row = np.unique(rates['vendor_id'].to_numpy(dtype=np.int64), return_inverse=True)
+        self.product_ids, col = np.unique(rates['product_id'].to_numpy(dtype=np.int64), return_inverse=True)
+        self.shape = (len(self.vendor_ids), len(self.product_ids))
+
+        order = np.lexsort((col, row))
+        self.indptr = np.concatenate(([0], np.cumsum(np.bincount(row, minlength=self.shape[0]))))
+        self.indices = col[order]
+        self.rows = row[order]  # row of each entry (expanded indptr)
+        self.data = {m: rates[m].to_numpy(dtype=np.float64)[order] for m in MEASURES}
+
+        self.col_pos = np.lexsort((self.rows, self.indices))  # CSC order -> CSR entry
+        self.col_indptr = np.concatenate(([0], np.cumsum(np.bincount(self.indices, minlength=self.shape[1]))))
+
+    @property
+    def nnz(self) -> int:
+        return len(self.indices)
+
+    @property
+    def vendor_names(self):
+        """Vendor name of each row."""
+        return [VENDORS.value(int(v)) for v in self.vendor_ids]
+
+    def _row_sum(self, values: np.ndarray, mask: np.ndarray = None) -> np.ndarray:
+        if mask is None:
+            return np.bincount(self.rows, weights=values, minlength=self.shape[0])
+        return np.bincount(self.rows[mask], weights=values[mask], minlength=self.shape[0])
+
+    def _col_sum(self, values: np.ndarray) -> np.ndarray:
+        return np.bincount(self.indices, weights=values, minlength=self.shape[1])
+
+    def vendor_products(self, vendor_names: Iterable[str]) -> np.ndarray:
+        """Product ids bought from any of the given vendors (union of row slices)."""
+        rows = np.searchsorted(self.vendor_ids, sorted(VENDORS.codes(vendor_names)))
+        if not len(rows):
+            return np.empty(0, dtype=np.int64)
+        cols = np.concatenate([self.indices[self.indptr[r]:self.indptr[r + 1]] for r in rows])
+        return self.product_ids[np.unique(cols)]
+
+    def product_vendors(self, product_id: int) -> pd.DataFrame:
+        """Vendors of one product (a column slice) with their totals and rates."""
+        c = np.searchsorted(self.product_ids, product_id)
+        if c >= self.shape[1] or self.product_ids[c] != product_id:
+            return pd.DataFrame(columns=['vendor_name'] + list(MEASURES))
+        entries = self.col_pos[self.col_indptr[c]:self.col_indptr[c + 1]]
+        frame = pd.DataFrame({m: self.data[m][entries] for m in MEASURES})
+        frame.insert(0, 'vendor_name', [VENDORS.value(int(v)) for v in self.vendor_ids[self.rows[entries]]])
+        return frame
+
+    def rank_vendors(self, basis: str = 'simple') -> pd.DataFrame:
+        """Vendors ranked by their rate vs the product average, on multi-vendor products.
+
+        'simple' compares the vendor's mean rate with the mean rate of all of
+        the product's purchases (as ``AnalysisService.get_vendor_rate_analysis``);
+        'weighted' compares spend / quantity on both sides. Each product
+        weighs equally in a vendor's ``avg_rate_diff_pct``.
+
+        Args:
+            basis: One of RANK_BASES
+
+        Returns:
+            DataFrame with vendor_name, total_products, comparisons,
+            above_avg_count, below_avg_count, above_avg_pct and
+            avg_rate_diff_pct, most expensive vendor first
+        """
+        if basis not in RANK_BASES:
+            raise ValueError(f"Unknown basis: {basis}")
+        d = self.data
+        rate_sum = self._col_sum(d['simple_rate'] * d['purchases'])
+        simple_avg = rate_sum / self._col_sum(d['purchases'])
+        if basis == 'simple':
+            vendor_rate, product_avg = d['simple_rate'], simple_avg
+        else:
+            qty = self._col_sum(d['qty'])
+            vendor_rate = d['weighted_rate']
+            product_avg = np.where(qty > 0, self._col_sum(d['spend']) / np.where(qty > 0, qty, 1), simple_avg)
+
+        avg = product_avg[self.indices]
+        diff = np.where(avg > 0, (vendor_rate - avg) / np.where(avg > 0, avg, 1) * 100, 0.0)
+        multi = np.diff(self.col_indptr)[self.indices] > 1
+        products = self._row_sum(np.ones(self.nnz), multi)
+        above = self._row_sum((vendor_rate > avg).astype(np.float64), multi)
+        diff_sum = self._row_sum(diff, multi)
+
+        keep = np.flatnonzero(products > 0)
+        scores = pd.DataFrame({
+            'vendor_name': [VENDORS.value(int(v)) for v in self.vendor_ids[keep]],
+            'total_products': products[keep].astype(np.int64),
+            'comparisons': products[keep].astype(np.int64),
+            'above_avg_count': above[keep].astype(np.int64),
+            'below_avg_count': (products[keep] - above[keep]).astype(np.int64),
+            'above_avg_pct': above[keep] / products[keep] * 100,
+            'avg_rate_diff_pct': diff_sum[keep] / products[keep],
+        })
+        return scores.sort_values('avg_rate_diff_pct', ascending=False, kind='stable', ignore_index=True)
+
+    def savings(self) -> pd.DataFrame:
+        """Potential savings per product had every unit been bought at its lowest rate.
+
+        Returns:
+            DataFrame with product_id, item_code, item_name, vendors,
+            actual_cost, potential_cost, potential_savings,
+            potential_savings_pct, cheapest_vendor and most_expensive_vendor
+            (by qty-weighted rate)
+        """
+        d = self.data
+        starts = self.col_indptr[:-1]
+        actual = self._col_sum(d['spend'])
+        min_rate = np.minimum.reduceat(d['min_rate'][self.col_pos], starts) if self.nnz else np.empty(0)
+        potential = self._col_sum(d['qty']) * min_rate
+
+        by_rate = np.lexsort((d['weighted_rate'], self.indices))  # entries by product, then rate
+        cheapest = self.rows[by_rate[starts]] if self.nnz else np.empty(0, dtype=np.int64)
+        dearest = self.rows[by_rate[self.col_indptr[1:] - 1]] if self.nnz else np.empty(0, dtype=np.int64)
+
+        labels = [PRODUCTS.value(int(p)) for p in self.product_ids]
+        names = np.array(self.vendor_names, dtype=object)
+        savings = actual - potential
+        return pd.DataFrame({
+            'product_id': self.product_ids,
+            'item_code': [label[0] for label in labels],
+            'item_name': [label[1] for label in labels],
+            'vendors': np.diff(self.col_indptr),
+            'actual_cost': actual,
+            'potential_cost': potential,
+            'potential_savings': savings,
+            'potential_savings_pct': np.where(actual > 0, savings / np.where(actual > 0, actual, 1) * 100, 0.0),
+            'cheapest_vendor': names[cheapest],
+            'most_expensive_vendor': names[dearest],
+        })
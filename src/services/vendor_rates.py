@@ -0,0 +1,193 @@
+"""Quantity-weighted and time-normalised vendor purchase rates.
+
+A simple mean of ``in_rate`` lets a one-off small purchase weigh as much as
+a bulk order, and comparing vendors over the whole history favours a vendor
+that was only used in a cheap year. Purchases are flattened once into a
+columnar frame; per (item, vendor) rates are spend / quantity from a single
+``groupby``. The same-period comparison pairs each purchase with the nearest
+purchase of the same product from every other vendor through
+``pd.merge_asof`` (``by`` product and peer vendor, with a tolerance in
+days), so vendors are only compared on rates from overlapping periods.
+Matched pairs are scored on the log of the rate ratio, which is symmetric:
+A vs B and B vs A cancel, whereas a mean of (A - B) / B is biased upward.
+"""
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from ..config import VENDOR_RATE_WINDOW_DAYS
+from ..models.purchase import Purchase
+from ..utils.intern import PRODUCTS, VENDORS
+from .vendor_matrix import VendorProductMatrix
+
+
+SCORE_COLUMNS = ['vendor_name', 'total_products', 'above_avg_count', 'below_avg_count',
+                 'above_avg_pct', 'avg_rate_diff_pct']
+
+
+def _score(frame: pd.DataFrame, log_ratio: pd.Series, weights: pd.Series) -> pd.DataFrame:
+    """Per-vendor counts above/below the comparison rate and mean difference.
+
+    ``avg_rate_diff_pct`` is the weighted geometric mean of the rate ratios,
+    as a percentage: exp(weighted mean of log_ratio) - 1.
+
+    Args:
+        frame: Rows with ``vendor_id`` and ``product_id``
+        log_ratio: log(rate / comparison rate) of each row
+        weights: Weight of each row in the vendor's mean difference
+    """
+    if frame.empty:
+        return pd.DataFrame(columns=SCORE_COLUMNS)
+    work = pd.DataFrame({
+        'vendor_id': frame['vendor_id'].to_numpy(),
+        'product_id': frame['product_id'].to_numpy(),
+        'above': (log_ratio > 0).to_numpy(),
+        'weighted_diff': (log_ratio * weights).to_numpy(),
+        'weight': weights.to_numpy(),
+    })
+    grouped = work.groupby('vendor_id', sort=False)
+    scores = grouped.agg(
+        total_products=('product_id', 'nunique'),
+        comparisons=('above', 'size'),
+        above_avg_count=('above', 'sum'),
+        weighted_diff=('weighted_diff', 'sum'),
+        weight=('weight', 'sum'),
+    )
+    scores['below_avg_count'] = scores['comparisons'] - scores['above_avg_count']
+    scores['above_avg_pct'] = scores['above_avg_count'] / scores['comparisons'] * 100
+    mean_log = (scores['weighted_diff'] / scores['weight'].where(scores['weight'] > 0)).fillna(0.0)
+    scores['avg_rate_diff_pct'] = np.expm1(mean_log) * 100
+    scores.insert(0, 'vendor_name', [VENDORS.value(int(v)) for v in scores.index])
+    scores = scores.drop(columns=['weighted_diff', 'weight'])
+    return scores.sort_values('avg_rate_diff_pct', ascending=False, ignore_index=True)
+
+
+class VendorRateService:
+    """Purchase rates per (item, vendor), all-time and period-matched."""
+
+    def __init__(self, purchases: List[Purchase], categories: List[str] = None):
+        """Flatten the purchases of the given categories.
+
+        Args:
+            purchases: List of Purchase objects
+            categories: Categories to include (default: ['FG', 'TR'])
+        """
+        if categories is None:
+            categories = ['FG', 'TR']
+        rows = [p for p in purchases if p.category in categories]
+        qty = np.array([p.in_qty for p in rows], dtype=np.float64)
+        rate = np.array([p.in_rate for p in rows], dtype=np.float64)
+        self.purchases = pd.DataFrame({
+            'product_id': np.array([p.product_id for p in rows], dtype=np.int64),
+            'vendor_id': np.array([p.vendor_id for p in rows], dtype=np.int64),
+            'transaction_date': pd.to_datetime([p.transaction_date for p in rows]),
+            'in_qty': qty,
+            'in_rate': rate,
+            'spend': qty * rate,
+        })
+        self.rates = self._vendor_rates()
+        self._matrix = None
+
+    def _vendor_rates(self) -> pd.DataFrame:
+        """Simple, qty-weighted and last rate per (item, vendor)."""
+        frame = self.purchases
+        keys = ['product_id', 'vendor_id']
+        rates = frame.groupby(keys, sort=False).agg(
+            purchases=('in_rate', 'size'),
+            qty=('in_qty', 'sum'),
+            spend=('spend', 'sum'),
+            simple_rate=('in_rate', 'mean'),
+            min_rate=('in_rate', 'min'),
+            first_date=('transaction_date', 'min'),
+            last_date=('transaction_date', 'max'),
+        )
+        rates['weighted_rate'] = (rates['spend'] / rates['qty'].where(rates['qty'] > 0)).fillna(rates['simple_rate'])
+        by_date = frame.sort_values('transaction_date', kind='stable', na_position='first')
+        rates['last_rate'] = by_date.groupby(keys, sort=False)['in_rate'].last()
+        rates = rates.reset_index()
+
+        product = rates.groupby('product_id', sort=False)
+        product_qty = product['qty'].transform('sum')
+        rates['product_rate'] = (product['spend'].transform('sum') / product_qty.where(product_qty > 0)).fillna(
+            product['simple_rate'].transform('mean'))
+        rates['vendors'] = product['vendor_id'].transform('size')
+        rates['diff_pct'] = ((rates['weighted_rate'] - rates['product_rate'])
+                             / rates['product_rate'].where(rates['product_rate'] > 0) * 100).fillna(0.0)
+
+        labels = [PRODUCTS.value(int(p)) for p in rates['product_id']]
+        rates.insert(2, 'item_code', [label[0] for label in labels])
+        rates.insert(3, 'item_name', [label[1] for label in labels])
+        rates.insert(4, 'vendor_name', [VENDORS.value(int(v)) for v in rates['vendor_id']])
+        return rates
+
+    def matrix(self) -> VendorProductMatrix:
+        """Sparse vendor × product matrix of the rates (built on first use)."""
+        if self._matrix is None:
+            self._matrix = VendorProductMatrix(self.rates)
+        return self._matrix
+
+    def vendor_scores(self) -> pd.DataFrame:
+        """Vendors ranked by qty-weighted rate vs the product's qty-weighted rate.
+
+        Only products bought from more than one vendor count; each product
+        weighs equally in a vendor's ``avg_rate_diff_pct`` (as in
+        ``AnalysisService.get_vendor_rate_analysis``).
+
+        Returns:
+            DataFrame with SCORE_COLUMNS, most expensive vendor first
+        """
+        return self.matrix().rank_vendors('weighted')
+
+    def period_comparison(self, window_days: int = VENDOR_RATE_WINDOW_DAYS) -> pd.DataFrame:
+        """Each purchase against the nearest-dated purchase of every other vendor.
+
+        Args:
+            window_days: Largest gap (days) between the compared purchases
+
+        Returns:
+            DataFrame with one row per matched (purchase, peer vendor):
+            product_id, vendor_id, peer_vendor_id, transaction_date,
+            peer_date, in_qty, in_rate, peer_rate, log_ratio
+            (log(in_rate / peer_rate)) and diff_pct (in_rate vs peer_rate)
+        """
+        frame = self.purchases[self.purchases['transaction_date'].notna()]
+        frame = frame.reset_index(drop=True)
+        pairs = self.rates.loc[self.rates['vendors'] > 1, ['product_id', 'vendor_id']]
+        left = frame.merge(pairs.rename(columns={'vendor_id': 'peer_vendor_id'}), on='product_id')
+        left = left[left['vendor_id'] != left['peer_vendor_id']]
+        right = frame[['product_id', 'vendor_id', 'transaction_date', 'in_rate']].rename(columns={
+            'vendor_id': 'peer_vendor_id', 'in_rate': 'peer_rate',
+        })
+        right['peer_date'] = right['transaction_date']
+        matched = pd.merge_asof(
+            left.sort_values('transaction_date', kind='stable'),
+            right.sort_values('transaction_date', kind='stable'),
+            on='transaction_date',
+            by=['product_id', 'peer_vendor_id'],
+            direction='nearest',
+            tolerance=pd.Timedelta(days=window_days),
+        )
+        matched = matched[(matched['peer_rate'] > 0) & (matched['in_rate'] > 0)].reset_index(drop=True)
+        matched['log_ratio'] = np.log(matched['in_rate'] / matched['peer_rate'])
+        matched['diff_pct'] = np.expm1(matched['log_ratio']) * 100
+        return matched[['product_id', 'vendor_id', 'peer_vendor_id', 'transaction_date', 'peer_date',
+                        'in_qty', 'in_rate', 'peer_rate', 'log_ratio', 'diff_pct']]
+
+    def period_vendor_scores(self, window_days: int = VENDOR_RATE_WINDOW_DAYS) -> pd.DataFrame:
+        """Vendors ranked by their rates vs other vendors' rates from the same period.
+
+        A vendor's ``avg_rate_diff_pct`` is how much more (or less) it
+        charged than its peers: the qty-weighted geometric mean of
+        in_rate / peer_rate over its matched comparisons (see
+        ``period_comparison``), in %. ``total_products`` counts the
+        products with at least one match.
+
+        Args:
+            window_days: Largest gap (days) between the compared purchases
+
+        Returns:
+            DataFrame with SCORE_COLUMNS and comparisons, most expensive vendor first
+        """
+        matched = self.period_comparison(window_days)
+        return _score(matched, matched['log_ratio'], matched['in_qty'])
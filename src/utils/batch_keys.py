@@ -0,0 +1,53 @@
+"""Canonical batch keys for joining purchases to sales.
+
+Purchases link to sales through ``BTREFNO`` (``Purchase.batch_ref_no``) and
+``Batch No.`` (``Sale.batch_no``). Both are read with ``str(row[...])``, so
+the same batch can show up as ``"1234.0"`` on one sheet and ``"1234"`` on
+the other, or differ in case and surrounding whitespace. Every batch key is
+normalized once, when a model is built, and interned to an integer id.
+"""
+import re
+from typing import Optional
+
+from .intern import BATCH_KEYS
+
+# "1234.0", "1234.00", "1234." -> "1234"
+_INTEGRAL_FLOAT = re.compile(r'^([+-]?\d+)\.0*$')
+
+
+def normalize_batch_key(value) -> Optional[str]:
+    """Canonical form of a raw batch key.
+
+    Integral numbers lose their decimal part, whitespace is trimmed (and
+    internal runs collapsed) and letters are upper-cased.
+
+    Args:
+        value: Raw key (str, int, float or None)
+
+    Returns:
+        Normalized key, or None for a missing/blank key
+    """
+    if value is None:
+        return None
+    if isinstance(value, float):
+        if value != value:  # NaN
+            return None
+        if value.is_integer():
+            return str(int(value))
+    key = ' '.join(str(value).split()).upper()
+    if not key:
+        return None
+    match = _INTEGRAL_FLOAT.match(key)
+    if match:
+        key = match.group(1)
+    return key
+
+
+def batch_key_id(value) -> int:
+    """Integer id of a raw batch key (-1 for a missing key)."""
+    return BATCH_KEYS.code(normalize_batch_key(value))
+
+
+def batch_key(batch_id: int) -> Optional[str]:
+    """Normalized key for a batch id."""
+    return BATCH_KEYS.value(batch_id)
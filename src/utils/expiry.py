@@ -0,0 +1,64 @@
+"""Parsing of month-precision expiry values (``EXPMMYY``).
+
+The column holds a month and year only, but arrives in whatever shape the
+export produced: ``"03/26"``, ``"3-2026"``, ``"0326"``, ``"MAR-26"``, a bare
+number such as ``326`` (leading zero lost), or a date Excel already parsed
+as the first of the month. Every form is normalized to the last day of the
+expiry month, so stock is treated as usable until the month is over.
+"""
+import calendar
+import re
+from datetime import date, datetime
+from typing import Optional
+
+_MONTHS = {name.upper(): i for i, name in enumerate(calendar.month_abbr) if name}
+
+# "03/26", "3-26", "03.2026", "MAR-26", "Mar 2026", "2026-03-31T00:00:00"
+_MONTH_YEAR = re.compile(r'^([0-9]{1,2}|[A-Z]{3})[A-Z]*[\s/.\-]*([0-9]{2}|[0-9]{4})$')
+_ISO = re.compile(r'^([0-9]{4})-([0-9]{1,2})(?:-[0-9]{1,2})?(?:[T ].*)?$')
+
+
+def _month_end(year: int, month: int) -> Optional[datetime]:
+    """Last day of a month (two-digit years are 20YY), or None when invalid."""
+    if year < 100:
+        year += 2000
+    if not 1 <= month <= 12 or not 1900 <= year <= 2999:
+        return None
+    return datetime(year, month, calendar.monthrange(year, month)[1])
+
+
+def parse_expiry(value) -> Optional[datetime]:
+    """Last day of the expiry month for a raw ``EXPMMYY`` value.
+
+    Args:
+        value: Raw cell value (str, int, float, date/datetime or None)
+
+    Returns:
+        Month-end datetime, or None for a blank or unparseable value
+    """
+    if value is None:
+        return None
+    if isinstance(value, (datetime, date)):
+        return _month_end(value.year, value.month)
+    if isinstance(value, float):
+        if value != value or not value.is_integer():  # NaN or fractional
+            return None
+        value = int(value)
+    if isinstance(value, int):
+        value = f"{value:04d}"  # 326 -> "0326"
+
+    text = str(value).strip().upper()
+    if not text:
+        return None
+    match = _ISO.match(text)
+    if match:
+        return _month_end(int(match.group(1)), int(match.group(2)))
+    if text.isdigit() and len(text) in (3, 4, 6):
+        text = text.zfill(4) if len(text) < 6 else text
+        return _month_end(int(text[2:]), int(text[:2]))
+    match = _MONTH_YEAR.match(text)
+    if match:
+        month, year = match.groups()
+        month = int(month) if month.isdigit() else _MONTHS.get(month[:3], 0)
+        return _month_end(int(year), month)
+    return None
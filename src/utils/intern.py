@@ -0,0 +1,94 @@
+"""Dictionary encoding for repeated string fields.
+
+Vendor, customer, item, segment and similar columns hold a few hundred
+distinct values repeated across every row. Each ``InternTable`` keeps one
+canonical instance per value and assigns it a small integer code, so rows
+share a single string object and grouping/filtering can use the codes.
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+
+
+class InternTable:
+    """Thread-safe, append-only value <-> integer code table."""
+
+    def __init__(self, name: str):
+        """Initialize an empty table.
+
+        Args:
+            name: Table name (for debugging/inspection)
+        """
+        self.name = name
+        self._codes: Dict[object, int] = {}
+        self._values: List[object] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def code(self, value) -> int:
+        """Get the code of a value, adding it to the table if new.
+
+        Args:
+            value: Hashable value (None maps to -1)
+
+        Returns:
+            Integer code, stable for the lifetime of the process
+        """
+        if value is None:
+            return -1
+        code = self._codes.get(value)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(value)
+                if code is None:
+                    code = len(self._values)
+                    self._values.append(value)
+                    self._codes[value] = code
+        return code
+
+    def intern(self, value):
+        """Get the canonical (shared) instance of a value."""
+        if value is None:
+            return None
+        return self._values[self.code(value)]
+
+    def value(self, code: int):
+        """Get the value for a code (None for -1)."""
+        return None if code < 0 else self._values[code]
+
+    def lookup(self, value) -> Optional[int]:
+        """Get the code of a value without adding it (None if unknown)."""
+        if value is None:
+            return -1
+        return self._codes.get(value)
+
+    def codes(self, values: Iterable) -> Set[int]:
+        """Get the set of codes of known values (for filters)."""
+        result = set()
+        for value in values:
+            code = self.lookup(value)
+            if code is not None:
+                result.add(code)
+        return result
+
+    @property
+    def values(self) -> List[object]:
+        """All values, indexed by code."""
+        return list(self._values)
+
+
+# Shared tables, one per field
+VENDORS = InternTable('vendor')
+CUSTOMERS = InternTable('customer')
+ITEM_CODES = InternTable('item_code')
+ITEM_NAMES = InternTable('item_name')
+PRODUCTS = InternTable('product')  # (item_code, item_name) pairs
+SEGMENTS = InternTable('segment')
+DIVISIONS = InternTable('division')
+CITIES = InternTable('city')
+COUNTRIES = InternTable('country')
+MANAGERS = InternTable('manager')
+EXPENSE_GROUPS = InternTable('expense_group')
+EXPENSE_CATEGORIES = InternTable('expense_category')
+BATCH_KEYS = InternTable('batch_key')  # normalized batch keys (see utils.batch_keys)
@@ -0,0 +1,287 @@
+"""Lightweight per-stage performance instrumentation.
+
+Wrap service methods with ``@timed()`` and page sections with
+``with stage("..."):``. Every completed stage is stored in the shared
+``PERF_REGISTRY`` (wall time, row count, peak memory) and optionally appended
+to a rolling log file.
+"""
+import functools
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from .. import config
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+@dataclass
+class StageTiming:
+    """A single completed, timed stage."""
+    stage: str
+    started_at: datetime
+    wall_ms: float
+    rows: Optional[int] = None
+    peak_memory_mb: Optional[float] = None  # stage peak (tracemalloc); None when not tracked
+    process_rss_mb: Optional[float] = None  # process peak RSS so far, not specific to the stage
+    error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        """Convert to dictionary for display/export."""
+        return {
+            'stage': self.stage,
+            'started_at': self.started_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'wall_ms': round(self.wall_ms, 2),
+            'rows': self.rows,
+            'peak_memory_mb': round(self.peak_memory_mb, 2) if self.peak_memory_mb is not None else None,
+            'process_rss_mb': round(self.process_rss_mb, 2) if self.process_rss_mb is not None else None,
+            'error': self.error,
+        }
+
+
+class PerfRegistry:
+    """Thread-safe, bounded store of recent stage timings."""
+
+    def __init__(self, max_records: int = config.PERF_MAX_RECORDS):
+        """Initialize an empty registry keeping at most ``max_records`` entries."""
+        self._records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+        self._logger = None
+
+    def record(self, timing: StageTiming):
+        """Store a timing and forward it to the log file if enabled."""
+        with self._lock:
+            self._records.append(timing)
+            logger = self._logger
+        if logger is not None:
+            logger.info(
+                "%s wall_ms=%.2f rows=%s peak_mb=%s rss_mb=%s%s",
+                timing.stage,
+                timing.wall_ms,
+                timing.rows,
+                f"{timing.peak_memory_mb:.2f}" if timing.peak_memory_mb is not None else None,
+                f"{timing.process_rss_mb:.2f}" if timing.process_rss_mb is not None else None,
+                f" error={timing.error}" if timing.error else "",
+            )
+
+    def records(self) -> List[StageTiming]:
+        """Get a snapshot of recorded timings (oldest first)."""
+        with self._lock:
+            return list(self._records)
+
+    def clear(self):
+        """Drop all recorded timings."""
+        with self._lock:
+            self._records.clear()
+
+    def summary(self) -> List[Dict]:
+        """Aggregate recorded timings by stage.
+
+        Returns:
+            List of per-stage dictionaries sorted by total time (descending)
+        """
+        stages = {}
+        for t in self.records():
+            if t.stage not in stages:
+                stages[t.stage] = {
+                    'stage': t.stage,
+                    'calls': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'last_ms': 0.0,
+                    'last_rows': None,
+                    'peak_memory_mb': None,
+                }
+            s = stages[t.stage]
+            s['calls'] += 1
+            s['total_ms'] += t.wall_ms
+            s['max_ms'] = max(s['max_ms'], t.wall_ms)
+            s['last_ms'] = t.wall_ms
+            if t.rows is not None:
+                s['last_rows'] = t.rows
+            if t.peak_memory_mb is not None:
+                s['peak_memory_mb'] = max(s['peak_memory_mb'] or 0.0, t.peak_memory_mb)
+
+        result = []
+        for s in stages.values():
+            s['avg_ms'] = round(s['total_ms'] / s['calls'], 2)
+            s['total_ms'] = round(s['total_ms'], 2)
+            s['max_ms'] = round(s['max_ms'], 2)
+            s['last_ms'] = round(s['last_ms'], 2)
+            if s['peak_memory_mb'] is not None:
+                s['peak_memory_mb'] = round(s['peak_memory_mb'], 2)
+            result.append(s)
+
+        result.sort(key=lambda x: x['total_ms'], reverse=True)
+        return result
+
+    @property
+    def log_file(self) -> Optional[str]:
+        """Path of the active rolling log file, if any."""
+        if self._logger is None:
+            return None
+        return self._logger.handlers[0].baseFilename
+
+    def enable_log_file(self, path: str = None, max_bytes: int = None, backup_count: int = None):
+        """Append every recorded stage to a rotating log file.
+
+        Args:
+            path: Log file path (default: config.PERF_LOG_FILE or 'logs/perf.log')
+            max_bytes: Rotate after this many bytes (default: config.PERF_LOG_MAX_BYTES)
+            backup_count: Rotated files to keep (default: config.PERF_LOG_BACKUP_COUNT)
+        """
+        path = Path(path or config.PERF_LOG_FILE or 'logs/perf.log')
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        handler = RotatingFileHandler(
+            path,
+            maxBytes=max_bytes or config.PERF_LOG_MAX_BYTES,
+            backupCount=backup_count or config.PERF_LOG_BACKUP_COUNT,
+            encoding='utf-8',
+        )
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+
+        logger = logging.getLogger('bayberry.perf')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        for old in list(logger.handlers):
+            logger.removeHandler(old)
+            old.close()
+        logger.addHandler(handler)
+
+        with self._lock:
+            self._logger = logger
+
+    def disable_log_file(self):
+        """Stop writing stage timings to the log file."""
+        with self._lock:
+            logger, self._logger = self._logger, None
+        if logger is not None:
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+                handler.close()
+
+
+PERF_REGISTRY = PerfRegistry()
+if config.PERF_LOG_FILE:
+    PERF_REGISTRY.enable_log_file(config.PERF_LOG_FILE)
+
+# Per-thread stack of [traced_at_start, peak_seen] for nested stages, so an
+# inner stage resetting the tracemalloc peak does not hide the outer peak.
+_memory_stack = threading.local()
+
+
+def _process_peak_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB (None if unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and KB elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _count_rows(result) -> Optional[int]:
+    """Best-effort row count of a stage result."""
+    if result is None:
+        return None
+    if isinstance(result, tuple):
+        counts = [len(r) for r in result if hasattr(r, '__len__') and not isinstance(r, str)]
+        return sum(counts) if counts else None
+    if isinstance(result, str):
+        return None
+    if hasattr(result, '__len__'):
+        return len(result)
+    return None
+
+
+@contextmanager
+def stage(name: str, rows: int = None):
+    """Time a block of code and record it in the registry.
+
+    Yields a dict; set ``info['rows']`` inside the block to record a row count
+    that is only known once the block has run.
+
+    Args:
+        name: Stage name shown in the performance panel
+        rows: Row count, if already known
+    """
+    info = {'rows': rows}
+    track_memory = config.PERF_TRACK_MEMORY
+    stack = None
+    if track_memory:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        stack = getattr(_memory_stack, 'frames', None)
+        if stack is None:
+            stack = _memory_stack.frames = []
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1][1] = max(stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        stack.append([current, 0])
+
+    started_at = datetime.now()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield info
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        wall_ms = (time.perf_counter() - start) * 1000
+
+        if track_memory and stack:
+            _, peak = tracemalloc.get_traced_memory()
+            frame = stack.pop()
+            stage_peak = max(frame[1], peak)
+            if stack:
+                stack[-1][1] = max(stack[-1][1], stage_peak)
+            peak_memory_mb = max(stage_peak - frame[0], 0) / (1024 * 1024)
+        else:
+            peak_memory_mb = None
+
+        PERF_REGISTRY.record(StageTiming(
+            stage=name,
+            started_at=started_at,
+            wall_ms=wall_ms,
+            rows=info.get('rows'),
+            peak_memory_mb=peak_memory_mb,
+            process_rss_mb=_process_peak_mb(),
+            error=error,
+        ))
+
+
+def timed(name: str = None, rows: Callable = None):
+    """Decorator recording each call of a function as a stage.
+
+    Args:
+        name: Stage name (default: the function's qualified name)
+        rows: Optional callable mapping the return value to a row count
+              (default: length of the result, or summed lengths for tuples)
+    """
+    def decorator(func):
+        stage_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name) as info:
+                result = func(*args, **kwargs)
+                info['rows'] = rows(result) if rows else _count_rows(result)
+            return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,53 @@
+"""Sidebar performance panel (admins only)."""
+import streamlit as st
+
+from .auth import AdminRole
+from .perf import PERF_REGISTRY
+
+
+def render_performance_panel():
+    """Render a collapsible "Performance" panel in the sidebar.
+
+    Only shown to admins. Lists per-stage timings collected by
+    ``src.utils.perf`` and lets the admin toggle the rolling log file.
+    """
+    if not isinstance(st.session_state.get('user'), AdminRole):
+        return
+
+    import pandas as pd
+
+    with st.sidebar.expander("⏱️ Performance", expanded=False):
+        summary = PERF_REGISTRY.summary()
+        if not summary:
+            st.caption("No stages recorded yet.")
+        else:
+            summary_df = pd.DataFrame(summary)[[
+                'stage', 'calls', 'last_ms', 'avg_ms', 'max_ms', 'last_rows', 'peak_memory_mb'
+            ]]
+            summary_df.columns = ['Stage', 'Calls', 'Last (ms)', 'Avg (ms)', 'Max (ms)', 'Rows', 'Peak MB']
+            st.dataframe(summary_df, use_container_width=True, hide_index=True)
+            if summary_df['Peak MB'].isna().all():
+                st.caption("Peak MB per stage is recorded when PERF_TRACK_MEMORY is on.")
+
+            recent_df = pd.DataFrame([t.to_dict() for t in PERF_REGISTRY.records()])
+            st.download_button(
+                label="📥 Download Timings",
+                data=recent_df.to_csv(index=False).encode('utf-8'),
+                file_name="stage_timings.csv",
+                mime="text/csv",
+            )
+
+        log_enabled = st.checkbox(
+            "Write to rolling log file",
+            value=PERF_REGISTRY.log_file is not None,
+            key="perf_log_toggle",
+        )
+        if log_enabled and PERF_REGISTRY.log_file is None:
+            PERF_REGISTRY.enable_log_file()
+        elif not log_enabled and PERF_REGISTRY.log_file is not None:
+            PERF_REGISTRY.disable_log_file()
+        if PERF_REGISTRY.log_file:
+            st.caption(f"Logging to `{PERF_REGISTRY.log_file}`")
+
+        if st.button("Clear timings", key="perf_clear"):
+            PERF_REGISTRY.clear()
@@ -0,0 +1,95 @@
+"""Median of a sliding window, maintained with two heaps.
+
+The lower half of the window is a max-heap and the upper half a min-heap,
+balanced so the lower half holds the extra element when the count is odd;
+the median is read off the heap tops. Removing the value that leaves the
+window is lazy: it is marked, the half sizes are adjusted, and it is popped
+once it reaches a heap top. Each value is stored as ``(value, seq)``, so
+equal values are still distinct entries and a removal always applies to the
+half that actually holds the entry. Push and remove are O(log n).
+"""
+import heapq
+from typing import Dict, List, Optional, Set, Tuple
+
+
+class StreamingMedian:
+    """Running median of a multiset supporting push and remove."""
+
+    def __init__(self):
+        """Create an empty window."""
+        self._low: List[Tuple[float, int]] = []  # max-heap of (-value, -seq)
+        self._high: List[Tuple[float, int]] = []  # min-heap of (value, seq)
+        self._low_size = 0
+        self._high_size = 0
+        self._removed: Set[int] = set()
+        self._values: Dict[int, float] = {}
+        self._seq = 0
+
+    def __len__(self) -> int:
+        return self._low_size + self._high_size
+
+    def _low_top(self) -> Tuple[float, int]:
+        value, seq = self._low[0]
+        return -value, -seq
+
+    def _prune(self, heap: List[Tuple[float, int]], negated: bool):
+        """Pop removed entries off the top of a heap."""
+        while heap:
+            seq = -heap[0][1] if negated else heap[0][1]
+            if seq not in self._removed:
+                break
+            heapq.heappop(heap)
+            self._removed.discard(seq)
+
+    def _rebalance(self):
+        if self._low_size > self._high_size + 1:
+            value, seq = self._low_top()
+            heapq.heappop(self._low)
+            heapq.heappush(self._high, (value, seq))
+            self._low_size -= 1
+            self._high_size += 1
+            self._prune(self._low, negated=True)
+        elif self._low_size < self._high_size:
+            value, seq = heapq.heappop(self._high)
+            heapq.heappush(self._low, (-value, -seq))
+            self._high_size -= 1
+            self._low_size += 1
+            self._prune(self._high, negated=False)
+
+    def push(self, value: float) -> int:
+        """Add a value.
+
+        Returns:
+            Token identifying this entry (pass it to ``remove``)
+        """
+        seq = self._seq
+        self._seq += 1
+        self._values[seq] = value
+        if not self._low_size or (value, seq) <= self._low_top():
+            heapq.heappush(self._low, (-value, -seq))
+            self._low_size += 1
+        else:
+            heapq.heappush(self._high, (value, seq))
+            self._high_size += 1
+        self._rebalance()
+        return seq
+
+    def remove(self, token: int):
+        """Remove an entry added by ``push``."""
+        value = self._values.pop(token)
+        self._removed.add(token)
+        if self._low_size and (value, token) <= self._low_top():
+            self._low_size -= 1
+            self._prune(self._low, negated=True)
+        else:
+            self._high_size -= 1
+            self._prune(self._high, negated=False)
+        self._rebalance()
+
+    def median(self) -> Optional[float]:
+        """Median of the current entries (None when empty)."""
+        if not len(self):
+            return None
+        if self._low_size > self._high_size:
+            return self._low_top()[0]
+        return (self._low_top()[0] + self._high[0][0]) / 2